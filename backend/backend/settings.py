@@ -143,12 +143,42 @@ STATIC_ROOT = BASE_DIR / "static"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        # Uses orjson when installed and falls back to DRF's JSON encoder.
+        "core.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "core.renderers.ColumnarJSONRenderer",
+    ),
+}
+
+# "sync" rebuilds monthly charges inside the request; "deferred" queues a
+# RebuildJob per property/resource pair for `manage.py rundbworker`.
+CHARGES_REBUILD_MODE = os.getenv("CHARGES_REBUILD_MODE", "sync")
+
+# Analytics responses are cached per owner and query and checked against the
+# owner's data version; use a shared backend (e.g. Redis or Memcached) when
+# running several workers so they share entries and the recompute lock.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "meterflow"),
+    }
 }
+RESULT_CACHE_TIMEOUT = int(os.getenv("RESULT_CACHE_TIMEOUT", "3600"))
+RESULT_CACHE_LOCK_TIMEOUT = int(os.getenv("RESULT_CACHE_LOCK_TIMEOUT", "30"))
+RESULT_CACHE_WAIT = float(os.getenv("RESULT_CACHE_WAIT", "2"))
+# JWT requests resolve the user and profile from the cache (core/authentication.py).
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "300"))
+# A process-local cache cannot see other workers' invalidations, so its entries
+# are checked against the user's DataVersion (one query per request).
+AUTH_USER_CACHE_VERSIONED = os.getenv(
+    "AUTH_USER_CACHE_VERSIONED", str(CACHES["default"]["BACKEND"].endswith("LocMemCache"))
+).lower() in ("true", "1", "yes")
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
@@ -22,11 +22,15 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from core.views import (
     AnalyticsViewSet,
+    ChargesExportView,
     LoginView,
     MeterViewSet,
     MonthlyChargeViewSet,
     PaymentViewSet,
+    PortfolioAnalyticsViewSet,
+    PropertyBalanceViewSet,
     PropertyViewSet,
+    ReadingsExportView,
     ReadingViewSet,
     RegistrationView,
     TariffViewSet,
@@ -39,12 +43,16 @@ router.register(r"readings", ReadingViewSet, basename="reading")
 router.register(r"tariffs", TariffViewSet, basename="tariff")
 router.register(r"monthly-charges", MonthlyChargeViewSet, basename="monthlycharge")
 router.register(r"payments", PaymentViewSet, basename="payment")
+router.register(r"balances", PropertyBalanceViewSet, basename="balance")
 router.register(r"analytics", AnalyticsViewSet, basename="analytics")
+router.register(r"portfolio/analytics", PortfolioAnalyticsViewSet, basename="portfolio-analytics")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/register/", RegistrationView.as_view(), name="register"),
     path("api/auth/login/", LoginView.as_view(), name="token_obtain_pair"),
     path("api/auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/exports/charges.csv", ChargesExportView.as_view(), name="export_charges"),
+    path("api/exports/readings.csv", ReadingsExportView.as_view(), name="export_readings"),
     path("api/", include(router.urls)),
 ]
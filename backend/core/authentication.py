@@ -0,0 +1,119 @@
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import Profile
+from .versions import bump_version, get_version, user_key
+
+USER_KEY = "auth:user:{}"
+# Only what authentication and ``core.permissions`` read; other fields load lazily.
+USER_FIELDS = ("id", "username", "is_active", "is_staff", "is_superuser")
+
+
+def forget_user(user_id) -> None:
+    if settings.AUTH_USER_CACHE_VERSIONED:
+        # The cache is local to this process: the version bump tells the others.
+        bump_version(user_key(user_id))
+    cache.delete(USER_KEY.format(user_id))
+
+
+def _snapshot(user) -> dict:
+    profile = getattr(user, "profile", None)
+    return {
+        "user": {field: getattr(user, field) for field in USER_FIELDS},
+        "profile": None if profile is None else {"id": profile.pk, "user_id": user.pk, "role": profile.role},
+        "revoke": get_md5_hash_password(user.password),
+    }
+
+
+def _loaded(model, values):
+    """An instance as if read with ``.only(*values)``: the remaining fields are deferred."""
+
+    fields = [field.attname for field in model._meta.concrete_fields]
+    return model.from_db(model.objects.db, fields, [values.get(field, DEFERRED) for field in fields])
+
+
+def _restore(snapshot):
+    user = _loaded(User, snapshot["user"])
+    if snapshot["profile"] is not None:
+        user.profile = _loaded(Profile, snapshot["profile"])
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication that resolves the user and its profile through the cache.
+
+    The cache holds a snapshot of the user's id, username and flags, the
+    profile role and the hash the revoke claim is checked against, never the
+    password hash itself. The user is rebuilt from it with its ``profile``
+    attached, so role checks in ``core.permissions`` cost no query either; other
+    user fields are deferred and load on access. Entries expire after
+    ``AUTH_USER_CACHE_TIMEOUT`` seconds and are dropped when the user or the
+    profile is saved or deleted and when one of the user's tokens is blacklisted.
+    With ``AUTH_USER_CACHE_VERSIONED`` (on for the process-local default cache)
+    each entry is also stamped with the user's ``DataVersion``, so a change made
+    in another process invalidates it here too, at the cost of one version
+    lookup per request; a shared cache sees the deletions directly.
+
+    Queryset ``.update()`` on ``User`` or ``Profile`` sends no signals: such
+    changes reach authentication only after ``AUTH_USER_CACHE_TIMEOUT`` unless
+    the caller also calls ``forget_user``.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from exc
+
+        key = USER_KEY.format(user_id)
+        version = get_version(user_key(user_id)) if settings.AUTH_USER_CACHE_VERSIONED else None
+        cached = cache.get(key)
+        if cached is not None and cached[0] == version:
+            snapshot = cached[1]
+        else:
+            try:
+                user = User.objects.select_related("profile").get(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist as exc:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from exc
+            snapshot = _snapshot(user)
+            cache.set(key, (version, snapshot), settings.AUTH_USER_CACHE_TIMEOUT)
+        user = _restore(snapshot)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        revoke_claim = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+        if api_settings.CHECK_REVOKE_TOKEN and revoke_claim != snapshot["revoke"]:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+
+def token_blacklisted(sender, instance, **kwargs):
+    forget_user(instance.token.user_id)
+
+
+if apps.is_installed("rest_framework_simplejwt.token_blacklist"):
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    post_save.connect(token_blacklisted, sender=BlacklistedToken)
@@ -0,0 +1,221 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from core.models import MonthlyCharge, Payment, Reading
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: only this command needs it (the "snapshots" extra)
+    pyarrow = None
+
+STATE_FILE = "_partitions.json"
+# Changed partitions are exported in groups so the OR of their keys stays small.
+PARTITION_BATCH = 200
+
+# table: (model, partition columns, fingerprint aggregates, file columns); types are pyarrow factory names.
+# A partition is rewritten when its fingerprint differs from the previous run. Row
+# count and id sum catch inserts (late commits included), deletes and rows moving
+# between partitions; charge rebuilds always reinsert with new ids, while readings
+# and payments are edited in place and also sum their ``revision`` counters.
+TABLES = {
+    "readings": (
+        Reading,
+        [
+            ("year", ExtractYear("reading_date")),
+            ("month", ExtractMonth("reading_date")),
+            ("resource_type", F("meter__resource_type")),
+        ],
+        {"rows": Count("id"), "ids": Sum("id"), "revisions": Sum("revision"), "properties": Sum("meter__property_id")},
+        [
+            ("id", "id", ("int64",)),
+            ("meter_id", "meter_id", ("int64",)),
+            ("property_id", "meter__property_id", ("int64",)),
+            ("value", "value", ("decimal128", 12, 3)),
+            ("reading_date", "reading_date", ("date32",)),
+            ("created_at", "created_at", ("timestamp", "us", "UTC")),
+        ],
+    ),
+    "charges": (
+        MonthlyCharge,
+        [("year", F("year")), ("month", F("month")), ("resource_type", F("resource_type"))],
+        {"rows": Count("id"), "ids": Sum("id")},
+        [
+            ("id", "id", ("int64",)),
+            ("property_id", "property_id", ("int64",)),
+            ("consumption", "consumption", ("decimal128", 12, 3)),
+            ("amount", "amount", ("decimal128", 12, 2)),
+            ("generated_at", "generated_at", ("timestamp", "us", "UTC")),
+        ],
+    ),
+    "payments": (
+        Payment,
+        [("year", F("year")), ("month", F("month"))],
+        {"rows": Count("id"), "ids": Sum("id"), "revisions": Sum("revision")},
+        [
+            ("id", "id", ("int64",)),
+            ("property_id", "property_id", ("int64",)),
+            ("amount", "amount", ("decimal128", 12, 2)),
+            ("paid_at", "paid_at", ("date32",)),
+            ("comment", "comment", ("string",)),
+            ("created_at", "created_at", ("timestamp", "us", "UTC")),
+        ],
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает показания, начисления и платежи в колоночные файлы Parquet или Arrow IPC, "
+        "разбитые по году/месяцу и типу ресурса; повторный запуск переписывает только изменившиеся разделы"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Каталог снимка")
+        parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet", help="Формат файлов")
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=f"Обновить существующий снимок по отпечаткам разделов ({STATE_FILE} в каталоге снимка)",
+        )
+        parser.add_argument("--tables", nargs="+", choices=sorted(TABLES), default=sorted(TABLES))
+        parser.add_argument("--chunk-size", type=int, default=50000, help="Строк в одной пачке чтения и записи")
+
+    def handle(self, *args, **options):
+        if pyarrow is None:
+            raise CommandError("exportsnapshot needs pyarrow: uv sync --extra snapshots")
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        root = Path(options["output"])
+        state_path = root / STATE_FILE
+        state = json.loads(state_path.read_text()) if state_path.exists() else {}
+        run_id = timezone.now().strftime("%Y%m%dT%H%M%S%f")
+
+        for name in options["tables"]:
+            previous = state.get(name)
+            if any((root / name).glob("**/part-*")) and (previous is None or not options["incremental"]):
+                raise CommandError(f"{root / name} already holds a snapshot: use --incremental or an empty directory")
+
+            started = time.monotonic()
+            current = self._fingerprints(name)
+            changed = [key for key, fingerprint in current.items() if (previous or {}).get(key) != fingerprint]
+            rows = files = 0
+            for offset in range(0, len(changed), PARTITION_BATCH):
+                batch = changed[offset : offset + PARTITION_BATCH]
+                exported, written = self._export(name, root / name, options["format"], batch, chunk_size, run_id)
+                rows += exported
+                files += written
+            removed = set(previous or {}) - set(current)
+            self._drop_stale_parts(name, root / name, run_id, [json.loads(key) for key in [*changed, *removed]])
+
+            state[name] = current
+            root.mkdir(parents=True, exist_ok=True)
+            state_path.write_text(json.dumps(state, indent=2, sort_keys=True))
+            self.stdout.write(
+                f"{name}: {rows} строк, {files} файлов, удалено разделов {len(removed)} "
+                f"за {time.monotonic() - started:.1f} с"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Снимок записан в {root}"))
+
+    def _partitioned(self, name):
+        model, partitions, _, _ = TABLES[name]
+        names = [f"partition_{column}" for column, _ in partitions]
+        queryset = model.objects.annotate(**{alias: expr for alias, (_, expr) in zip(names, partitions)})
+        return queryset, names
+
+    def _fingerprints(self, name):
+        """One grouped query: ``{partition key (JSON): [aggregates...]}`` for every partition."""
+
+        _, _, aggregates, _ = TABLES[name]
+        queryset, names = self._partitioned(name)
+        rows = queryset.values(*names).annotate(**aggregates).order_by().values_list(*names, *aggregates)
+        return {json.dumps(list(row[: len(names)])): [str(value) for value in row[len(names) :]] for row in rows}
+
+    def _export(self, name, directory, fmt, keys, chunk_size, run_id):
+        _, partitions, _, columns = TABLES[name]
+        schema = pyarrow.schema([(column, self._type(spec)) for column, _, spec in columns])
+        queryset, names = self._partitioned(name)
+        selected = Q()
+        for key in keys:
+            selected |= Q(**dict(zip(names, json.loads(key))))
+        # Ordered by partition so that exactly one file is open at a time.
+        rows = (
+            queryset.filter(selected)
+            .order_by(*names, "id")
+            .values_list(*names, *(path for _, path, _ in columns))
+        )
+
+        writer = None
+        current = None
+        buffer = [[] for _ in columns]
+        count = files = 0
+
+        def flush():
+            if buffer[0]:
+                writer.write_batch(
+                    pyarrow.record_batch(
+                        [pyarrow.array(values, type=field.type) for values, field in zip(buffer, schema)], schema=schema
+                    )
+                )
+                for values in buffer:
+                    values.clear()
+
+        # On PostgreSQL .iterator() reads through a server-side cursor.
+        for row in rows.iterator(chunk_size=chunk_size):
+            key = row[: len(partitions)]
+            if key != current:
+                if writer is not None:
+                    flush()
+                    writer.close()
+                current = key
+                writer = self._open(self._partition_path(directory, partitions, key), fmt, schema, run_id)
+                files += 1
+            for values, value in zip(buffer, row[len(partitions) :]):
+                values.append(value)
+            count += 1
+            if len(buffer[0]) >= chunk_size:
+                flush()
+        if writer is not None:
+            flush()
+            writer.close()
+        return count, files
+
+    @staticmethod
+    def _partition_path(directory, partitions, key):
+        # Hive-style directories (year=2024/month=3/resource_type=gas) for dataset readers.
+        return directory.joinpath(*(f"{column}={value}" for (column, _), value in zip(partitions, key)))
+
+    def _drop_stale_parts(self, name, directory, run_id, keys):
+        """Remove earlier runs' parts of the given partitions, and directories left empty."""
+
+        partitions = TABLES[name][1]
+        for key in keys:
+            path = self._partition_path(directory, partitions, key)
+            for part in path.glob("part-*"):
+                if part.stem != f"part-{run_id}":
+                    part.unlink()
+            while path != directory and path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+                path = path.parent
+
+    @staticmethod
+    def _type(spec):
+        factory, *arguments = spec
+        return getattr(pyarrow, factory)(*arguments)
+
+    @staticmethod
+    def _open(path, fmt, schema, run_id):
+        path.mkdir(parents=True, exist_ok=True)
+        if fmt == "parquet":
+            return pyarrow.parquet.ParquetWriter(path / f"part-{run_id}.parquet", schema)
+        # Uncompressed Arrow IPC files can be memory-mapped without a copy.
+        return pyarrow.ipc.new_file(str(path / f"part-{run_id}.arrow"), schema)
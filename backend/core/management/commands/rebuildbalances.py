@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Property
+from core.services import rebuild_balances
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает помесячный журнал баланса PropertyBalance по начислениям и платежам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Пересчитать журнал только для объектов этого пользователя")
+
+    def handle(self, *args, **options):
+        property_ids = None
+        if options["owner"]:
+            owner = User.objects.filter(username=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"User {options['owner']!r} does not exist")
+            property_ids = list(Property.objects.filter(owner=owner).values_list("id", flat=True))
+
+        with transaction.atomic():
+            created = rebuild_balances(property_ids=property_ids)
+        self.stdout.write(self.style.SUCCESS(f"Записано {created} строк журнала баланса"))
@@ -0,0 +1,118 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from core.models import Meter, MonthlyCharge, Property
+from core.services import affected_since, rebuild_monthly_charges
+
+
+def _init_worker():
+    # Spawned workers start from a clean interpreter; forked ones are already set up.
+    django.setup()
+
+
+def rebuild_shard(index, pairs, since):
+    """Re-rate a shard of (property_id, resource_type) pairs on this process' own connection."""
+
+    started = time.monotonic()
+    properties = Property.objects.in_bulk({property_id for property_id, _ in pairs})
+    readings = 0
+    for property_id, resource_type in pairs:
+        property_obj = properties.get(property_id)
+        if property_obj is not None:
+            readings += rebuild_monthly_charges(property_obj, resource_type, since=since)
+    return index, len(pairs), readings, time.monotonic() - started
+
+
+class Command(BaseCommand):
+    help = "Полностью пересчитывает MonthlyCharge, распределяя объекты по процессам"
+
+    def add_arguments(self, parser):
+        default_workers = (os.cpu_count() or 1) if connection.vendor == "postgresql" else 1
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=default_workers,
+            help="Число процессов (на SQLite используйте 1: запись в файл не параллелится)",
+        )
+        parser.add_argument("--owner", help="Пересчитать только объекты этого пользователя")
+        parser.add_argument("--since", type=date.fromisoformat, help="Пересчитать месяцы начиная с даты (YYYY-MM-DD)")
+        parser.add_argument("--shard-size", type=int, default=200, help="Объектов в одном шарде")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        shard_size = options["shard_size"]
+        if workers < 1 or shard_size < 1:
+            raise CommandError("--workers and --shard-size must be positive")
+        since = affected_since(options["since"])
+
+        shards = self._build_shards(options["owner"], shard_size)
+        total_pairs = sum(len(shard) for shard in shards)
+        self.stdout.write(f"Пар объект/ресурс: {total_pairs}, шардов: {len(shards)}, процессов: {workers}")
+
+        started = time.monotonic()
+        done_pairs = 0
+        done_readings = 0
+        for index, pairs, readings, elapsed in self._run(shards, since, workers):
+            done_pairs += pairs
+            done_readings += readings
+            self.stdout.write(
+                f"Шард {index + 1}/{len(shards)}: {pairs} пар, {readings} показаний за {elapsed:.2f} с "
+                f"(всего {done_pairs}/{total_pairs})"
+            )
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано {done_pairs} пар и {done_readings} показаний за {elapsed:.1f} с: "
+                f"{done_pairs / elapsed:.1f} пар/с, {done_readings / elapsed:.1f} показаний/с"
+            )
+        )
+
+    def _build_shards(self, owner, shard_size):
+        properties = Property.objects.all()
+        if owner:
+            properties = properties.filter(owner__username=owner)
+            if not properties.exists():
+                raise CommandError(f"User {owner!r} has no properties")
+
+        # Pairs that only have charges left (e.g. after a meter was removed) are
+        # re-rated too, which clears their orphaned rows.
+        by_property = {}
+        for model, field in ((Meter, "property_id"), (MonthlyCharge, "property_id")):
+            rows = (
+                model.objects.filter(property__in=properties)
+                .values_list(field, "resource_type")
+                .distinct()
+                .order_by(field, "resource_type")
+            )
+            for property_id, resource_type in rows.iterator(chunk_size=5000):
+                by_property.setdefault(property_id, set()).add(resource_type)
+
+        property_ids = sorted(by_property)
+        return [
+            [
+                (property_id, resource_type)
+                for property_id in property_ids[offset : offset + shard_size]
+                for resource_type in sorted(by_property[property_id])
+            ]
+            for offset in range(0, len(property_ids), shard_size)
+        ]
+
+    def _run(self, shards, since, workers):
+        if workers == 1:
+            for index, pairs in enumerate(shards):
+                yield rebuild_shard(index, pairs, since)
+            return
+
+        # Children must not share the parent's socket: close it before forking.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(rebuild_shard, index, pairs, since) for index, pairs in enumerate(shards)]
+            for future in as_completed(futures):
+                yield future.result()
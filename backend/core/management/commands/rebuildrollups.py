@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.services import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает помесячные сводки OwnerMonthlyRollup и OwnerMonthlyPayments по начислениям и платежам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Пересчитать сводки только этого пользователя")
+
+    def handle(self, *args, **options):
+        owner_ids = None
+        if options["owner"]:
+            owner = User.objects.filter(username=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"User {options['owner']!r} does not exist")
+            owner_ids = [owner.id]
+
+        with transaction.atomic():
+            created = rebuild_rollups(owner_ids=owner_ids)
+        self.stdout.write(self.style.SUCCESS(f"Записано {created} строк помесячных сводок"))
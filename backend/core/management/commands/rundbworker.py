@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.services import claim_rebuild_job, release_stale_jobs, run_rebuild_job
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает очередь отложенных пересчётов начислений (RebuildJob) без Redis и Celery"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Обработать очередь и завершиться")
+        parser.add_argument("--interval", type=float, default=1.0, help="Пауза при пустой очереди, секунды")
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help="Через сколько секунд захваченная задача считается брошенной",
+        )
+        parser.add_argument("--max-attempts", type=int, default=5, help="Сколько раз повторять упавшую задачу")
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options["stale_after"])
+        processed = 0
+        released = release_stale_jobs(stale_after)
+        if released:
+            self.stdout.write(f"Возвращено в очередь брошенных задач: {released}")
+
+        while True:
+            close_old_connections()
+            job = claim_rebuild_job(options["max_attempts"])
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+                release_stale_jobs(stale_after)
+                continue
+
+            started = time.monotonic()
+            try:
+                run_rebuild_job(job)
+            except Exception as exc:
+                self.stderr.write(f"Ошибка пересчёта {job}: {exc}")
+                continue
+            processed += 1
+            self.stdout.write(f"Пересчитано: {job} за {time.monotonic() - started:.2f} с")
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано задач: {processed}"))
@@ -8,7 +8,7 @@ from django.core.management.base import BaseCommand
 from django.db.models import Sum
 
 from core.models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
-from core.services import process_reading
+from core.services import coalesce_rebuilds, process_reading
 
 User = get_user_model()
 
@@ -89,10 +89,11 @@ class Command(BaseCommand):
                 )
                 meters.append(meter)
 
-            for meter in meters:
-                if meter.readings.exists():
-                    continue
-                self._seed_readings_for_meter(meter, months)
+            with coalesce_rebuilds():
+                for meter in meters:
+                    if meter.readings.exists():
+                        continue
+                    self._seed_readings_for_meter(meter, months)
 
         self.stdout.write(self.style.SUCCESS("История показаний и начислений создана"))
 
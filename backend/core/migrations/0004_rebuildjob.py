@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RebuildJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_type', models.CharField(choices=[('electricity', 'Электричество'), ('cold_water', 'Холодная вода'), ('hot_water', 'Горячая вода'), ('gas', 'Газ'), ('heating', 'Отопление')], max_length=50)),
+                ('since', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rebuild_jobs', to='core.property')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('claimed_at__isnull', True)), fields=('property', 'resource_type'), name='core_rebuildjob_one_pending_per_pair')],
+            },
+        ),
+    ]
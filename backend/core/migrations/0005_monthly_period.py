@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_rebuildjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlycharge',
+            name='period',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='period',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
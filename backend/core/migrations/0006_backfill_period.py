@@ -0,0 +1,31 @@
+from django.db import migrations, transaction
+from django.db.models import F, Max, Min
+
+BATCH_SIZE = 5000
+
+
+def backfill_period(apps, schema_editor):
+    # Walk primary-key ranges and commit each batch separately, so large tables are
+    # never locked by a single long UPDATE.
+    for model_name in ("MonthlyCharge", "Payment"):
+        model = apps.get_model("core", model_name)
+        bounds = model.objects.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            continue
+        for start in range(bounds["low"], bounds["high"] + 1, BATCH_SIZE):
+            with transaction.atomic():
+                model.objects.filter(
+                    pk__gte=start, pk__lt=start + BATCH_SIZE, period__isnull=True
+                ).update(period=F("year") * 12 + F("month"))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0005_monthly_period"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_period, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_backfill_period'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='monthlycharge',
+            name='period',
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='period',
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='monthlycharge',
+            index=models.Index(fields=['property', 'period', 'resource_type'], name='core_charge_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['property', 'period'], name='core_payment_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['meter', 'reading_date', 'created_at'], name='core_reading_meter_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tariff',
+            index=models.Index(fields=['resource_type', 'valid_from'], name='core_tariff_resource_from_idx'),
+        ),
+    ]
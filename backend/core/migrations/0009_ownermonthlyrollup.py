@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_dataversion_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('period', models.PositiveIntegerField()),
+                ('resource_type', models.CharField(choices=[('electricity', 'Электричество'), ('cold_water', 'Холодная вода'), ('hot_water', 'Горячая вода'), ('gas', 'Газ'), ('heating', 'Отопление')], max_length=50)),
+                ('consumption', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('charges', models.PositiveIntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['period', 'resource_type'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'period', 'resource_type'), name='core_rollup_one_per_owner_period_resource')],
+            },
+        ),
+    ]
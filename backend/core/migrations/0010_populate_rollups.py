@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 5000
+
+
+def populate_rollups(apps, schema_editor):
+    MonthlyCharge = apps.get_model("core", "MonthlyCharge")
+    OwnerMonthlyRollup = apps.get_model("core", "OwnerMonthlyRollup")
+    rows = (
+        MonthlyCharge.objects.values("property__owner_id", "year", "month", "period", "resource_type")
+        .annotate(total_consumption=Sum("consumption"), total_amount=Sum("amount"), total_charges=Count("id"))
+        .order_by()
+    )
+    OwnerMonthlyRollup.objects.bulk_create(
+        (
+            OwnerMonthlyRollup(
+                owner_id=row["property__owner_id"],
+                year=row["year"],
+                month=row["month"],
+                period=row["period"],
+                resource_type=row["resource_type"],
+                consumption=row["total_consumption"],
+                amount=row["total_amount"],
+                charges=row["total_charges"],
+            )
+            for row in rows.iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_ownermonthlyrollup"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
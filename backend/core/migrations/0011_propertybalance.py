@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_populate_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('period', models.PositiveIntegerField()),
+                ('charged', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='core.property')),
+            ],
+            options={
+                'ordering': ['property', 'period'],
+                'constraints': [models.UniqueConstraint(fields=('property', 'period'), name='core_balance_one_per_property_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+
+BATCH_SIZE = 5000
+
+
+def populate_balances(apps, schema_editor):
+    MonthlyCharge = apps.get_model("core", "MonthlyCharge")
+    Payment = apps.get_model("core", "Payment")
+    PropertyBalance = apps.get_model("core", "PropertyBalance")
+
+    months = {}
+    for column, model in ((0, MonthlyCharge), (1, Payment)):
+        rows = (
+            model.objects.values("property_id", "year", "month", "period")
+            .annotate(total=Sum("amount"))
+            .values_list("property_id", "year", "month", "period", "total")
+            .order_by()
+        )
+        for property_id, year, month, period, total in rows.iterator(chunk_size=BATCH_SIZE):
+            entry = months.setdefault((property_id, period), [year, month, Decimal("0"), Decimal("0")])
+            entry[2 + column] += total
+
+    running = {}
+    balances = []
+    for (property_id, period), (year, month, charged, paid) in sorted(months.items()):
+        running[property_id] = running.get(property_id, Decimal("0")) + charged - paid
+        balances.append(
+            PropertyBalance(
+                property_id=property_id,
+                year=year,
+                month=month,
+                period=period,
+                charged=charged,
+                paid=paid,
+                balance=running[property_id],
+            )
+        )
+    PropertyBalance.objects.bulk_create(balances, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_propertybalance"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
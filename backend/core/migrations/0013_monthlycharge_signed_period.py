@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_populate_balances'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='monthlycharge',
+            name='period',
+            field=models.IntegerField(editable=False),
+        ),
+    ]
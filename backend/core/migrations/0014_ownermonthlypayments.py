@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_monthlycharge_signed_period'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerMonthlyPayments',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('period', models.PositiveIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_payments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['period'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'period'), name='core_payments_rollup_one_per_owner_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 5000
+
+
+def populate_payment_rollups(apps, schema_editor):
+    Payment = apps.get_model("core", "Payment")
+    OwnerMonthlyPayments = apps.get_model("core", "OwnerMonthlyPayments")
+    rows = (
+        Payment.objects.values("property__owner_id", "year", "month", "period")
+        .annotate(total_amount=Sum("amount"), total_payments=Count("id"))
+        .order_by()
+    )
+    OwnerMonthlyPayments.objects.bulk_create(
+        (
+            OwnerMonthlyPayments(
+                owner_id=row["property__owner_id"],
+                year=row["year"],
+                month=row["month"],
+                period=row["period"],
+                amount=row["total_amount"],
+                payments=row["total_payments"],
+            )
+            for row in rows.iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_ownermonthlypayments"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_payment_rollups, migrations.RunPython.noop),
+    ]
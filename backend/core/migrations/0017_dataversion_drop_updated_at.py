@@ -0,0 +1,17 @@
+# Generated by Django 5.2.14 on 2026-10-17 17:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_revisions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dataversion',
+            name='updated_at',
+        ),
+    ]
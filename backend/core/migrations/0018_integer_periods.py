@@ -0,0 +1,33 @@
+# Generated by Django 5.2.14 on 2026-10-17 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_dataversion_drop_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ownermonthlypayments',
+            name='period',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='ownermonthlyrollup',
+            name='period',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='period',
+            field=models.IntegerField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='propertybalance',
+            name='period',
+            field=models.IntegerField(),
+        ),
+    ]
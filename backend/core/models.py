@@ -5,6 +5,12 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 
+def month_period(year: int, month: int) -> int:
+    """Sortable single-column key for a (year, month) pair."""
+
+    return year * 12 + month
+
+
 class Property(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="properties")
     name = models.CharField(max_length=255)
@@ -49,12 +55,36 @@ class Tariff(models.Model):
 
     class Meta:
         ordering = ["-valid_from"]
+        indexes = [models.Index(fields=["resource_type", "valid_from"], name="core_tariff_resource_from_idx")]
 
     def __str__(self) -> str:
         return f"{self.get_resource_type_display()} ({self.valid_from} - {self.valid_to or '∞'})"
 
 
-class Reading(models.Model):
+class RevisionedModel(models.Model):
+    """Counts in-place saves in ``revision`` so ``exportsnapshot`` can spot edited rows.
+
+    The counter is incremented in SQL, so concurrent saves never collapse into one
+    value. Queryset ``update()`` bypasses it.
+    """
+
+    revision = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding
+        if updating:
+            self.revision = models.F("revision") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = [*kwargs["update_fields"], "revision"]
+        super().save(*args, **kwargs)
+        if updating:
+            self.refresh_from_db(fields=["revision"])
+
+
+class Reading(RevisionedModel):
     meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name="readings")
     value = models.DecimalField(max_digits=12, decimal_places=3)
     reading_date = models.DateField()
@@ -62,6 +92,7 @@ class Reading(models.Model):
 
     class Meta:
         ordering = ["-reading_date", "-created_at"]
+        indexes = [models.Index(fields=["meter", "reading_date", "created_at"], name="core_reading_meter_date_idx")]
 
     def __str__(self) -> str:
         return f"{self.meter} {self.value} ({self.reading_date})"
@@ -71,6 +102,7 @@ class MonthlyCharge(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="monthly_charges")
     year = models.IntegerField()
     month = models.IntegerField()
+    period = models.IntegerField(editable=False)
     resource_type = models.CharField(max_length=50, choices=Meter.RESOURCE_CHOICES)
     consumption = models.DecimalField(max_digits=12, decimal_places=3, default=0)
     amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -79,15 +111,76 @@ class MonthlyCharge(models.Model):
     class Meta:
         unique_together = ("property", "year", "month", "resource_type")
         ordering = ["-year", "-month"]
+        indexes = [
+            models.Index(fields=["property", "period", "resource_type"], name="core_charge_period_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.period = month_period(self.year, self.month)
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f"{self.property} {self.month}.{self.year} {self.get_resource_type_display()}"
 
 
-class Payment(models.Model):
+class OwnerMonthlyRollup(models.Model):
+    """Per-owner monthly totals of ``MonthlyCharge``, kept in step by the rebuild paths.
+
+    ``charges`` counts the underlying charge rows, so a month disappears together
+    with its last charge. ``manage.py rebuildrollups`` recomputes the table.
+    """
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="monthly_rollups")
+    year = models.IntegerField()
+    month = models.IntegerField()
+    period = models.IntegerField()
+    resource_type = models.CharField(max_length=50, choices=Meter.RESOURCE_CHOICES)
+    consumption = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    charges = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["period", "resource_type"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "period", "resource_type"],
+                name="core_rollup_one_per_owner_period_resource",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.owner} {self.month}.{self.year} {self.get_resource_type_display()}"
+
+
+class OwnerMonthlyPayments(models.Model):
+    """Per-owner monthly totals of ``Payment``, kept in step by the payment signals.
+
+    ``payments`` counts the underlying rows, so a month disappears together with
+    its last payment. ``manage.py rebuildrollups`` recomputes the table.
+    """
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="monthly_payments")
+    year = models.IntegerField()
+    month = models.IntegerField()
+    period = models.IntegerField()
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    payments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["period"]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "period"], name="core_payments_rollup_one_per_owner_period")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.owner} платежи за {self.month}.{self.year}"
+
+
+class Payment(RevisionedModel):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="payments")
     year = models.IntegerField()
     month = models.IntegerField()
+    period = models.IntegerField(editable=False)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     paid_at = models.DateField()
     comment = models.TextField(blank=True)
@@ -95,11 +188,82 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ["-paid_at", "-created_at"]
+        indexes = [models.Index(fields=["property", "period"], name="core_payment_period_idx")]
+
+    def save(self, *args, **kwargs):
+        self.period = month_period(self.year, self.month)
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f"{self.property} платеж за {self.month}.{self.year}"
 
 
+class PropertyBalance(models.Model):
+    """Monthly ledger of a property: what was charged and paid, and the running balance.
+
+    ``balance`` is the cumulative charged minus paid through ``period``, so the
+    latest row is the current debt. Charge rebuilds and payment writes move it
+    incrementally from the affected month on; ``manage.py rebuildbalances``
+    recomputes it.
+    """
+
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="balances")
+    year = models.IntegerField()
+    month = models.IntegerField()
+    period = models.IntegerField()
+    charged = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["property", "period"]
+        constraints = [
+            models.UniqueConstraint(fields=["property", "period"], name="core_balance_one_per_property_period")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.property} {self.month}.{self.year}: {self.balance}"
+
+
+class RebuildJob(models.Model):
+    """Pending charge rebuild for a property/resource pair, processed by ``rundbworker``.
+
+    At most one unclaimed job exists per pair: later changes only move ``since``
+    back, while ``created_at`` keeps the moment the charges first went stale.
+    """
+
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="rebuild_jobs")
+    resource_type = models.CharField(max_length=50, choices=Meter.RESOURCE_CHOICES)
+    since = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["property", "resource_type"],
+                condition=models.Q(claimed_at__isnull=True),
+                name="core_rebuildjob_one_pending_per_pair",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.property} {self.get_resource_type_display()} с {self.since or 'начала'}"
+
+
+class DataVersion(models.Model):
+    """Monotonic change counter shared by all workers to invalidate local caches."""
+
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.key}@{self.value}"
+
+
 class Profile(models.Model):
     ROLE_ADMIN = "admin"
     ROLE_EMPLOYEE = "employee"
@@ -0,0 +1,146 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only keyset pagination over a composite, unique ordering.
+
+    The cursor carries the ordering values of the last row served, so the next
+    page is a range condition on the ordering index instead of an OFFSET and
+    deep pages cost the same as the first one. Pagination is opt-in: without
+    ``cursor`` or ``page_size`` in the query the list is returned unpaginated,
+    unless ``optional`` is off.
+    """
+
+    ordering: tuple[str, ...] = ()
+    optional = True
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.optional and self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self._get_page_size(params)
+        queryset = queryset.order_by(*self.ordering)
+        raw_cursor = params.get(self.cursor_query_param)
+        if raw_cursor:
+            queryset = queryset.filter(self._after(self._decode(raw_cursor, queryset.model)))
+
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        self.last_position = self._position(rows[-1]) if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self._encode(self.last_position))
+
+    def _get_page_size(self, params):
+        try:
+            size = int(params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def _position(self, obj):
+        return [getattr(obj, field.lstrip("-")) for field in self.ordering]
+
+    def _after(self, position):
+        # Lexicographic "strictly after" on (f1, f2, ...), honouring each direction.
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _encode(self, position):
+        # Full isoformat keeps microseconds, which the equality legs of the range need.
+        values = [value.isoformat() if hasattr(value, "isoformat") else value for value in position]
+        payload = json.dumps(values, separators=(",", ":"))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def _load(self, raw):
+        padded = raw + "=" * (-len(raw) % 4)
+        values = json.loads(urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValueError
+        return values
+
+    def _decode(self, raw, model):
+        try:
+            values = self._load(raw)
+            return [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (BinasciiError, UnicodeDecodeError, ValueError, TypeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ReadingPagination(KeysetPagination):
+    ordering = ("-reading_date", "-created_at", "-id")
+
+
+class MonthlyChargePagination(KeysetPagination):
+    ordering = ("period", "id")
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ("-paid_at", "-created_at", "-id")
+
+
+class PortfolioRankingPagination(KeysetPagination):
+    """Ranking of per-property aggregate rows (dicts), largest ``total`` first.
+
+    The range condition on ``total`` lands in ``HAVING``, so every page is one
+    grouped query. The ranking is always paginated.
+    """
+
+    ordering = ("-total", "property_id")
+    page_size = 10
+    max_page_size = 100
+    optional = False
+
+    def _position(self, row):
+        return [str(row["total"]), row["property_id"]]
+
+    def _decode(self, raw, model):
+        try:
+            total, property_id = self._load(raw)
+            return [Decimal(total), int(property_id)]
+        except (BinasciiError, UnicodeDecodeError, ValueError, TypeError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
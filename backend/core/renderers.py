@@ -0,0 +1,77 @@
+import csv
+import io
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # optional speedup (the "fast-json" extra), DRF's encoder is used without it
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` backed by orjson when it is installed.
+
+    orjson serializes dicts, lists, strings, numbers and dates natively and
+    falls back to DRF's encoder for the rest (Decimal, lazy strings, querysets),
+    so the output matches the default renderer. Indented output and
+    environments without orjson go through the stock implementation.
+    """
+
+    _encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=self._encoder.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """Render list payloads as one array per field (``?format=columnar``).
+
+    ``[{"id": 1, "value": "5"}, ...]`` becomes
+    ``{"count": n, "columns": {"id": [1, ...], "value": ["5", ...]}}``, so field
+    names are sent once instead of once per row. Paginated payloads keep their
+    ``next`` link; anything that is not a list of objects is rendered unchanged.
+    """
+
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and self._is_rows(data.get("results")):
+            rest = {key: value for key, value in data.items() if key != "results"}
+            data = {**rest, **self._columns(data["results"])}
+        elif self._is_rows(data):
+            data = self._columns(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+    @staticmethod
+    def _is_rows(data):
+        return isinstance(data, list) and all(isinstance(row, dict) for row in data)
+
+    @staticmethod
+    def _columns(rows):
+        names = list(rows[0]) if rows else []
+        return {"count": len(rows), "columns": {name: [row.get(name) for row in rows] for name in names}}
+
+
+class CSVRenderer(BaseRenderer):
+    """Negotiates ``text/csv`` for the export endpoints.
+
+    Exports stream their rows themselves; this renderer only writes the bodies
+    of error responses, as ``key,value`` lines.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for key, value in data.items() if isinstance(data, dict) else [("detail", data)]:
+            writer.writerow([key, value])
+        return buffer.getvalue().encode(self.charset)
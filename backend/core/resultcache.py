@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+STATS_KEY = "resultcache:stats:{}"
+STATS = ("hits", "misses", "stale", "waits")
+
+
+def _count(name: str) -> None:
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First event since the cache was (re)started; a racing add keeps the other count.
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cache_stats() -> dict[str, int]:
+    values = cache.get_many([STATS_KEY.format(name) for name in STATS])
+    return {name: values.get(STATS_KEY.format(name), 0) for name in STATS}
+
+
+def cached_result(key, version, compute):
+    """Return ``(value, status)`` for ``key``, recomputing when the stored version differs.
+
+    Entries are stored as ``(version, value)`` under a version-less key, so a write
+    that bumps the version invalidates them without any delete while the old value
+    stays available as a stale fallback. Only the worker holding ``<key>:lock``
+    recomputes; the others serve the stale value or, with nothing to serve, wait
+    briefly for the holder. ``status`` is ``"hit"``, ``"miss"`` or ``"stale"``.
+    """
+
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        _count("hits")
+        return entry[1], "hit"
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, settings.RESULT_CACHE_LOCK_TIMEOUT):
+        if entry is not None:
+            _count("stale")
+            return entry[1], "stale"
+        _count("waits")
+        deadline = time.monotonic() + settings.RESULT_CACHE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == version:
+                _count("hits")
+                return entry[1], "hit"
+        # The holder is slow or died with the lock: compute this request's copy
+        # without touching the lock it still owns.
+        _count("misses")
+        value = compute()
+        cache.set(key, (version, value), settings.RESULT_CACHE_TIMEOUT)
+        return value, "miss"
+
+    try:
+        _count("misses")
+        value = compute()
+        cache.set(key, (version, value), settings.RESULT_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return value, "miss"
@@ -3,13 +3,49 @@ from decimal import Decimal
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-from .models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
-from .services import ensure_demo_data, find_tariff, get_previous_reading, process_reading
+from .models import Meter, MonthlyCharge, Payment, Property, PropertyBalance, Reading, Tariff
+from .services import ensure_demo_data, get_previous_reading, process_reading
+from .tariffs import get_tariff_timeline
 
 
-class UserSerializer(serializers.ModelSerializer):
+def _split_param(raw):
+    return {name.strip() for name in (raw or "").split(",") if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Trim read representations with ``?fields=``, ``?omit=`` and ``?expand=``.
+
+    Fields are removed from the serializer itself, so omitted
+    ``SerializerMethodField`` values are never computed. Fields listed in
+    ``expandable_fields`` (expand name -> field name) are only rendered when
+    expanded or named in ``fields``. Nested serializers are left untouched.
+    """
+
+    expandable_fields: dict[str, str] = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        params = request.query_params
+        only = _split_param(params.get("fields"))
+        expand = _split_param(params.get("expand"))
+        for name, field_name in self.expandable_fields.items():
+            if name not in expand and field_name not in only:
+                self.fields.pop(field_name, None)
+        if only:
+            for field_name in set(self.fields) - only:
+                self.fields.pop(field_name)
+        for field_name in _split_param(params.get("omit")):
+            self.fields.pop(field_name, None)
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     class Meta:
@@ -29,18 +65,20 @@ class UserSerializer(serializers.ModelSerializer):
         return value
 
 
-class PropertySerializer(serializers.ModelSerializer):
+class PropertySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    charges_stale_since = serializers.DateTimeField(read_only=True, allow_null=True)
+
     class Meta:
         model = Property
-        fields = ["id", "name", "address", "created_at"]
-        read_only_fields = ["id", "created_at"]
+        fields = ["id", "name", "address", "created_at", "charges_stale_since"]
+        read_only_fields = ["id", "created_at", "charges_stale_since"]
 
     def create(self, validated_data):
         user = self.context["request"].user
         return Property.objects.create(owner=user, **validated_data)
 
 
-class MeterSerializer(serializers.ModelSerializer):
+class MeterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Meter
         fields = [
@@ -61,7 +99,7 @@ class MeterSerializer(serializers.ModelSerializer):
         return value
 
 
-class TariffSerializer(serializers.ModelSerializer):
+class TariffSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Tariff
         fields = ["id", "resource_type", "value_per_unit", "valid_from", "valid_to"]
@@ -79,13 +117,15 @@ class TariffSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class ReadingSerializer(serializers.ModelSerializer):
+class ReadingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     meter_detail = MeterSerializer(source="meter", read_only=True)
     resource_label = serializers.SerializerMethodField()
     unit = serializers.SerializerMethodField()
     consumption_delta = serializers.SerializerMethodField()
     amount_value = serializers.SerializerMethodField()
 
+    expandable_fields = {"meter": "meter_detail"}
+
     class Meta:
         model = Reading
         fields = [
@@ -118,17 +158,33 @@ class ReadingSerializer(serializers.ModelSerializer):
         process_reading(reading)
         return reading
 
+    def _tariff_timeline(self):
+        # Shared through the root context, so a list serializes against one timeline.
+        timeline = self.context.get("tariff_timeline")
+        if timeline is None:
+            timeline = get_tariff_timeline()
+            self.context["tariff_timeline"] = timeline
+        return timeline
+
     def get_unit(self, obj):
         return obj.meter.unit
 
     def get_resource_label(self, obj):
         return obj.meter.get_resource_type_display()
 
+    def _previous_value(self, obj):
+        # List querysets annotate the value with a correlated subquery; single
+        # objects (create/retrieve responses) look it up.
+        if hasattr(obj, "previous_value"):
+            return obj.previous_value
+        previous = get_previous_reading(obj)
+        return previous.value if previous else None
+
     def get_consumption_delta(self, obj):
-        previous = get_previous_reading(obj.meter, obj.reading_date)
-        if not previous:
+        previous_value = self._previous_value(obj)
+        if previous_value is None:
             return None
-        delta = obj.value - previous.value
+        delta = obj.value - previous_value
         if delta <= 0:
             return None
         return float(delta)
@@ -137,13 +193,35 @@ class ReadingSerializer(serializers.ModelSerializer):
         delta = self.get_consumption_delta(obj)
         if delta is None:
             return None
-        tariff = find_tariff(obj.meter.resource_type, obj.reading_date)
+        tariff = self._tariff_timeline().find(obj.meter.resource_type, obj.reading_date)
         if not tariff:
             return None
         return float(tariff.value_per_unit * Decimal(str(delta)))
 
 
-class MonthlyChargeSerializer(serializers.ModelSerializer):
+class ReadingBulkItemSerializer(serializers.Serializer):
+    meter = serializers.IntegerField(min_value=1)
+    value = serializers.DecimalField(max_digits=12, decimal_places=3)
+    reading_date = serializers.DateField()
+
+    def validate_value(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Показание не может быть отрицательным")
+        return value
+
+
+class ReadingBulkSerializer(serializers.Serializer):
+    MAX_READINGS = 5000
+
+    readings = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=MAX_READINGS,
+    )
+    atomic = serializers.BooleanField(default=True)
+
+
+class MonthlyChargeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = MonthlyCharge
         fields = [
@@ -159,7 +237,13 @@ class MonthlyChargeSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PropertyBalanceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PropertyBalance
+        fields = ["property", "year", "month", "charged", "paid", "balance"]
+
+
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ["id", "property", "year", "month", "amount", "paid_at", "comment", "created_at"]
@@ -171,6 +255,12 @@ class PaymentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Нельзя добавлять платежи к чужой собственности")
         return value
 
+    def validate_year(self, value):
+        # Same bounds as dates and the analytics year parameters: keeps year * 12 + month in int4.
+        if value < 1 or value > 9999:
+            raise serializers.ValidationError("Год должен быть в диапазоне от 1 до 9999")
+        return value
+
     def validate_month(self, value):
         if value < 1 or value > 12:
             raise serializers.ValidationError("Месяц должен быть в диапазоне от 1 до 12")
@@ -0,0 +1,140 @@
+from datetime import date, timedelta
+
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from .models import Reading
+from .tariffs import get_tariff_timeline
+
+RESOLUTIONS = ("day", "week", "month", "quarter", "year")
+
+
+def charge_buckets(charges, resolution: str) -> list[dict]:
+    """Sum monthly ``charges`` (charges or rollups) per quarter or per year in SQL."""
+
+    if resolution == "quarter":
+        charges = charges.annotate(quarter=(F("month") + 2) / 3)
+        fields = ("year", "quarter")
+    else:
+        fields = ("year",)
+    rows = (
+        charges.values(*fields)
+        .annotate(total_consumption=Sum("consumption"), total_amount=Sum("amount"))
+        .order_by(*fields)
+    )
+    return [
+        {
+            "period": f"{row['year']}-Q{row['quarter']}" if resolution == "quarter" else str(row["year"]),
+            "consumption": float(row["total_consumption"]),
+            "amount": float(row["total_amount"]),
+        }
+        for row in rows
+    ]
+
+
+def reading_buckets(meters, start: date, end: date, resolution: str) -> list[dict]:
+    """Daily or weekly consumption and amount of ``meters`` between ``start`` and ``end``.
+
+    Each positive delta between consecutive readings is spread evenly over the
+    days it covers (linear interpolation of the meter value) and priced with the
+    tariff of the later reading, as monthly billing does. The readings just
+    outside the window anchor the intervals that cross its edges.
+    """
+
+    chain = Reading.objects.filter(meter=OuterRef("pk"))
+    before = chain.filter(reading_date__lt=start).order_by("-reading_date", "-created_at", "-id")
+    after = chain.filter(reading_date__gt=end).order_by("reading_date", "created_at", "id")
+    anchors = meters.annotate(
+        before_date=Subquery(before.values("reading_date")[:1]),
+        before_value=Subquery(before.values("value")[:1]),
+        after_date=Subquery(after.values("reading_date")[:1]),
+        after_value=Subquery(after.values("value")[:1]),
+    ).values_list("pk", "resource_type", "before_date", "before_value", "after_date", "after_value")
+    chains = {}
+    resources = {}
+    tails = {}
+    for meter_id, resource_type, before_date, before_value, after_date, after_value in anchors:
+        resources[meter_id] = resource_type
+        chains[meter_id] = [(before_date, before_value)] if before_date is not None else []
+        if after_date is not None:
+            tails[meter_id] = (after_date, after_value)
+
+    rows = (
+        Reading.objects.filter(meter_id__in=list(chains), reading_date__range=(start, end))
+        .order_by("meter_id", "reading_date", "created_at", "id")
+        .values_list("meter_id", "reading_date", "value")
+    )
+    for meter_id, reading_date, value in rows.iterator(chunk_size=5000):
+        chains[meter_id].append((reading_date, value))
+
+    # Difference arrays: an interval adds its per-day rate over a range of days.
+    days = (end - start).days + 1
+    consumption = [0.0] * (days + 1)
+    amount = [0.0] * (days + 1)
+    timeline = get_tariff_timeline()
+    for meter_id, points in chains.items():
+        if meter_id in tails:
+            points.append(tails[meter_id])
+        for (previous_date, previous_value), (reading_date, value) in zip(points, points[1:]):
+            delta = value - previous_value
+            if delta <= 0:
+                continue
+            tariff = timeline.find(resources[meter_id], reading_date)
+            if tariff is None:
+                continue
+            first = min(previous_date + timedelta(days=1), reading_date)
+            low, high = max(first, start), min(reading_date, end)
+            if low > high:
+                continue
+            span = (reading_date - first).days + 1
+            per_day = float(delta) / span
+            per_day_amount = float(delta * tariff.value_per_unit) / span
+            for series, rate in ((consumption, per_day), (amount, per_day_amount)):
+                series[(low - start).days] += rate
+                series[(high - start).days + 1] -= rate
+
+    buckets = {}
+    running_consumption = running_amount = 0.0
+    for offset in range(days):
+        running_consumption += consumption[offset]
+        running_amount += amount[offset]
+        day = start + timedelta(days=offset)
+        if resolution == "week":
+            day -= timedelta(days=day.weekday())
+        bucket = buckets.setdefault(day, [0.0, 0.0])
+        bucket[0] += running_consumption
+        bucket[1] += running_amount
+    return [
+        {"period": day.isoformat(), "consumption": values[0], "amount": values[1]}
+        for day, values in buckets.items()
+    ]
+
+
+def downsample(points: list[dict], threshold: int, key: str = "amount") -> list[dict]:
+    """Keep ``threshold`` of ``points`` with largest-triangle-three-buckets on ``key``.
+
+    The first and last points are kept; from every bucket in between the point
+    forming the largest triangle with the previously kept point and the mean of
+    the next bucket is chosen, which preserves peaks and troughs of the curve.
+    """
+
+    if threshold < 3 or len(points) <= threshold:
+        return points
+    every = (len(points) - 2) / (threshold - 2)
+    sampled = [points[0]]
+    kept = 0
+    for bucket in range(threshold - 2):
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, len(points))
+        next_x = (next_start + next_end - 1) / 2
+        next_y = sum(point[key] for point in points[next_start:next_end]) / (next_end - next_start)
+
+        anchor_x, anchor_y = kept, points[kept][key]
+        kept = max(
+            range(int(bucket * every) + 1, next_start),
+            key=lambda index: abs(
+                (anchor_x - next_x) * (points[index][key] - anchor_y) - (anchor_x - index) * (next_y - anchor_y)
+            ),
+        )
+        sampled.append(points[kept])
+    sampled.append(points[-1])
+    return sampled
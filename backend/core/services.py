@@ -1,86 +1,953 @@
+import threading
+from calendar import monthrange
+from contextlib import contextmanager
 from datetime import date, timedelta
-from decimal import Decimal
-from typing import Optional
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, Optional
 
-from django.db import transaction
-from django.db.models import Q, Sum
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Model, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
 
-from .models import Meter, MonthlyCharge, Property, Reading, Tariff
+from .models import (
+    Meter,
+    MonthlyCharge,
+    OwnerMonthlyPayments,
+    OwnerMonthlyRollup,
+    Payment,
+    Property,
+    PropertyBalance,
+    Reading,
+    RebuildJob,
+    Tariff,
+    month_period,
+)
+from .tariffs import get_tariff_timeline
+from .versions import bump_owner_version
 
+try:
+    import numpy
+except ImportError:  # optional speedup for the seasonal forecast (the "forecast" extra)
+    numpy = None
+
+
+def earlier_in_billing_order(reading_date, created_at, pk) -> Q:
+    """Match readings ordered before the given one by (reading_date, created_at, id).
+
+    The arguments may be ``OuterRef`` expressions, so list annotations and single
+    lookups share the order the charge rebuild uses.
+    """
 
-def get_previous_reading(meter: Meter, reading_date: date) -> Optional[Reading]:
     return (
-        meter.readings.filter(reading_date__lt=reading_date)
-        .order_by("-reading_date", "-created_at")
-        .first()
+        Q(reading_date__lt=reading_date)
+        | Q(reading_date=reading_date, created_at__lt=created_at)
+        | Q(reading_date=reading_date, created_at=created_at, id__lt=pk)
     )
 
 
-def find_tariff(resource_type: str, target_date: date) -> Optional[Tariff]:
+def get_previous_reading(reading: Reading) -> Optional[Reading]:
     return (
-        Tariff.objects.filter(
-            resource_type=resource_type,
-            valid_from__lte=target_date,
+        Reading.objects.filter(
+            earlier_in_billing_order(reading.reading_date, reading.created_at, reading.pk),
+            meter_id=reading.meter_id,
         )
-        .filter(Q(valid_to__isnull=True) | Q(valid_to__gte=target_date))
-        .order_by("-valid_from")
+        .order_by("-reading_date", "-created_at", "-id")
         .first()
     )
 
 
+def find_tariff(resource_type: str, target_date: date) -> Optional[Tariff]:
+    return get_tariff_timeline().find(resource_type, target_date)
+
+
+def affected_since(*reading_dates: Optional[date]) -> Optional[date]:
+    """Return the first day of the earliest month a reading change can re-rate.
+
+    A reading only feeds two deltas: its own and the one of the next reading on the
+    same meter, which can never be dated earlier. The window therefore starts at the
+    month of the earliest (old or new) reading date involved in the change.
+    """
+
+    dates = [value for value in reading_dates if value is not None]
+    if not dates:
+        return None
+    return min(dates).replace(day=1)
+
+
+REBUILD_SYNC = "sync"
+REBUILD_DEFERRED = "deferred"
+
+
+def rebuild_mode() -> str:
+    return getattr(settings, "CHARGES_REBUILD_MODE", REBUILD_SYNC)
+
+
+_rebuild_scope = threading.local()
+
+
+@contextmanager
+def coalesce_rebuilds():
+    """Collect rebuild requests and run each dirty pair once when the block exits.
+
+    The block runs in a transaction and the rebuilds happen just before it
+    commits, so charges never become visible out of step with the readings.
+    Nested blocks join the outermost one. On error the collected pairs are dropped
+    together with the rolled back writes.
+    """
+
+    if getattr(_rebuild_scope, "pairs", None) is not None:
+        yield
+        return
+
+    _rebuild_scope.pairs = {}
+    try:
+        with transaction.atomic():
+            yield
+            pairs, _rebuild_scope.pairs = _rebuild_scope.pairs, None
+            for (_, resource_type), (property_obj, since) in pairs.items():
+                request_rebuild(property_obj, resource_type, since=since)
+    finally:
+        _rebuild_scope.pairs = None
+
+
+def request_rebuild(property_obj: Property, resource_type: str, since: Optional[date] = None) -> None:
+    """Rebuild charges now, or queue a ``RebuildJob`` when the deferred mode is on.
+
+    Inside ``coalesce_rebuilds()`` the request is only recorded for the scope.
+    """
+
+    pairs = getattr(_rebuild_scope, "pairs", None)
+    if pairs is not None:
+        key = (property_obj.pk, resource_type)
+        if key in pairs:
+            pairs[key][1] = _earlier(pairs[key][1], since)
+        else:
+            pairs[key] = [property_obj, since]
+        return
+
+    if rebuild_mode() == REBUILD_DEFERRED:
+        enqueue_rebuild(property_obj.pk, resource_type, since)
+    else:
+        rebuild_monthly_charges(property_obj, resource_type, since=since)
+
+
 @transaction.atomic
 def process_reading(reading: Reading) -> None:
-    rebuild_monthly_charges(reading.meter.property, reading.meter.resource_type)
+    request_rebuild(
+        reading.meter.property,
+        reading.meter.resource_type,
+        since=affected_since(reading.reading_date),
+    )
 
 
-@transaction.atomic
-def rebuild_monthly_charges(property_obj: Property, resource_type: str) -> None:
-    MonthlyCharge.objects.filter(property=property_obj, resource_type=resource_type).delete()
-
-    meters = Meter.objects.filter(property=property_obj, resource_type=resource_type)
-    for meter in meters:
-        previous = None
-        readings = meter.readings.order_by("reading_date", "created_at", "id")
-        for reading in readings:
-            if previous is None:
-                previous = reading
-                continue
+CONSUMPTION_QUANT = Decimal("0.001")
+AMOUNT_QUANT = Decimal("0.01")
 
-            delta = reading.value - previous.value
-            previous = reading
-            if delta <= 0:
-                continue
 
-            tariff = find_tariff(resource_type, reading.reading_date)
-            if tariff is None:
-                continue
+def month_range_q(start: Optional[date] = None, end: Optional[date] = None) -> Q:
+    """Match rows whose ``period`` lies between the months of ``start`` and ``end`` inclusive."""
+
+    condition = Q()
+    if start is not None:
+        condition &= Q(period__gte=month_period(start.year, start.month))
+    if end is not None:
+        condition &= Q(period__lte=month_period(end.year, end.month))
+    return condition
+
+
+def _window_baselines(meters, window_start: date) -> dict[int, Decimal]:
+    """Last reading value before the window for every given meter, in one query."""
+
+    previous = (
+        Reading.objects.filter(meter=OuterRef("pk"), reading_date__lt=window_start)
+        .order_by("-reading_date", "-created_at", "-id")
+        .values("value")[:1]
+    )
+    rows = meters.annotate(baseline=Subquery(previous)).values_list("id", "baseline")
+    return {meter_id: baseline for meter_id, baseline in rows if baseline is not None}
+
+
+def _accumulate_charges(rows, resource_type: str, timeline, baselines=None) -> tuple[dict, int]:
+    """Sum positive deltas per (property, year, month) from rows ordered by meter and date.
+
+    ``rows`` yields ``(property_id, meter_id, value, reading_date)`` tuples;
+    ``baselines`` maps a meter to the value preceding its first row. Returns the
+    totals and the number of rows consumed.
+    """
+
+    baselines = baselines or {}
+    totals = {}
+    count = 0
+    current_meter = None
+    previous = None
+    for property_id, meter_id, value, reading_date in rows:
+        count += 1
+        if meter_id != current_meter:
+            current_meter = meter_id
+            previous = baselines.get(meter_id)
+        if previous is None:
+            previous = value
+            continue
+
+        delta = value - previous
+        previous = value
+        if delta <= 0:
+            continue
+
+        tariff = timeline.find(resource_type, reading_date)
+        if tariff is None:
+            continue
+
+        key = (property_id, reading_date.year, reading_date.month)
+        bucket = totals.setdefault(key, [Decimal("0"), Decimal("0")])
+        bucket[0] += delta
+        bucket[1] += delta * tariff.value_per_unit
+    return totals, count
+
 
-            charge, _ = MonthlyCharge.objects.get_or_create(
-                property=property_obj,
-                year=reading.reading_date.year,
-                month=reading.reading_date.month,
+def _rate_readings(readings, resource_type: str, baselines: dict) -> tuple[int, list[MonthlyCharge]]:
+    """Rate ``readings``, insert the charges with one ``bulk_create`` and return both."""
+
+    rows = readings.order_by("meter_id", "reading_date", "created_at", "id").values_list(
+        "meter__property_id", "meter_id", "value", "reading_date"
+    )
+    totals, rated = _accumulate_charges(rows.iterator(), resource_type, get_tariff_timeline(), baselines)
+    charges = MonthlyCharge.objects.bulk_create(
+        [
+            MonthlyCharge(
+                property_id=property_id,
+                year=year,
+                month=month,
+                period=month_period(year, month),
                 resource_type=resource_type,
-                defaults={"consumption": Decimal("0"), "amount": Decimal("0")},
+                consumption=consumption.quantize(CONSUMPTION_QUANT, rounding=ROUND_HALF_UP),
+                amount=amount.quantize(AMOUNT_QUANT, rounding=ROUND_HALF_UP),
+            )
+            for (property_id, year, month), (consumption, amount) in sorted(totals.items())
+        ]
+    )
+    return rated, charges
+
+
+def apply_rollup_delta(owner_id: int, resource_type: str, removed, added) -> None:
+    """Move ``OwnerMonthlyRollup`` by the charges one rebuild removed and added.
+
+    ``removed`` and ``added`` are ``(year, month, consumption, amount)`` rows.
+    Existing rollups are locked, so concurrent rebuilds of the same owner's
+    properties serialize on them; the query count does not depend on the number
+    of months touched.
+    """
+
+    deltas = {}
+    for sign, rows in ((-1, removed), (1, added)):
+        for year, month, consumption, amount in rows:
+            entry = deltas.setdefault(month_period(year, month), [year, month, Decimal("0"), Decimal("0"), 0])
+            entry[2] += sign * consumption
+            entry[3] += sign * amount
+            entry[4] += sign
+    deltas = {period: entry for period, entry in deltas.items() if any(entry[2:])}
+    if not deltas:
+        return
+
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                _apply_rollup_deltas(owner_id, resource_type, deltas)
+            return
+        except IntegrityError:
+            # Another transaction created one of the months first; it is now visible.
+            if attempt:
+                raise
+
+
+def _apply_rollup_deltas(owner_id: int, resource_type: str, deltas: dict) -> None:
+    rollups = OwnerMonthlyRollup.objects.filter(owner_id=owner_id, resource_type=resource_type, period__in=deltas)
+    existing = {rollup.period: rollup for rollup in rollups.select_for_update()}
+    changed = []
+    created = []
+    for period, (year, month, consumption, amount, count) in deltas.items():
+        rollup = existing.get(period)
+        if rollup is None:
+            if count > 0:
+                created.append(
+                    OwnerMonthlyRollup(
+                        owner_id=owner_id,
+                        year=year,
+                        month=month,
+                        period=period,
+                        resource_type=resource_type,
+                        consumption=consumption,
+                        amount=amount,
+                        charges=count,
+                    )
+                )
+            continue
+        rollup.consumption += consumption
+        rollup.amount += amount
+        rollup.charges = max(rollup.charges + count, 0)
+        changed.append(rollup)
+    OwnerMonthlyRollup.objects.bulk_update(changed, ["consumption", "amount", "charges"])
+    OwnerMonthlyRollup.objects.bulk_create(created)
+    rollups.filter(charges=0).delete()
+
+
+def rebuild_rollups(
+    owner_ids: Optional[Iterable[int]] = None,
+    resource_type: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> int:
+    """Recompute ``OwnerMonthlyRollup`` from ``MonthlyCharge`` for the given scope.
+
+    Without a ``resource_type`` the owners' ``OwnerMonthlyPayments`` are
+    recomputed as well.
+    """
+
+    rollups = OwnerMonthlyRollup.objects.filter(month_range_q(start, end))
+    charges = MonthlyCharge.objects.filter(month_range_q(start, end))
+    if owner_ids is not None:
+        owner_ids = list(owner_ids)
+        rollups = rollups.filter(owner_id__in=owner_ids)
+        charges = charges.filter(property__owner_id__in=owner_ids)
+    if resource_type is None:
+        rebuild_payment_rollups(owner_ids, start, end)
+    if resource_type is not None:
+        rollups = rollups.filter(resource_type=resource_type)
+        charges = charges.filter(resource_type=resource_type)
+
+    rows = (
+        charges.values("property__owner_id", "year", "month", "period", "resource_type")
+        .annotate(total_consumption=Sum("consumption"), total_amount=Sum("amount"), total_charges=Count("id"))
+        .order_by()
+    )
+    rollups.delete()
+    created = OwnerMonthlyRollup.objects.bulk_create(
+        [
+            OwnerMonthlyRollup(
+                owner_id=row["property__owner_id"],
+                year=row["year"],
+                month=row["month"],
+                period=row["period"],
+                resource_type=row["resource_type"],
+                consumption=row["total_consumption"],
+                amount=row["total_amount"],
+                charges=row["total_charges"],
+            )
+            for row in rows
+        ],
+        batch_size=5000,
+    )
+    return len(created)
+
+
+def apply_payment_rollup_delta(owner_id: int, rows) -> None:
+    """Move ``OwnerMonthlyPayments`` by signed ``(year, month, amount, count)`` rows of one owner."""
+
+    deltas = {}
+    for year, month, amount, count in rows:
+        entry = deltas.setdefault(month_period(year, month), [year, month, Decimal("0"), 0])
+        entry[2] += amount
+        entry[3] += count
+    deltas = {period: entry for period, entry in deltas.items() if any(entry[2:])}
+    if not deltas:
+        return
+
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                _apply_payment_rollup_deltas(owner_id, deltas)
+            return
+        except IntegrityError:
+            # Another transaction created one of the months first; it is now visible.
+            if attempt:
+                raise
+
+
+def _apply_payment_rollup_deltas(owner_id: int, deltas: dict) -> None:
+    months = OwnerMonthlyPayments.objects.filter(owner_id=owner_id, period__in=deltas)
+    existing = {row.period: row for row in months.select_for_update()}
+    changed = []
+    created = []
+    for period, (year, month, amount, count) in deltas.items():
+        row = existing.get(period)
+        if row is None:
+            if count > 0:
+                created.append(
+                    OwnerMonthlyPayments(
+                        owner_id=owner_id, year=year, month=month, period=period, amount=amount, payments=count
+                    )
+                )
+            continue
+        row.amount += amount
+        row.payments = max(row.payments + count, 0)
+        changed.append(row)
+    OwnerMonthlyPayments.objects.bulk_update(changed, ["amount", "payments"])
+    OwnerMonthlyPayments.objects.bulk_create(created)
+    months.filter(payments=0).delete()
+
+
+def rebuild_payment_rollups(
+    owner_ids: Optional[Iterable[int]] = None, start: Optional[date] = None, end: Optional[date] = None
+) -> int:
+    """Recompute ``OwnerMonthlyPayments`` from ``Payment`` for the given scope."""
+
+    months = OwnerMonthlyPayments.objects.filter(month_range_q(start, end))
+    payments = Payment.objects.filter(month_range_q(start, end))
+    if owner_ids is not None:
+        owner_ids = list(owner_ids)
+        months = months.filter(owner_id__in=owner_ids)
+        payments = payments.filter(property__owner_id__in=owner_ids)
+
+    rows = (
+        payments.values("property__owner_id", "year", "month", "period")
+        .annotate(total_amount=Sum("amount"), total_payments=Count("id"))
+        .order_by()
+    )
+    months.delete()
+    created = OwnerMonthlyPayments.objects.bulk_create(
+        [
+            OwnerMonthlyPayments(
+                owner_id=row["property__owner_id"],
+                year=row["year"],
+                month=row["month"],
+                period=row["period"],
+                amount=row["total_amount"],
+                payments=row["total_payments"],
+            )
+            for row in rows
+        ],
+        batch_size=5000,
+    )
+    return len(created)
+
+
+def _apply_owner_payments(rows) -> None:
+    # ``rows`` are signed ``(property_id, year, month, amount, count)``; owners are resolved in one query.
+    owners = dict(Property.objects.filter(pk__in={row[0] for row in rows}).values_list("pk", "owner_id"))
+    per_owner = {}
+    for property_id, year, month, amount, count in rows:
+        if property_id in owners:
+            per_owner.setdefault(owners[property_id], []).append((year, month, amount, count))
+    for owner_id, owner_rows in per_owner.items():
+        apply_payment_rollup_delta(owner_id, owner_rows)
+
+
+@receiver(post_delete, sender=Property)
+def property_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Model) and origin is not instance:
+        return  # cascaded from the owner, whose rollups are deleted with it
+    # The property's charges and payments went with it, so its owner's months are recomputed.
+    rebuild_rollups(owner_ids=[instance.owner_id])
+
+
+def apply_balance_delta(property_id: int, charged=(), paid=()) -> None:
+    """Move a property's ``PropertyBalance`` ledger by signed ``(year, month, amount)`` rows.
+
+    Months with a change are updated or created and the running balance is
+    recomputed from the earliest of them on; earlier months only provide the
+    opening balance. Writers of the same property serialize on its row lock.
+    """
+
+    deltas = {}
+    for column, rows in ((2, charged), (3, paid)):
+        for year, month, amount in rows:
+            entry = deltas.setdefault(month_period(year, month), [year, month, Decimal("0"), Decimal("0")])
+            entry[column] += amount
+    deltas = {period: entry for period, entry in deltas.items() if any(entry[2:])}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        list(Property.objects.select_for_update().filter(pk=property_id).values_list("pk"))
+        first = min(deltas)
+        ledger = PropertyBalance.objects.filter(property_id=property_id)
+        opening = ledger.filter(period__lt=first).order_by("-period").values_list("balance", flat=True).first()
+        rows = {row.period: row for row in ledger.filter(period__gte=first)}
+        existing = set(rows)
+        for period, (year, month, _, _) in deltas.items():
+            if period not in rows:
+                rows[period] = PropertyBalance(
+                    property_id=property_id, year=year, month=month, period=period, charged=0, paid=0
+                )
+
+        running = opening or Decimal("0")
+        for period in sorted(rows):
+            row = rows[period]
+            if period in deltas:
+                row.charged += deltas[period][2]
+                row.paid += deltas[period][3]
+            running += row.charged - row.paid
+            row.balance = running
+
+        # A month left with neither charges nor payments carries no information.
+        empty = {period for period, row in rows.items() if not row.charged and not row.paid}
+        PropertyBalance.objects.bulk_update(
+            [rows[period] for period in existing - empty], ["charged", "paid", "balance"], batch_size=1000
+        )
+        PropertyBalance.objects.bulk_create([rows[period] for period in set(rows) - existing - empty])
+        ledger.filter(period__in=existing & empty).delete()
+
+
+def rebuild_balances(property_ids: Optional[Iterable[int]] = None, start: Optional[date] = None) -> int:
+    """Recompute ``PropertyBalance`` from charges and payments for months from ``start`` on."""
+
+    ledger = PropertyBalance.objects.filter(month_range_q(start))
+    charges = MonthlyCharge.objects.filter(month_range_q(start))
+    payments = Payment.objects.filter(month_range_q(start))
+    openings = PropertyBalance.objects.none()
+    if start is not None:
+        first = month_period(start.year, start.month)
+        latest_before = (
+            PropertyBalance.objects.filter(property=OuterRef("property"), period__lt=first)
+            .order_by("-period")
+            .values("period")[:1]
+        )
+        openings = PropertyBalance.objects.filter(period=Subquery(latest_before))
+    if property_ids is not None:
+        property_ids = list(property_ids)
+        ledger, charges, payments, openings = (
+            qs.filter(property_id__in=property_ids) for qs in (ledger, charges, payments, openings)
+        )
+
+    months = {}
+    for column, source in ((2, charges), (3, payments)):
+        rows = (
+            source.values("property_id", "year", "month", "period")
+            .annotate(total=Sum("amount"))
+            .values_list("property_id", "year", "month", "period", "total")
+            .order_by()
+        )
+        for property_id, year, month, period, total in rows.iterator(chunk_size=5000):
+            entry = months.setdefault((property_id, period), [year, month, Decimal("0"), Decimal("0")])
+            entry[column] += total
+
+    running = dict(openings.values_list("property_id", "balance"))
+    created = []
+    for (property_id, period), (year, month, charged, paid) in sorted(months.items()):
+        running[property_id] = running.get(property_id, Decimal("0")) + charged - paid
+        created.append(
+            PropertyBalance(
+                property_id=property_id,
+                year=year,
+                month=month,
+                period=period,
+                charged=charged,
+                paid=paid,
+                balance=running[property_id],
+            )
+        )
+    ledger.delete()
+    PropertyBalance.objects.bulk_create(created, batch_size=5000)
+    return len(created)
+
+
+@receiver(pre_save, sender=Payment)
+def payment_saving(sender, instance, raw=False, **kwargs):
+    previous = None
+    if instance.pk is not None and not raw:
+        previous = Payment.objects.filter(pk=instance.pk).values_list("property_id", "year", "month", "amount").first()
+    instance._ledger_previous = previous
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_ledger_previous", None)
+    amount = Decimal(str(instance.amount))
+    changes = {instance.property_id: [(instance.year, instance.month, amount)]}
+    counted = [(instance.property_id, instance.year, instance.month, amount, 1)]
+    if previous is not None:
+        property_id, year, month, amount = previous
+        changes.setdefault(property_id, []).append((year, month, -amount))
+        counted.append((property_id, year, month, -amount, -1))
+    for property_id, rows in changes.items():
+        apply_balance_delta(property_id, paid=rows)
+    _apply_owner_payments(counted)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Model) and origin is not instance:
+        return  # cascaded from the property or owner, whose ledger goes with it
+    amount = Decimal(str(instance.amount))
+    apply_balance_delta(instance.property_id, paid=[(instance.year, instance.month, -amount)])
+    _apply_owner_payments([(instance.property_id, instance.year, instance.month, -amount, -1)])
+
+
+@transaction.atomic
+def rebuild_monthly_charges(
+    property_obj: Property,
+    resource_type: str,
+    since: Optional[date] = None,
+) -> int:
+    """Rebuild charges for a property/resource pair and return the readings rated.
+
+    Without ``since`` the whole history is re-rated. With ``since`` only months from
+    ``since`` onwards are recomputed; readings before the window only provide the
+    per-meter baseline for the first delta inside it. The number of queries does
+    not depend on the length of the history.
+    """
+
+    charges = MonthlyCharge.objects.filter(property=property_obj, resource_type=resource_type)
+    readings = Reading.objects.filter(meter__property=property_obj, meter__resource_type=resource_type)
+    baselines = {}
+    window_start = since.replace(day=1) if since is not None else None
+    if window_start is not None:
+        charges = charges.filter(month_range_q(window_start))
+        readings = readings.filter(reading_date__gte=window_start)
+        meters = Meter.objects.filter(property=property_obj, resource_type=resource_type)
+        baselines = _window_baselines(meters, window_start)
+    removed = list(charges.values_list("year", "month", "consumption", "amount"))
+    charges.delete()
+    rated, created = _rate_readings(readings, resource_type, baselines)
+    added = [(charge.year, charge.month, charge.consumption, charge.amount) for charge in created]
+    apply_rollup_delta(property_obj.owner_id, resource_type, removed, added)
+    apply_balance_delta(
+        property_obj.pk,
+        charged=[(year, month, -amount) for year, month, _, amount in removed]
+        + [(year, month, amount) for year, month, _, amount in added],
+    )
+    # Charges are written in bulk without signals; deferred rebuilds also land
+    # after the reading write that bumped the owner.
+    bump_owner_version(property_obj.owner_id)
+    return rated
+
+
+def tariff_windows(*tariffs: Tariff) -> dict[str, tuple[date, Optional[date]]]:
+    """Merge the validity ranges of tariff states into one window per resource type.
+
+    Pass the state before and after a write; ``None`` as the end means open-ended.
+    """
+
+    windows = {}
+    for tariff in tariffs:
+        if tariff is None:
+            continue
+        start, end = tariff.valid_from, tariff.valid_to
+        if tariff.resource_type in windows:
+            current_start, current_end = windows[tariff.resource_type]
+            start = min(start, current_start)
+            end = None if end is None or current_end is None else max(end, current_end)
+        windows[tariff.resource_type] = (start, end)
+    return windows
+
+
+@transaction.atomic
+def rerate_resource_window(resource_type: str, start: date, end: Optional[date] = None) -> int:
+    """Re-rate every property's charges of ``resource_type`` for the months in range.
+
+    This is set-based: one delete, one baseline query, one readings query and one
+    ``bulk_create`` cover the whole portfolio, whatever the number of properties.
+    """
+
+    window_start = start.replace(day=1)
+    readings = Reading.objects.filter(meter__resource_type=resource_type, reading_date__gte=window_start)
+    if end is not None:
+        readings = readings.filter(reading_date__lte=end.replace(day=monthrange(end.year, end.month)[1]))
+
+    MonthlyCharge.objects.filter(resource_type=resource_type).filter(month_range_q(window_start, end)).delete()
+    baselines = _window_baselines(Meter.objects.filter(resource_type=resource_type), window_start)
+    rated, _ = _rate_readings(readings, resource_type, baselines)
+    rebuild_rollups(resource_type=resource_type, start=window_start, end=end)
+    # Running balances depend on every earlier month, so they are redone to the end.
+    rebuild_balances(start=window_start)
+    return rated
+
+
+@transaction.atomic
+def enqueue_resource_window(resource_type: str, start: date) -> int:
+    """Queue a rebuild from ``start`` for every property metering ``resource_type``.
+
+    Set-based like ``rerate_resource_window``: one insert adds the missing pending
+    jobs (the unique constraint keeps existing ones) and one update moves the
+    ``since`` of the others back. Jobs re-rate to the end of history, which covers
+    any window end.
+    """
+
+    since = start.replace(day=1)
+    property_ids = list(
+        Meter.objects.filter(resource_type=resource_type).order_by().values_list("property_id", flat=True).distinct()
+    )
+    RebuildJob.objects.bulk_create(
+        [RebuildJob(property_id=property_id, resource_type=resource_type, since=since) for property_id in property_ids],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    RebuildJob.objects.filter(resource_type=resource_type, claimed_at__isnull=True, since__gt=since).update(since=since)
+    return len(property_ids)
+
+
+def rerate_for_tariffs(*tariffs: Tariff) -> int:
+    """Re-rate the months touched by a tariff write, given its old and new states.
+
+    In the deferred mode the work is queued as one ``RebuildJob`` per property
+    instead and the number of queued pairs is returned.
+    """
+
+    windows = tariff_windows(*tariffs)
+    if rebuild_mode() == REBUILD_DEFERRED:
+        return sum(enqueue_resource_window(resource_type, start) for resource_type, (start, _) in windows.items())
+    return sum(rerate_resource_window(resource_type, start, end) for resource_type, (start, end) in windows.items())
+
+
+def mark_affected(pairs: dict, property_id: int, resource_type: str, reading_date: date) -> None:
+    """Record that a (property, resource) pair must be re-rated from ``reading_date``."""
+
+    since = affected_since(reading_date)
+    key = (property_id, resource_type)
+    current = pairs.get(key)
+    pairs[key] = since if current is None else min(current, since)
+
+
+def rebuild_pairs(pairs: dict) -> int:
+    """Rebuild each ``(property_id, resource_type)`` pair from its recorded month."""
+
+    properties = Property.objects.in_bulk({property_id for property_id, _ in pairs})
+    for (property_id, resource_type), since in pairs.items():
+        property_obj = properties.get(property_id)
+        if property_obj is not None:
+            request_rebuild(property_obj, resource_type, since=since)
+    # Bulk-inserted readings send no signals, so their owners are bumped here.
+    for owner_id in {property_obj.owner_id for property_obj in properties.values()}:
+        bump_owner_version(owner_id)
+    return len(pairs)
+
+
+def rebuild_for_readings(readings: Iterable[Reading]) -> int:
+    """Rebuild every affected property/resource pair once, from its earliest reading."""
+
+    pairs = {}
+    for reading in readings:
+        mark_affected(pairs, reading.meter.property_id, reading.meter.resource_type, reading.reading_date)
+    return rebuild_pairs(pairs)
+
+
+@transaction.atomic
+def ingest_readings(readings: list[Reading]) -> list[Reading]:
+    """Insert readings in one batch and rebuild charges once per affected pair."""
+
+    created = Reading.objects.bulk_create(readings)
+    rebuild_for_readings(created)
+    return created
+
+
+def _earlier(current: Optional[date], candidate: Optional[date]) -> Optional[date]:
+    # ``None`` means "from the start of history" and wins over any date.
+    if current is None or candidate is None:
+        return None
+    return min(current, candidate)
+
+
+@transaction.atomic
+def enqueue_rebuild(property_id: int, resource_type: str, since: Optional[date] = None) -> RebuildJob:
+    """Create or widen the single pending job of the pair, coalescing bursts of writes."""
+
+    pending = RebuildJob.objects.filter(property_id=property_id, resource_type=resource_type, claimed_at__isnull=True)
+    job = pending.select_for_update().first()
+    if job is None:
+        try:
+            with transaction.atomic():
+                return RebuildJob.objects.create(property_id=property_id, resource_type=resource_type, since=since)
+        except IntegrityError:
+            job = pending.select_for_update().get()
+
+    window = _earlier(job.since, since)
+    if window != job.since:
+        job.since = window
+        job.save(update_fields=["since"])
+    return job
+
+
+def _release_job(job: RebuildJob, error: str = "") -> None:
+    """Return a claimed job to the queue, merging it into a newer pending job if any."""
+
+    with transaction.atomic():
+        pending = (
+            RebuildJob.objects.select_for_update()
+            .filter(property_id=job.property_id, resource_type=job.resource_type, claimed_at__isnull=True)
+            .first()
+        )
+        if pending is None:
+            RebuildJob.objects.filter(pk=job.pk).update(
+                claimed_at=None,
+                attempts=job.attempts + 1,
+                last_error=error,
             )
-            charge.consumption += delta
-            charge.amount += delta * tariff.value_per_unit
-            charge.save()
+            return
+        pending.since = _earlier(pending.since, job.since)
+        pending.created_at = min(pending.created_at, job.created_at)
+        pending.attempts = max(pending.attempts, job.attempts + 1)
+        pending.last_error = error or pending.last_error
+        pending.save(update_fields=["since", "created_at", "attempts", "last_error"])
+        job.delete()
+
+
+def release_stale_jobs(older_than: timedelta) -> int:
+    """Requeue jobs whose worker died before finishing them."""
+
+    stale = list(RebuildJob.objects.filter(claimed_at__lt=timezone.now() - older_than))
+    for job in stale:
+        _release_job(job, error="claim expired")
+    return len(stale)
+
+
+def claim_rebuild_job(max_attempts: int = 5) -> Optional[RebuildJob]:
+    """Claim the oldest pending job for this worker.
+
+    PostgreSQL uses ``SELECT ... FOR UPDATE SKIP LOCKED``. Backends without row
+    locks (SQLite) claim with a conditional UPDATE, so only one worker wins a row.
+    Jobs that failed ``max_attempts`` times stay queued for an operator to inspect.
+    """
+
+    pending = RebuildJob.objects.filter(claimed_at__isnull=True, attempts__lt=max_attempts).order_by(
+        "created_at", "id"
+    )
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = pending.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.claimed_at = now
+            job.save(update_fields=["claimed_at"])
+            return job
+
+    for job in pending[:10]:
+        if RebuildJob.objects.filter(pk=job.pk, claimed_at__isnull=True).update(claimed_at=now):
+            job.claimed_at = now
+            return job
+    return None
+
+
+def run_rebuild_job(job: RebuildJob) -> None:
+    try:
+        rebuild_monthly_charges(job.property, job.resource_type, since=job.since)
+    except Exception as exc:
+        _release_job(job, error=str(exc))
+        raise
+    job.delete()
+    bump_owner_version(job.property.owner_id)  # clears charges_stale_since
+
+
+FORECAST_MODELS = ("average", "seasonal")
 
 
 def forecast_property(property_obj: Property, months: int = 3) -> Decimal:
+    return forecast_properties([property_obj], months)[property_obj.pk]
+
+
+def forecast_properties(props, months: int = 3, model: str = "average") -> dict[int, Decimal]:
+    """Forecast the current month's amount for every property in ``props``.
+
+    ``average`` is the mean of each property's last ``months`` billed months
+    before the current one, taken from one grouped query ranked per property.
+    ``seasonal`` scales the same month last year by the trend of the trailing
+    ``months`` against the same months a year earlier; properties without last
+    year's month keep the average.
+    """
+
+    if model not in FORECAST_MODELS:
+        raise ValueError(f"model must be one of: {', '.join(FORECAST_MODELS)}")
+    if months < 1:
+        raise ValueError("months must be at least 1")
+    property_ids = list(dict.fromkeys(prop.pk if isinstance(prop, Model) else prop for prop in props))
+    forecasts = {property_id: Decimal("0") for property_id in property_ids}
+    if not property_ids:
+        return forecasts
+
     today = date.today()
-    # exclude current month
-    charges = (
-        MonthlyCharge.objects.filter(property=property_obj)
-        .exclude(year=today.year, month=today.month)
-        .values("year", "month")
+    current = month_period(today.year, today.month)
+    billed = MonthlyCharge.objects.exclude(period=current)
+    # Period of each property's ``months``-th most recent billed month.
+    cutoff = Subquery(
+        billed.filter(property_id=OuterRef("property_id"))
+        .order_by("-period")
+        .values("period")
+        .distinct()[months - 1 : months]
+    )
+    recent = (
+        billed.filter(property__in=property_ids)
+        .filter(period__gte=Coalesce(cutoff, 0))
+        .order_by()
+        .values("property_id")
+        .annotate(total_amount=Sum("amount"), billed_months=Count("period", distinct=True))
+        .values_list("property_id", "total_amount", "billed_months")
+    )
+    for property_id, total, count in recent:
+        forecasts[property_id] = total / count
+
+    if model == "seasonal":
+        for property_id, value in _seasonal_forecasts(property_ids, current, months).items():
+            forecasts[property_id] = value
+    return forecasts
+
+
+def forecast_owner(owner_id: int, months: int = 3) -> Decimal:
+    """Forecast an owner's whole-portfolio amount for the current month from the rollup.
+
+    The ``average`` model over owner totals: the mean of the last ``months``
+    billed months before the current one. Divided by the number of properties it
+    equals the mean of ``forecast_properties`` whenever the properties were
+    billed in the same recent months.
+    """
+
+    today = date.today()
+    totals = list(
+        OwnerMonthlyRollup.objects.filter(owner_id=owner_id)
+        .exclude(period=month_period(today.year, today.month))
+        .values("period")
+        .annotate(total_amount=Sum("amount"))
+        .order_by("-period")
+        .values_list("total_amount", flat=True)[:months]
+    )
+    return sum(totals, Decimal("0")) / len(totals) if totals else Decimal("0")
+
+
+def _seasonal_forecasts(property_ids, current: int, months: int) -> dict[int, Decimal]:
+    # Matrix of monthly totals: one row per property, column ``lag - 1`` holds
+    # the month ``lag`` months before the current one (lags 1..12 + months).
+    width = 12 + months
+    rows = (
+        MonthlyCharge.objects.filter(property__in=property_ids, period__gte=current - width, period__lt=current)
+        .values("property_id", "period")
         .annotate(total_amount=Sum("amount"))
-        .order_by("-year", "-month")
+        .values_list("property_id", "period", "total_amount")
     )
-    totals = [c["total_amount"] for c in charges[:months]]
-    if not totals:
-        return Decimal("0")
-    return sum(totals) / len(totals)
+    index = {property_id: row for row, property_id in enumerate(property_ids)}
+    cells = [(index[property_id], current - period - 1, float(total)) for property_id, period, total in rows]
+
+    if numpy is not None:
+        matrix = numpy.zeros((len(property_ids), width))
+        if cells:
+            row_idx, col_idx, values = zip(*cells)
+            matrix[list(row_idx), list(col_idx)] = values
+        last_year = matrix[:, 11]
+        trailing = matrix[:, :months].sum(axis=1)
+        year_before = matrix[:, 12:].sum(axis=1)
+        trend = numpy.divide(trailing, year_before, out=numpy.ones_like(trailing), where=year_before > 0)
+        seasonal = (last_year * trend).tolist()
+        has_season = (last_year > 0).tolist()
+    else:
+        matrix = [[0.0] * width for _ in property_ids]
+        for row, col, value in cells:
+            matrix[row][col] = value
+        seasonal, has_season = [], []
+        for line in matrix:
+            year_before = sum(line[12:])
+            trend = sum(line[:months]) / year_before if year_before > 0 else 1.0
+            seasonal.append(line[11] * trend)
+            has_season.append(line[11] > 0)
+
+    return {
+        property_id: Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        for property_id, value, present in zip(property_ids, seasonal, has_season)
+        if present
+    }
 
 
 def ensure_demo_data(user) -> None:
@@ -139,9 +1006,10 @@ def ensure_demo_data(user) -> None:
         (Meter.HOT_WATER, Decimal("11.1"), date.today().replace(day=1) - timedelta(days=15)),
     ]
 
-    for resource, value, reading_date in history:
-        meter = meter_map.get(resource)
-        if not meter:
-            continue
-        reading = Reading.objects.create(meter=meter, value=value, reading_date=reading_date)
-        process_reading(reading)
+    with coalesce_rebuilds():
+        for resource, value, reading_date in history:
+            meter = meter_map.get(resource)
+            if not meter:
+                continue
+            reading = Reading.objects.create(meter=meter, value=value, reading_date=reading_date)
+            process_reading(reading)
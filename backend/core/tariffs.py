@@ -0,0 +1,88 @@
+import threading
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Tariff
+from .versions import TARIFFS_KEY, bump_version, get_version
+
+
+class TariffTimeline:
+    """Per-resource index of tariff validity answering lookups with a bisect.
+
+    Overlapping tariffs are flattened into consecutive segments, each resolved to
+    the tariff with the latest ``valid_from`` covering it, which mirrors the
+    ``-valid_from`` ordering of the database lookup.
+    """
+
+    def __init__(self, tariffs: Iterable[Tariff], version: int = 0):
+        self.version = version
+        grouped = {}
+        for tariff in tariffs:
+            grouped.setdefault(tariff.resource_type, []).append(tariff)
+        self._segments = {
+            resource_type: self._build_segments(items) for resource_type, items in grouped.items()
+        }
+
+    @staticmethod
+    def _build_segments(tariffs: list[Tariff]) -> tuple[list[date], list[Optional[Tariff]]]:
+        boundaries = set()
+        for tariff in tariffs:
+            boundaries.add(tariff.valid_from)
+            if tariff.valid_to is not None and tariff.valid_to < date.max:
+                boundaries.add(tariff.valid_to + timedelta(days=1))
+
+        starts = sorted(boundaries)
+        winners = []
+        for start in starts:
+            covering = [
+                tariff
+                for tariff in tariffs
+                if tariff.valid_from <= start and (tariff.valid_to is None or tariff.valid_to >= start)
+            ]
+            winners.append(max(covering, key=lambda item: (item.valid_from, item.pk), default=None))
+        return starts, winners
+
+    def find(self, resource_type: str, target_date: date) -> Optional[Tariff]:
+        segments = self._segments.get(resource_type)
+        if segments is None:
+            return None
+        starts, winners = segments
+        index = bisect_right(starts, target_date) - 1
+        if index < 0:
+            return None
+        return winners[index]
+
+
+_lock = threading.Lock()
+_timeline: Optional[TariffTimeline] = None
+
+
+def get_tariff_timeline() -> TariffTimeline:
+    """Return the cached timeline, reloading it when another worker changed tariffs."""
+
+    global _timeline
+    version = get_version(TARIFFS_KEY)
+    timeline = _timeline
+    if timeline is not None and timeline.version == version:
+        return timeline
+    with _lock:
+        timeline = TariffTimeline(Tariff.objects.all(), version)
+        _timeline = timeline
+    return timeline
+
+
+def invalidate_tariff_timeline() -> None:
+    global _timeline
+    with _lock:
+        _timeline = None
+
+
+@receiver(post_save, sender=Tariff)
+@receiver(post_delete, sender=Tariff)
+def tariff_changed(sender, **kwargs):
+    bump_version(TARIFFS_KEY)
+    invalidate_tariff_timeline()
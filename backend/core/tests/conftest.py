@@ -3,11 +3,18 @@ from decimal import Decimal
 
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from rest_framework.test import APIClient
 
 from core.models import Meter, Property, Tariff
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Data versions restart with every test database, so cached results must not leak.
+    cache.clear()
+
+
 @pytest.fixture
 def user(db):
     return User.objects.create_user(username="alice", password="password123", email="alice@example.com")
@@ -1,11 +1,26 @@
+import csv
+import gzip
+import io
+import json
+import random
 from datetime import date, timedelta
 from decimal import Decimal
 
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
-from core.models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
+from core import renderers
+from core.authentication import USER_KEY
+from core.models import Meter, MonthlyCharge, Payment, Profile, Property, Reading, RebuildJob, Tariff
+from core.services import enqueue_rebuild, rebuild_balances, rebuild_monthly_charges, rebuild_rollups
+from core.versions import bump_version, user_key
+from core.views import CSVExportView, ReadingViewSet
 
 
 @pytest.mark.django_db
@@ -112,6 +127,14 @@ def test_payment_validation(api_client, property_obj):
     )
     assert ok.status_code == 201
 
+    for year, month in ((-1, 1), (0, 1), (10000, 1), (2**31, 1), (2024, 13)):
+        invalid = api_client.post(
+            "/api/payments/",
+            {"property": property_obj.id, "year": year, "month": month, "amount": "1.00", "paid_at": "2024-01-01"},
+            format="json",
+        )
+        assert invalid.status_code == 400
+
 
 @pytest.mark.django_db
 def test_tariff_crud_admin(admin_api_client):
@@ -179,6 +202,76 @@ def test_tariff_write_allowed_for_employee(employee_user):
     assert response.status_code == 201
 
 
+def _bearer_client(username):
+    client = APIClient()
+    response = client.post("/api/auth/login/", {"username": username, "password": "password123"}, format="json")
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+    return client
+
+
+def _auth_queries(queries):
+    return [query["sql"] for query in queries if '"auth_user"' in query["sql"] or '"core_profile"' in query["sql"]]
+
+
+@pytest.mark.django_db
+def test_jwt_user_and_role_come_from_cache_until_they_change(employee_user):
+    client = _bearer_client(employee_user.username)
+    assert client.get("/api/tariffs/").status_code == 200
+
+    payload = {"resource_type": Meter.GAS, "value_per_unit": "8.00", "valid_from": "2024-06-01"}
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get("/api/tariffs/").status_code == 200
+        assert client.post("/api/tariffs/", payload, format="json").status_code == 201
+    assert _auth_queries(queries) == []
+
+    employee_user.profile.role = "user"
+    employee_user.profile.save()
+    assert client.post("/api/tariffs/", payload, format="json").status_code == 403
+
+    employee_user.is_active = False
+    employee_user.save()
+    assert client.get("/api/tariffs/").status_code == 401
+
+
+@pytest.mark.django_db
+def test_jwt_cached_user_follows_changes_from_other_processes(employee_user):
+    client = _bearer_client(employee_user.username)
+    payload = {"resource_type": Meter.GAS, "value_per_unit": "8.00", "valid_from": "2024-06-01"}
+    assert client.post("/api/tariffs/", payload, format="json").status_code == 201
+
+    # Another worker demotes the user: its signal bumps the version but cannot
+    # reach this process's cache entry.
+    Profile.objects.filter(user=employee_user).update(role="user")
+    bump_version(user_key(employee_user.pk))
+    assert client.post("/api/tariffs/", payload, format="json").status_code == 403
+
+
+@pytest.mark.django_db
+def test_jwt_shared_cache_skips_version_lookup_and_keeps_no_password(employee_user, settings):
+    settings.AUTH_USER_CACHE_VERSIONED = False
+    client = _bearer_client(employee_user.username)
+    assert client.get("/api/tariffs/").status_code == 200
+    assert employee_user.password not in repr(cache.get(USER_KEY.format(employee_user.pk)))
+
+    payload = {"resource_type": Meter.GAS, "value_per_unit": "8.00", "valid_from": "2024-06-01"}
+    with CaptureQueriesContext(connection) as queries:
+        assert client.post("/api/tariffs/", payload, format="json").status_code == 201
+    assert not [query for query in queries if user_key(employee_user.pk) in query["sql"]]
+    assert _auth_queries(queries) == []
+
+
+@pytest.mark.django_db
+def test_jwt_password_change_revokes_cached_user(user, monkeypatch):
+    # simplejwt rebinds its settings on setting_changed, which imported references miss.
+    monkeypatch.setattr(jwt_settings, "CHECK_REVOKE_TOKEN", True)
+    client = _bearer_client(user.username)
+    assert client.get("/api/properties/").status_code == 200
+
+    user.set_password("changed12345")
+    user.save()
+    assert client.get("/api/properties/").status_code == 401
+
+
 @pytest.mark.django_db
 def test_analytics_returns_summary(api_client, property_obj, meter, tariff):
     today = date.today()
@@ -310,6 +403,46 @@ def test_analytics_rejects_invalid_params(api_client):
     assert all(response.status_code == 400 for response in responses)
 
 
+@pytest.mark.django_db
+def test_analytics_resolution_buckets(api_client, user, property_obj, meter):
+    for year, month, amount in ((2023, 2, "10"), (2023, 3, "20"), (2023, 11, "40"), (2024, 1, "80")):
+        MonthlyCharge.objects.create(
+            property=property_obj,
+            year=year,
+            month=month,
+            resource_type=Meter.ELECTRICITY,
+            consumption=Decimal("1"),
+            amount=Decimal(amount),
+        )
+    rebuild_rollups()
+    params = {"start_year": 2023, "start_month": 1, "end_year": 2024, "end_month": 12}
+
+    for extra in ({}, {"property": property_obj.id}):
+        quarters = api_client.get("/api/analytics/", {**params, **extra, "resolution": "quarter"}).data
+        assert quarters["resolution"] == "quarter"
+        assert quarters["series"] == [
+            {"period": "2023-Q1", "consumption": 2.0, "amount": 30.0},
+            {"period": "2023-Q4", "consumption": 1.0, "amount": 40.0},
+            {"period": "2024-Q1", "consumption": 1.0, "amount": 80.0},
+        ]
+        years = api_client.get("/api/analytics/", {**params, **extra, "resolution": "year"}).data
+        assert [(point["period"], point["amount"]) for point in years["series"]] == [("2023", 70.0), ("2024", 80.0)]
+
+    months = api_client.get("/api/analytics/", params).data
+    assert months["resolution"] == "month"
+    assert [point["period"] for point in months["series"]] == ["2023-02", "2023-03", "2023-11", "2024-01"]
+    # Actual days of the four billed months rather than 30 per month.
+    assert months["summary"]["average_daily_amount"] == pytest.approx(150 / (28 + 31 + 30 + 31))
+
+    days = api_client.get("/api/analytics/", {**params, "resolution": "day", "max_points": 50}).data
+    assert len(days["series"]) == 50
+    assert days["series"][0]["period"] == "2023-01-01"
+    assert days["series"][-1]["period"] == "2024-12-31"
+
+    for bad in ({"resolution": "hour"}, {"resolution": "day", "start_year": 1990}, {"max_points": 2}):
+        assert api_client.get("/api/analytics/", {**params, **bad}).status_code == 400
+
+
 @pytest.mark.django_db
 def test_analytics_forecast_validation(api_client, property_obj):
     missing = api_client.get("/api/analytics/forecast/")
@@ -320,3 +453,724 @@ def test_analytics_forecast_validation(api_client, property_obj):
     assert unknown.status_code == 404
     assert ok.status_code == 200
     assert ok.data == {"forecast_amount": 0.0}
+
+
+@pytest.mark.django_db
+def test_analytics_forecast_for_several_properties(api_client, user, property_obj):
+    other = Property.objects.create(owner=user, name="Дача", address="СНТ")
+    stranger = Property.objects.create(
+        owner=User.objects.create_user(username="stranger", password="pass12345"), name="Чужой", address="Далеко"
+    )
+    today = date.today()
+    last_month = today.replace(day=1) - timedelta(days=1)
+    for prop, amount in ((property_obj, "100"), (other, "300"), (stranger, "900")):
+        MonthlyCharge.objects.create(
+            property=prop,
+            year=last_month.year,
+            month=last_month.month,
+            resource_type=Meter.ELECTRICITY,
+            consumption=Decimal("1"),
+            amount=Decimal(amount),
+        )
+
+    response = api_client.get(
+        "/api/analytics/forecast/", {"properties": f"{other.id},{property_obj.id},{stranger.id}", "model": "seasonal"}
+    )
+    assert response.status_code == 200
+    assert response.data == {
+        "forecasts": [
+            {"property": property_obj.id, "forecast_amount": 100.0},
+            {"property": other.id, "forecast_amount": 300.0},
+        ],
+        "forecast_amount": 200.0,
+    }
+    assert api_client.get("/api/analytics/forecast/", {"properties": "1", "model": "naive"}).status_code == 400
+    assert api_client.get("/api/analytics/forecast/", {"property": "abc"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_bulk_readings_create_and_rebuild_once_per_pair(api_client, property_obj, meter, tariff):
+    water = Meter.objects.create(property=property_obj, resource_type=Meter.COLD_WATER, unit="m3")
+    Tariff.objects.create(resource_type=Meter.COLD_WATER, value_per_unit=Decimal("40.00"), valid_from=tariff.valid_from)
+    start = tariff.valid_from
+
+    def payload(count):
+        rows = []
+        for idx in range(count):
+            rows.append({"meter": meter.id, "value": str(10 * (idx + 1)), "reading_date": str(start + timedelta(days=idx))})
+            rows.append({"meter": water.id, "value": str(idx + 1), "reading_date": str(start + timedelta(days=idx))})
+        return {"readings": rows}
+
+    response = api_client.post("/api/readings/bulk/", payload(6), format="json")
+
+    assert response.status_code == 201
+    assert response.data == {"created": 12, "errors": []}
+    electricity = MonthlyCharge.objects.get(property=property_obj, resource_type=Meter.ELECTRICITY)
+    assert electricity.consumption == Decimal("50.000")
+    assert electricity.amount == Decimal("275.00")
+    assert MonthlyCharge.objects.get(property=property_obj, resource_type=Meter.COLD_WATER).amount == Decimal("200.00")
+
+
+@pytest.mark.django_db
+def test_bulk_readings_atomic_and_partial_modes(api_client, meter):
+    stranger = User.objects.create_user(username="other", password="pass123")
+    foreign_property = Property.objects.create(owner=stranger, name="Чужая", address="Не ваша")
+    foreign_meter = Meter.objects.create(property=foreign_property, resource_type=Meter.GAS, unit="m3")
+    rows = [
+        {"meter": meter.id, "value": "1.000", "reading_date": "2024-01-01"},
+        {"meter": foreign_meter.id, "value": "2.000", "reading_date": "2024-01-02"},
+        {"meter": meter.id, "value": "-3.000", "reading_date": "2024-01-03"},
+        {"meter": meter.id, "value": "4.000", "reading_date": "2024-01-04"},
+    ]
+
+    rejected = api_client.post("/api/readings/bulk/", {"readings": rows}, format="json")
+    assert rejected.status_code == 400
+    assert rejected.data["created"] == 0
+    assert [error["index"] for error in rejected.data["errors"]] == [1, 2]
+    assert "meter" in rejected.data["errors"][0]["errors"]
+    assert "value" in rejected.data["errors"][1]["errors"]
+    assert Reading.objects.count() == 0
+
+    partial = api_client.post("/api/readings/bulk/", {"readings": rows, "atomic": False}, format="json")
+    assert partial.status_code == 201
+    assert partial.data["created"] == 2
+    assert [error["index"] for error in partial.data["errors"]] == [1, 2]
+    assert set(Reading.objects.values_list("value", flat=True)) == {Decimal("1.000"), Decimal("4.000")}
+    assert not Reading.objects.filter(meter=foreign_meter).exists()
+
+    empty = api_client.post("/api/readings/bulk/", {"readings": []}, format="json")
+    assert empty.status_code == 400
+
+
+def _charge_rows(property_obj):
+    return {
+        (charge.year, charge.month): (charge.pk, charge.consumption, charge.amount)
+        for charge in MonthlyCharge.objects.filter(property=property_obj, resource_type=Meter.ELECTRICITY)
+    }
+
+
+@pytest.mark.django_db
+def test_tariff_writes_rerate_only_affected_months(admin_api_client, property_obj, meter):
+    other_owner = User.objects.create_user(username="other", password="pass123")
+    other_property = Property.objects.create(owner=other_owner, name="Чужой", address="Адрес")
+    other_meter = Meter.objects.create(property=other_property, resource_type=Meter.ELECTRICITY, unit="kWh")
+    base = Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("1.00"), valid_from=date(2023, 1, 1))
+    for target in (meter, other_meter):
+        for month in range(1, 7):
+            Reading.objects.create(meter=target, value=Decimal(10 * month), reading_date=date(2024, month, 15))
+        rebuild_monthly_charges(target.property, Meter.ELECTRICITY)
+    before = _charge_rows(property_obj)
+
+    created = admin_api_client.post(
+        "/api/tariffs/",
+        {"resource_type": Meter.ELECTRICITY, "value_per_unit": "3.00", "valid_from": "2024-04-20", "valid_to": "2024-05-31"},
+        format="json",
+    )
+    assert created.status_code == 201
+
+    after = _charge_rows(property_obj)
+    assert {key: after[key] for key in [(2024, 2), (2024, 3), (2024, 6)]} == {
+        key: before[key] for key in [(2024, 2), (2024, 3), (2024, 6)]
+    }
+    assert after[(2024, 4)][2] == Decimal("10.00")
+    assert after[(2024, 5)][2] == Decimal("30.00")
+    assert _charge_rows(other_property)[(2024, 5)][2] == Decimal("30.00")
+
+    updated = admin_api_client.patch(f"/api/tariffs/{base.id}/", {"value_per_unit": "2.00"}, format="json")
+    assert updated.status_code == 200
+    assert _charge_rows(property_obj)[(2024, 2)][2] == Decimal("20.00")
+    assert _charge_rows(property_obj)[(2024, 5)][2] == Decimal("30.00")
+
+    deleted = admin_api_client.delete(f"/api/tariffs/{created.data['id']}/")
+    assert deleted.status_code == 204
+    rerated = _charge_rows(property_obj)
+    assert rerated[(2024, 5)][2] == Decimal("20.00")
+
+    rebuild_monthly_charges(property_obj, Meter.ELECTRICITY)
+    assert {key: row[1:] for key, row in rerated.items()} == {
+        key: row[1:] for key, row in _charge_rows(property_obj).items()
+    }
+
+
+@pytest.mark.django_db
+def test_tariff_writes_queue_rebuild_jobs_in_deferred_mode(settings, admin_api_client, property_obj, meter):
+    other_property = Property.objects.create(owner=property_obj.owner, name="Дача", address="Лес")
+    other_meter = Meter.objects.create(property=other_property, resource_type=Meter.ELECTRICITY, unit="kWh")
+    Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("1.00"), valid_from=date(2023, 1, 1))
+    for target in (meter, other_meter):
+        for month in range(1, 7):
+            Reading.objects.create(meter=target, value=Decimal(10 * month), reading_date=date(2024, month, 15))
+        rebuild_monthly_charges(target.property, Meter.ELECTRICITY)
+    enqueue_rebuild(other_property.pk, Meter.ELECTRICITY, date(2024, 5, 1))
+    before = _charge_rows(property_obj)
+    settings.CHARGES_REBUILD_MODE = "deferred"
+
+    created = admin_api_client.post(
+        "/api/tariffs/",
+        {"resource_type": Meter.ELECTRICITY, "value_per_unit": "3.00", "valid_from": "2024-04-20", "valid_to": "2024-05-31"},
+        format="json",
+    )
+    assert created.status_code == 201
+
+    assert _charge_rows(property_obj) == before
+    jobs = dict(RebuildJob.objects.values_list("property_id", "since"))
+    assert jobs == {property_obj.pk: date(2024, 4, 1), other_property.pk: date(2024, 4, 1)}
+
+    call_command("rundbworker", "--once", stdout=io.StringIO())
+    assert not RebuildJob.objects.exists()
+    assert _charge_rows(property_obj)[(2024, 5)][2] == Decimal("30.00")
+    assert _charge_rows(other_property)[(2024, 4)][2] == Decimal("10.00")
+
+
+@pytest.mark.django_db
+def test_reading_list_uses_constant_queries(api_client, property_obj, meter, tariff):
+    water = Meter.objects.create(property=property_obj, resource_type=Meter.COLD_WATER, unit="m3")
+    start = tariff.valid_from
+
+    def list_queries():
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get("/api/readings/")
+        assert response.status_code == 200
+        return len(queries), response.data
+
+    for idx in range(3):
+        Reading.objects.create(meter=meter, value=Decimal(10 * (idx + 1)), reading_date=start + timedelta(days=idx))
+        Reading.objects.create(meter=water, value=Decimal(idx + 1), reading_date=start + timedelta(days=idx))
+    list_queries()
+    small_count, _ = list_queries()
+
+    for idx in range(3, 30):
+        Reading.objects.create(meter=meter, value=Decimal(10 * (idx + 1)), reading_date=start + timedelta(days=idx))
+    large_count, data = list_queries()
+
+    assert small_count == large_count
+    electricity = [item for item in data if item["meter"] == meter.id]
+    assert len(electricity) == 30
+    assert electricity[-1]["consumption_delta"] is None
+    assert electricity[0]["consumption_delta"] == 10.0
+    assert electricity[0]["amount_value"] == pytest.approx(55.0)
+    assert electricity[0]["unit"] == "kWh"
+
+    detail = api_client.get(f"/api/readings/{electricity[0]['id']}/")
+    assert detail.data["consumption_delta"] == 10.0
+
+
+@pytest.mark.django_db
+def test_reading_previous_value_agrees_across_list_detail_and_create(api_client, meter, tariff):
+    reading_date = tariff.valid_from + timedelta(days=3)
+    Reading.objects.create(meter=meter, value=Decimal("100"), reading_date=reading_date - timedelta(days=1))
+    Reading.objects.create(meter=meter, value=Decimal("105"), reading_date=reading_date)
+
+    created = api_client.post(
+        "/api/readings/",
+        {"meter": meter.id, "value": "110.000", "reading_date": reading_date.isoformat()},
+        format="json",
+    )
+    assert created.status_code == 201
+    assert created.data["consumption_delta"] == 5.0
+
+    detail = api_client.get(f"/api/readings/{created.data['id']}/")
+    listed = {item["id"]: item for item in api_client.get("/api/readings/").data}
+    assert detail.data["consumption_delta"] == listed[created.data["id"]]["consumption_delta"] == 5.0
+
+
+@pytest.mark.django_db
+def test_reading_list_keyset_pages_and_date_filters(api_client, property_obj, meter, tariff):
+    start = tariff.valid_from
+    # Two readings share each date so the cursor has to break ties on created_at/id.
+    for idx in range(6):
+        Reading.objects.create(meter=meter, value=Decimal(10 * idx), reading_date=start + timedelta(days=idx // 2))
+
+    assert isinstance(api_client.get("/api/readings/").data, list)
+
+    seen = []
+    url = "/api/readings/?page_size=4"
+    while url:
+        response = api_client.get(url)
+        assert response.status_code == 200
+        assert len(response.data["results"]) <= 4
+        seen.extend(item["id"] for item in response.data["results"])
+        url = response.data["next"]
+    expected = list(Reading.objects.order_by("-reading_date", "-created_at", "-id").values_list("id", flat=True))
+    assert seen == expected
+
+    # The first reading inside the range still measures against its predecessor outside it.
+    filtered = api_client.get(
+        "/api/readings/",
+        {"reading_date__gte": (start + timedelta(days=1)).isoformat(), "reading_date__lte": (start + timedelta(days=1)).isoformat()},
+    )
+    assert [item["value"] for item in filtered.data] == ["30.000", "20.000"]
+    assert [item["consumption_delta"] for item in filtered.data] == [10.0, 10.0]
+
+    assert api_client.get("/api/readings/", {"cursor": "not-a-cursor"}).status_code == 404
+    assert api_client.get("/api/readings/", {"reading_date__gte": "yesterday"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_charges_and_payments_filter_by_period(api_client, property_obj):
+    for year, month in ((2023, 11), (2023, 12), (2024, 1), (2024, 2)):
+        MonthlyCharge.objects.create(
+            property=property_obj, year=year, month=month, resource_type=Meter.ELECTRICITY, amount=Decimal("1")
+        )
+        Payment.objects.create(
+            property=property_obj, year=year, month=month, amount=Decimal("1"), paid_at=date(year, month, 5)
+        )
+
+    charges = api_client.get("/api/monthly-charges/", {"period_from": "2023-12", "period_to": "2024-01"})
+    assert [(item["year"], item["month"]) for item in charges.data] == [(2023, 12), (2024, 1)]
+
+    first = api_client.get("/api/monthly-charges/", {"page_size": 3})
+    assert [(item["year"], item["month"]) for item in first.data["results"]] == [(2023, 11), (2023, 12), (2024, 1)]
+    second = api_client.get(first.data["next"])
+    assert [(item["year"], item["month"]) for item in second.data["results"]] == [(2024, 2)]
+    assert second.data["next"] is None
+
+    payments = api_client.get("/api/payments/", {"period_from": "2024-01", "paid_at__lte": "2024-01-31"})
+    assert [(item["year"], item["month"]) for item in payments.data] == [(2024, 1)]
+    assert api_client.get("/api/payments/", {"period_to": "2024-13"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_reading_list_sparse_fields_expand_and_columnar(api_client, meter, tariff):
+    start = tariff.valid_from
+    for idx in range(3):
+        Reading.objects.create(meter=meter, value=Decimal(10 * idx), reading_date=start + timedelta(days=idx))
+
+    default = api_client.get("/api/readings/")
+    assert "meter_detail" not in default.data[0]
+    assert default.data[0]["consumption_delta"] == 10.0
+
+    expanded = api_client.get("/api/readings/", {"expand": "meter"})
+    assert expanded.data[0]["meter_detail"]["serial_number"] == meter.serial_number
+
+    with CaptureQueriesContext(connection) as queries:
+        sparse = api_client.get("/api/readings/", {"fields": "id,value"})
+    assert [set(item) for item in sparse.data] == [{"id", "value"}] * 3
+    # Without delta fields the predecessor subquery is not part of the list query.
+    assert not any("previous_value" in query["sql"] for query in queries.captured_queries)
+
+    omitted = api_client.get("/api/readings/", {"omit": "amount_value,resource_label"})
+    assert "amount_value" not in omitted.data[0] and "consumption_delta" in omitted.data[0]
+
+    columnar = api_client.get("/api/readings/", {"fields": "id,value", "format": "columnar", "page_size": 2})
+    assert columnar.status_code == 200
+    payload = columnar.json()
+    assert payload["count"] == 2
+    assert payload["columns"]["value"] == ["20.000", "10.000"]
+    assert payload["next"]
+
+
+@pytest.mark.django_db
+def test_list_and_analytics_answer_conditional_gets(api_client, property_obj, meter, tariff):
+    Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=tariff.valid_from)
+
+    for url in ("/api/readings/", "/api/meters/", "/api/analytics/", f"/api/analytics/forecast/?property={property_obj.id}"):
+        first = api_client.get(url)
+        assert first.status_code == 200
+        etag = first["ETag"]
+        assert "no-cache" in first["Cache-Control"]
+        with CaptureQueriesContext(connection) as queries:
+            cached = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert cached.status_code == 304
+        assert cached["ETag"] == etag
+        # Only the version lookup runs before the 304.
+        assert len(queries) == 1
+
+    etag = api_client.get("/api/readings/")["ETag"]
+    assert api_client.get("/api/readings/?fields=id")["ETag"] != etag
+
+    # Only the ETag validates: a date cannot tell writes or parameters apart.
+    assert not api_client.get("/api/readings/").has_header("Last-Modified")
+    future = "Fri, 01 Jan 2100 00:00:00 GMT"
+    assert api_client.get("/api/readings/?fields=id", HTTP_IF_MODIFIED_SINCE=future).status_code == 200
+
+    Reading.objects.create(meter=meter, value=Decimal("12"), reading_date=tariff.valid_from + timedelta(days=3))
+    assert api_client.get("/api/readings/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    etag = api_client.get("/api/analytics/")["ETag"]
+    tariff.value_per_unit = Decimal("6.00")
+    tariff.save()
+    assert api_client.get("/api/analytics/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_analytics_result_cache_follows_data_version(api_client, employee_user, property_obj, meter, tariff):
+    Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=tariff.valid_from)
+    Reading.objects.create(meter=meter, value=Decimal("14"), reading_date=tariff.valid_from + timedelta(days=20))
+    rebuild_monthly_charges(property_obj, meter.resource_type)
+
+    first = api_client.get("/api/analytics/", {"properties": f"{property_obj.id},{property_obj.id}"})
+    assert first["X-Cache"] == "MISS"
+    # Equivalent queries normalize to the same entry.
+    with CaptureQueriesContext(connection) as queries:
+        second = api_client.get("/api/analytics/", {"property": property_obj.id})
+    assert second["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    # One version lookup, shared by the ETag and the result cache.
+    assert len(queries) == 1
+
+    Reading.objects.create(meter=meter, value=Decimal("20"), reading_date=tariff.valid_from + timedelta(days=40))
+    rebuild_monthly_charges(property_obj, meter.resource_type)
+    third = api_client.get("/api/analytics/", {"property": property_obj.id})
+    assert third["X-Cache"] == "MISS"
+    assert third.json()["summary"]["total_amount"] > first.json()["summary"]["total_amount"]
+
+    assert api_client.get("/api/analytics/cache-stats/").status_code == 403
+    staff = APIClient()
+    staff.force_authenticate(employee_user)
+    stats = staff.get("/api/analytics/cache-stats/").json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+@pytest.mark.django_db
+def test_analytics_serves_stale_result_while_another_worker_recomputes(
+    monkeypatch, settings, api_client, property_obj, meter, tariff
+):
+    settings.RESULT_CACHE_WAIT = 0.1
+    Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=tariff.valid_from)
+    Reading.objects.create(meter=meter, value=Decimal("14"), reading_date=tariff.valid_from + timedelta(days=20))
+    rebuild_monthly_charges(property_obj, meter.resource_type)
+    cached = api_client.get("/api/analytics/").json()
+
+    # Another worker holds every recompute lock.
+    add = cache.add
+    monkeypatch.setattr(cache, "add", lambda key, *args: False if key.endswith(":lock") else add(key, *args))
+    Reading.objects.create(meter=meter, value=Decimal("20"), reading_date=tariff.valid_from + timedelta(days=40))
+    rebuild_monthly_charges(property_obj, meter.resource_type)
+
+    stale = api_client.get("/api/analytics/")
+    assert stale["X-Cache"] == "STALE"
+    assert stale.json() == cached
+    assert not stale.has_header("ETag")
+
+    # With nothing to fall back on, a waiter gives up on the stuck holder and computes.
+    other = api_client.get("/api/analytics/", {"resource_type": meter.resource_type})
+    assert other["X-Cache"] == "MISS"
+
+    monkeypatch.undo()
+    fresh = api_client.get("/api/analytics/")
+    assert fresh["X-Cache"] == "MISS"
+    assert fresh.has_header("ETag")
+    assert fresh.json()["summary"]["total_amount"] > cached["summary"]["total_amount"]
+
+
+@pytest.mark.django_db
+def test_balances_report_current_debt_per_property(api_client, user, property_obj):
+    other = Property.objects.create(owner=user, name="Дача", address="СНТ")
+    stranger = Property.objects.create(
+        owner=User.objects.create_user(username="stranger", password="pass12345"), name="Чужой", address="Далеко"
+    )
+    for prop, month, amount in ((property_obj, 1, "100"), (property_obj, 2, "50"), (other, 2, "70"), (stranger, 1, "9")):
+        MonthlyCharge.objects.create(
+            property=prop, year=2024, month=month, resource_type=Meter.GAS, consumption=Decimal("1"), amount=Decimal(amount)
+        )
+    rebuild_balances()
+    payment = {"property": property_obj.id, "year": 2024, "month": 2, "amount": "120.00", "paid_at": "2024-02-10"}
+    assert api_client.post("/api/payments/", payment, format="json").status_code == 201
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get("/api/balances/")
+    assert response.status_code == 200
+    assert [(row["property"], row["year"], row["month"], row["balance"]) for row in response.data] == [
+        (property_obj.id, 2024, 2, "30.00"),
+        (other.id, 2024, 2, "70.00"),
+    ]
+    # The version lookup and the ledger query.
+    assert len(queries) == 2
+
+    history = api_client.get("/api/balances/", {"history": 1, "property": property_obj.id, "period_from": "2024-02"})
+    assert [(row["month"], row["charged"], row["paid"]) for row in history.data] == [(2, "50.00", "120.00")]
+
+
+@pytest.mark.django_db
+def test_portfolio_analytics_spans_all_owners(api_client, employee_user):
+    amounts = ["10.10", "55.55", "30", "55.55", "0.5", "99.99", "30", "12"]
+    properties = []
+    for index, amount in enumerate(amounts):
+        owner = User.objects.create_user(username=f"owner{index}", password="pass12345")
+        prop = Property.objects.create(owner=owner, name=f"Объект {index}", address="Адрес")
+        properties.append(prop)
+        for resource, share in ((Meter.ELECTRICITY, Decimal("1")), (Meter.GAS, Decimal("2"))):
+            MonthlyCharge.objects.create(
+                property=prop,
+                year=2024,
+                month=3,
+                resource_type=resource,
+                consumption=Decimal(index + 1) * share,
+                amount=Decimal(amount) * share,
+            )
+    rebuild_rollups()
+    staff = APIClient()
+    staff.force_authenticate(employee_user)
+    params = {"start_year": 2024, "end_year": 2024}
+
+    assert api_client.get("/api/portfolio/analytics/", params).status_code == 403
+    summary = staff.get("/api/portfolio/analytics/", params).json()
+    totals = sorted(Decimal(amount) * 3 for amount in amounts)
+    assert summary["owners"] == 8
+    assert summary["properties"] == 8
+    assert summary["total_amount"] == pytest.approx(float(sum(totals)))
+    assert {row["resource_type"]: row["owners"] for row in summary["resources"]} == {"electricity": 8, "gas": 8}
+    assert summary["percentiles"]["p50"] == pytest.approx(float(totals[3]))
+    assert summary["percentiles"]["p99"] == pytest.approx(float(totals[-1]))
+
+    seen = []
+    url, query = "/api/portfolio/analytics/top/", {**params, "page_size": 3}
+    while url:
+        page = staff.get(url, query).json()
+        seen.extend((row["property"], row["total"]) for row in page["results"])
+        url, query = page["next"], None
+    expected = sorted(
+        ((prop.id, float(Decimal(amount) * 3)) for prop, amount in zip(properties, amounts)),
+        key=lambda item: (-item[1], item[0]),
+    )
+    assert seen == [(prop_id, pytest.approx(total)) for prop_id, total in expected]
+
+    top_gas = staff.get(
+        "/api/portfolio/analytics/top/", {**params, "metric": "consumption", "resource_type": Meter.GAS}
+    ).json()
+    assert [row["property"] for row in top_gas["results"][:2]] == [properties[-1].id, properties[-2].id]
+    assert top_gas["results"][0]["owner"] == "owner7"
+
+    assert staff.get("/api/portfolio/analytics/", {"metric": "consumption"}).status_code == 400
+    assert staff.get("/api/portfolio/analytics/top/", {"cursor": "bad"}).status_code == 404
+
+
+def _streamed_csv(response):
+    assert response.streaming
+    return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+
+@pytest.mark.django_db
+def test_csv_exports_stream_filtered_rows(api_client, user, property_obj, meter):
+    stranger = Property.objects.create(
+        owner=User.objects.create_user(username="stranger", password="pass12345"), name="Чужой", address="Далеко"
+    )
+    for prop, month in ((property_obj, 1), (property_obj, 2), (property_obj, 3), (stranger, 2)):
+        MonthlyCharge.objects.create(
+            property=prop, year=2024, month=month, resource_type=Meter.GAS, consumption=Decimal("1.5"), amount=Decimal("9")
+        )
+    for day in range(1, 6):
+        Reading.objects.create(meter=meter, value=Decimal(day * 10), reading_date=date(2024, 1, day))
+
+    response = api_client.get("/api/exports/charges.csv", {"period_from": "2024-02"})
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/csv")
+    assert 'filename="charges.csv"' in response["Content-Disposition"]
+    rows = _streamed_csv(response)
+    assert rows[0][:7] == ["property_id", "property", "year", "month", "resource_type", "consumption", "amount"]
+    assert [row[:7] for row in rows[1:]] == [
+        [str(property_obj.id), property_obj.name, "2024", month, "gas", "1.500", "9.00"] for month in ("2", "3")
+    ]
+
+    response = api_client.get(
+        "/api/exports/readings.csv",
+        {"reading_date__gte": "2024-01-02", "reading_date__lte": "2024-01-04"},
+        HTTP_ACCEPT_ENCODING="gzip, deflate",
+    )
+    assert response["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response["Vary"]
+    body = gzip.decompress(b"".join(response.streaming_content)).decode()
+    rows = list(csv.reader(io.StringIO(body)))
+    assert [(row[3], row[5], row[6]) for row in rows[1:]] == [
+        ("SN-001", "2024-01-02", "20.000"),
+        ("SN-001", "2024-01-03", "30.000"),
+        ("SN-001", "2024-01-04", "40.000"),
+    ]
+
+    assert api_client.get("/api/exports/readings.csv", {"reading_date__gte": "bad"}).status_code == 400
+    assert APIClient().get("/api/exports/charges.csv").status_code == 401
+
+
+def test_csv_export_subclasses_must_define_their_queryset():
+    with pytest.raises(TypeError, match="queryset_for"):
+
+        class IncompleteExport(CSVExportView):
+            filename = "incomplete.csv"
+            columns = ("id",)
+            fields = ("id",)
+
+
+@pytest.mark.django_db
+def test_data_version_is_per_owner(api_client, property_obj, meter):
+    etag = api_client.get("/api/properties/")["ETag"]
+    stranger = User.objects.create_user(username="stranger", password="pass12345")
+    Property.objects.create(owner=stranger, name="Чужой", address="Далеко")
+    assert api_client.get("/api/properties/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    meter.delete()
+    assert api_client.get("/api/properties/", HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_streamed_lists_match_regular_lists(monkeypatch, api_client, property_obj, meter, tariff, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(renderers, "orjson", None)
+    # A small chunk size exercises the separators between streamed chunks.
+    monkeypatch.setattr(ReadingViewSet, "stream_chunk_size", 3)
+    for idx in range(7):
+        Reading.objects.create(meter=meter, value=Decimal(5 * idx), reading_date=tariff.valid_from + timedelta(days=idx))
+
+    for url in ("/api/readings/", "/api/monthly-charges/", "/api/readings/?fields=id,amount_value"):
+        regular = api_client.get(url)
+        separator = "&" if "?" in url else "?"
+        streamed = api_client.get(f"{url}{separator}stream=1")
+        assert streamed.status_code == 200
+        assert streamed.streaming
+        assert json.loads(b"".join(streamed.streaming_content)) == json.loads(regular.content)
+
+
+def _legacy_charge_sections(charges):
+    """The per-instance loop the analytics endpoint used before SQL grouping, summing exact Decimals."""
+
+    monthly_map = {}
+    resource_totals = {}
+    monthly_by_resource = {}
+    zero = Decimal("0")
+    for charge in charges.order_by("period", "property_id", "resource_type"):
+        key = f"{charge.year}-{charge.month:02d}"
+        monthly_map.setdefault(
+            key, {"month": key, "items": [], "total_amount": zero, "total_consumption": zero, "cumulative_amount": zero}
+        )
+        monthly_map[key]["items"].append(
+            {
+                "property": charge.property_id,
+                "resource_type": charge.resource_type,
+                "consumption": charge.consumption,
+                "amount": charge.amount,
+            }
+        )
+        monthly_map[key]["total_amount"] += charge.amount
+        monthly_map[key]["total_consumption"] += charge.consumption
+        resource_totals.setdefault(charge.resource_type, {"total_consumption": zero, "total_amount": zero})
+        resource_totals[charge.resource_type]["total_consumption"] += charge.consumption
+        resource_totals[charge.resource_type]["total_amount"] += charge.amount
+        monthly_by_resource.setdefault(key, {})
+        monthly_by_resource[key].setdefault(charge.resource_type, {"consumption": zero, "amount": zero})
+        monthly_by_resource[key][charge.resource_type]["consumption"] += charge.consumption
+        monthly_by_resource[key][charge.resource_type]["amount"] += charge.amount
+
+    monthly = sorted(monthly_map.values(), key=lambda item: item["month"])
+    running = zero
+    for entry in monthly:
+        running += entry["total_amount"]
+        entry["cumulative_amount"] = running
+    by_resource = [
+        {"month": month, "resource_type": resource, **values}
+        for month, data in sorted(monthly_by_resource.items())
+        for resource, values in sorted(data.items())
+    ]
+    return monthly, by_resource, resource_totals
+
+
+@pytest.mark.django_db
+def test_portfolio_analytics_reads_owner_rollups_unless_detail_is_requested(api_client, user):
+    def seed(count):
+        for idx in range(count):
+            prop = Property.objects.create(owner=user, name=f"Объект {idx}", address="Адрес")
+            for month in (1, 2, 3):
+                MonthlyCharge.objects.create(
+                    property=prop,
+                    year=2024,
+                    month=month,
+                    resource_type=Meter.GAS,
+                    consumption=Decimal("2"),
+                    amount=Decimal(month * 10),
+                )
+            Payment.objects.create(property=prop, year=2024, month=2, amount=Decimal("25"), paid_at=date(2024, 2, 10))
+        rebuild_rollups()
+
+    params = {"start_year": 2024, "start_month": 1, "end_year": 2024, "end_month": 12}
+
+    def portfolio_queries():
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get("/api/analytics/", params)
+        assert response.status_code == 200
+        return len(queries), response.data
+
+    seed(2)
+    small_count, summary = portfolio_queries()
+    seed(5)
+    large_count, summary = portfolio_queries()
+    assert small_count == large_count
+
+    detailed = api_client.get("/api/analytics/", {**params, "detail": "properties"}).data
+    assert [entry["items"] for entry in summary["monthly"]] == [[], [], []]
+    assert summary["comparison"] == []
+    assert len(detailed["monthly"][0]["items"]) == 7 and len(detailed["comparison"]) == 7
+    for key in ("total_amount", "total_consumption", "cumulative_amount"):
+        assert [entry[key] for entry in summary["monthly"]] == [entry[key] for entry in detailed["monthly"]]
+    assert summary["summary"] == detailed["summary"]
+    assert [(row["month"], row["total"]) for row in summary["payments"]] == [(2, Decimal("175.00"))]
+    assert sorted((row["month"], row["total"]) for row in detailed["payments"]) == [(2, Decimal("175.00"))]
+    # Every property is billed in the same months, so both forecasts agree.
+    assert summary["forecast_amount"] == pytest.approx(detailed["forecast_amount"])
+    assert api_client.get("/api/analytics/", {**params, "detail": "everything"}).status_code == 400
+
+
+def _money(value):
+    """Money and consumption as exact Decimals, in the original order and key order.
+
+    The API serializes sums as floats; every stored value has at most three
+    decimal places, so rounding the float back to 0.001 recovers the exact sum.
+    """
+
+    if isinstance(value, dict):
+        return [(key, _money(item)) for key, item in value.items()]
+    if isinstance(value, list):
+        return [_money(item) for item in value]
+    if isinstance(value, (float, Decimal)):
+        return str(Decimal(repr(value) if isinstance(value, float) else value).quantize(Decimal("0.001")))
+    return value
+
+
+@pytest.mark.django_db
+def test_analytics_sql_aggregation_matches_legacy_loop(api_client, user):
+    rng = random.Random(16)
+    properties = [Property.objects.create(owner=user, name=f"Объект {idx}", address="Адрес") for idx in range(3)]
+    resources = [Meter.ELECTRICITY, Meter.COLD_WATER, Meter.GAS]
+    for property_obj in properties:
+        for resource in resources:
+            for offset in range(14):
+                year, month = 2023 + (offset + 5) // 12, (offset + 5) % 12 + 1
+                if rng.random() < 0.2:
+                    continue
+                MonthlyCharge.objects.create(
+                    property=property_obj,
+                    year=year,
+                    month=month,
+                    resource_type=resource,
+                    consumption=Decimal(rng.randint(0, 10**6)) / 1000,
+                    amount=Decimal(rng.randint(0, 10**6)) / 100,
+                )
+
+    rebuild_rollups()  # charges were written directly, bypassing the rebuild paths
+
+    params = {"start_year": 2023, "start_month": 8, "end_year": 2024, "end_month": 5}
+    portfolio = {"detail": "properties"}
+    subset = {"properties": f"{properties[0].id},{properties[2].id}"}
+    for extra in (portfolio, {**portfolio, "resource_type": Meter.GAS}, subset):
+        response = api_client.get("/api/analytics/", {**params, **extra})
+        assert response.status_code == 200
+        data = response.data
+
+        charges = MonthlyCharge.objects.filter(
+            property__in=[p for p in properties if "properties" not in extra or str(p.id) in extra["properties"]],
+            period__gte=2023 * 12 + 8,
+            period__lte=2024 * 12 + 5,
+        )
+        if "resource_type" in extra:
+            charges = charges.filter(resource_type=extra["resource_type"])
+        monthly, by_resource, resource_totals = _legacy_charge_sections(charges)
+
+        assert _money(data["monthly"]) == _money(monthly)
+        assert _money(data["monthly_by_resource"]) == _money(by_resource)
+        resources = {item["resource_type"]: item for item in data["summary"]["resources"]}
+        assert set(resources) == set(resource_totals)
+        for resource, totals in resource_totals.items():
+            assert _money(resources[resource]["total_amount"]) == _money(totals["total_amount"])
+            assert _money(resources[resource]["total_consumption"]) == _money(totals["total_consumption"])
+        assert data["summary"]["peak_month"] == max(monthly, key=lambda m: m["total_amount"])["month"]
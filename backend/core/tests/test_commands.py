@@ -0,0 +1,230 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from core.models import Meter, MonthlyCharge, OwnerMonthlyRollup, Payment, PropertyBalance, Reading, Tariff
+from core.services import rebuild_monthly_charges
+
+
+@pytest.fixture
+def electricity_tariff(db):
+    return Tariff.objects.create(
+        resource_type=Meter.ELECTRICITY,
+        value_per_unit=Decimal("2.00"),
+        valid_from=date(2020, 1, 1),
+    )
+
+
+@pytest.mark.django_db
+def test_importreadings_csv_skips_bad_rows_and_rebuilds(tmp_path, meter, electricity_tariff):
+    source = tmp_path / "readings.csv"
+    source.write_text(
+        "serial_number,value,reading_date\n"
+        "SN-001,100,2024-01-31\n"
+        "SN-001,110.5,2024-02-29\n"
+        "UNKNOWN,1,2024-02-29\n"
+        "SN-001,-5,2024-03-31\n"
+        "SN-001,NaN,2024-03-31\n"
+        "SN-001,sNaN,2024-03-31\n"
+        "SN-001,Infinity,2024-03-31\n"
+        "SN-001,130,2024-03-31\n",
+        encoding="utf-8",
+    )
+    out, err = StringIO(), StringIO()
+
+    call_command("importreadings", str(source), "--chunk-size", "2", stdout=out, stderr=err)
+
+    assert Reading.objects.filter(meter=meter).count() == 3
+    assert "UNKNOWN" in err.getvalue()
+    assert err.getvalue().count("некорректное значение показания") == 3
+    charges = {
+        (charge.year, charge.month): charge.amount
+        for charge in MonthlyCharge.objects.filter(property=meter.property)
+    }
+    assert charges == {(2024, 2): Decimal("21.00"), (2024, 3): Decimal("39.00")}
+
+
+@pytest.mark.django_db
+def test_importreadings_ndjson_resumes_from_offset(tmp_path, meter, electricity_tariff):
+    source = tmp_path / "readings.ndjson"
+    source.write_text(
+        '{"serial_number": "SN-001", "value": 10, "reading_date": "2024-01-31"}\n'
+        '{"serial_number": "SN-001", "value": "15", "reading_date": "2024-02-29"}\n'
+        "\n"
+        '{"serial_number": "SN-001", "value": 25, "reading_date": "2024-03-31"}\n',
+        encoding="utf-8",
+    )
+    Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=date(2024, 1, 31))
+
+    call_command("importreadings", str(source), "--offset", "1", stdout=StringIO(), stderr=StringIO())
+
+    assert Reading.objects.filter(meter=meter).count() == 3
+    assert MonthlyCharge.objects.get(property=meter.property, month=2).consumption == Decimal("5.000")
+    assert MonthlyCharge.objects.get(property=meter.property, month=3).amount == Decimal("20.00")
+
+
+@pytest.mark.django_db
+def test_rebuildcharges_regenerates_owner_charges(meter, electricity_tariff):
+    Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=date(2024, 1, 31))
+    Reading.objects.create(meter=meter, value=Decimal("25"), reading_date=date(2024, 2, 29))
+    orphan = MonthlyCharge.objects.create(
+        property=meter.property,
+        year=2023,
+        month=5,
+        resource_type=Meter.GAS,
+        consumption=Decimal("1"),
+        amount=Decimal("1"),
+    )
+    out = StringIO()
+
+    call_command("rebuildcharges", "--workers", "1", "--owner", meter.property.owner.username, stdout=out)
+
+    assert not MonthlyCharge.objects.filter(pk=orphan.pk).exists()
+    assert MonthlyCharge.objects.get(property=meter.property).amount == Decimal("30.00")
+    assert "2 пар и 2 показаний" in out.getvalue()
+
+    with pytest.raises(CommandError):
+        call_command("rebuildcharges", "--owner", "nobody", stdout=StringIO())
+
+
+@pytest.mark.django_db
+def test_rebuildrollups_repairs_the_owner_rollup(user, property_obj):
+    MonthlyCharge.objects.create(
+        property=property_obj, year=2024, month=3, resource_type=Meter.GAS, consumption=Decimal("4"), amount=Decimal("8")
+    )
+    assert not OwnerMonthlyRollup.objects.exists()
+    out = StringIO()
+
+    call_command("rebuildrollups", "--owner", user.username, stdout=out)
+
+    rollup = OwnerMonthlyRollup.objects.get(owner=user)
+    assert (rollup.period, rollup.amount, rollup.charges) == (2024 * 12 + 3, Decimal("8.00"), 1)
+    assert "1" in out.getvalue()
+    with pytest.raises(CommandError):
+        call_command("rebuildrollups", "--owner", "nobody")
+
+
+@pytest.mark.django_db
+def test_rebuildbalances_repairs_the_ledger(user, property_obj):
+    MonthlyCharge.objects.create(
+        property=property_obj, year=2024, month=3, resource_type=Meter.GAS, consumption=Decimal("4"), amount=Decimal("8")
+    )
+    MonthlyCharge.objects.create(
+        property=property_obj, year=2024, month=5, resource_type=Meter.GAS, consumption=Decimal("1"), amount=Decimal("2")
+    )
+    PropertyBalance.objects.all().delete()
+    out = StringIO()
+
+    call_command("rebuildbalances", "--owner", user.username, stdout=out)
+
+    ledger = list(PropertyBalance.objects.values_list("period", "charged", "balance"))
+    assert ledger == [(2024 * 12 + 3, Decimal("8.00"), Decimal("8.00")), (2024 * 12 + 5, Decimal("2.00"), Decimal("10.00"))]
+    assert "2" in out.getvalue()
+    with pytest.raises(CommandError):
+        call_command("rebuildbalances", "--owner", "nobody")
+
+
+@pytest.mark.django_db
+def test_exportsnapshot_writes_partitions_and_exports_only_new_ones_incrementally(tmp_path, meter, electricity_tariff):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.dataset
+
+    Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=date(2024, 1, 31))
+    Reading.objects.create(meter=meter, value=Decimal("25"), reading_date=date(2024, 2, 29))
+
+    call_command("exportsnapshot", str(tmp_path), "--tables", "readings", "--chunk-size", "1", stdout=StringIO())
+
+    files = sorted(path.relative_to(tmp_path).parent.as_posix() for path in tmp_path.glob("readings/**/*.parquet"))
+    assert files == [
+        "readings/year=2024/month=1/resource_type=electricity",
+        "readings/year=2024/month=2/resource_type=electricity",
+    ]
+    table = pyarrow.dataset.dataset(tmp_path / "readings", partitioning="hive").to_table()
+    assert sorted(table.column("value").to_pylist()) == [Decimal("10.000"), Decimal("25.000")]
+    with pytest.raises(CommandError):
+        call_command("exportsnapshot", str(tmp_path), "--tables", "readings", stdout=StringIO())
+
+    Reading.objects.create(meter=meter, value=Decimal("40"), reading_date=date(2024, 3, 31))
+    call_command(
+        "exportsnapshot", str(tmp_path), "--incremental", "--format", "arrow", "--tables", "readings", stdout=StringIO()
+    )
+
+    (delta,) = tmp_path.glob("readings/**/*.arrow")
+    with pyarrow.memory_map(str(delta)) as source:
+        batch = pyarrow.ipc.open_file(source).read_all()
+    assert delta.parent.name == "resource_type=electricity" and delta.parent.parent.name == "month=3"
+    assert batch.column("value").to_pylist() == [Decimal("40.000")]
+
+    Payment.objects.create(
+        property=meter.property, year=2024, month=3, amount=Decimal("30"), paid_at=date(2024, 3, 10)
+    )
+    MonthlyCharge.objects.create(
+        property=meter.property, year=2024, month=3, resource_type=Meter.GAS, consumption=Decimal("4"), amount=Decimal("8")
+    )
+    call_command("exportsnapshot", str(tmp_path / "full"), stdout=StringIO())
+    charges = pyarrow.dataset.dataset(tmp_path / "full" / "charges", partitioning="hive").to_table()
+    assert charges.select(["resource_type", "amount"]).to_pylist() == [{"resource_type": "gas", "amount": Decimal("8.00")}]
+    assert [path.parent.name for path in tmp_path.glob("full/payments/**/*.parquet")] == ["month=3"]
+
+
+@pytest.mark.django_db
+def test_exportsnapshot_replaces_charges_rebuilt_between_incremental_runs(tmp_path, meter, electricity_tariff):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.dataset
+
+    for value, reading_date in ((Decimal("10"), date(2024, 1, 31)), (Decimal("25"), date(2024, 2, 29))):
+        Reading.objects.create(meter=meter, value=value, reading_date=reading_date)
+    rebuild_monthly_charges(meter.property, Meter.ELECTRICITY)
+    call_command("exportsnapshot", str(tmp_path), "--tables", "charges", stdout=StringIO())
+
+    Reading.objects.create(meter=meter, value=Decimal("30"), reading_date=date(2024, 3, 31))
+    rebuild_monthly_charges(meter.property, Meter.ELECTRICITY)
+    call_command("exportsnapshot", str(tmp_path), "--incremental", "--tables", "charges", stdout=StringIO())
+    call_command("exportsnapshot", str(tmp_path), "--incremental", "--tables", "charges", stdout=StringIO())
+
+    table = pyarrow.dataset.dataset(tmp_path / "charges", partitioning="hive").to_table()
+    exported = sorted((row["month"], row["amount"]) for row in table.select(["month", "amount"]).to_pylist())
+    expected = sorted(MonthlyCharge.objects.values_list("month", "amount"))
+    assert exported == expected
+    assert sorted(table.column("id").to_pylist()) == sorted(MonthlyCharge.objects.values_list("id", flat=True))
+
+
+@pytest.mark.django_db
+def test_exportsnapshot_rewrites_partitions_with_edited_or_deleted_rows(tmp_path, meter, electricity_tariff):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.dataset
+
+    january = Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=date(2024, 1, 31))
+    february = Reading.objects.create(meter=meter, value=Decimal("25"), reading_date=date(2024, 2, 29))
+    payment = Payment.objects.create(
+        property=meter.property, year=2024, month=2, amount=Decimal("30"), paid_at=date(2024, 2, 10)
+    )
+    call_command("exportsnapshot", str(tmp_path), "--tables", "readings", "payments", stdout=StringIO())
+
+    january.value = Decimal("12")
+    january.save()
+    february.delete()
+    payment.amount = Decimal("35")
+    payment.save(update_fields=["amount"])
+    call_command(
+        "exportsnapshot", str(tmp_path), "--incremental", "--tables", "readings", "payments", stdout=StringIO()
+    )
+
+    readings = pyarrow.dataset.dataset(tmp_path / "readings", partitioning="hive").to_table()
+    assert readings.select(["id", "value"]).to_pylist() == [{"id": january.pk, "value": Decimal("12.000")}]
+    assert not (tmp_path / "readings" / "year=2024" / "month=2").exists()
+    payments = pyarrow.dataset.dataset(tmp_path / "payments", partitioning="hive").to_table()
+    assert payments.column("amount").to_pylist() == [Decimal("35.00")]
+
+
+@pytest.mark.django_db
+def test_exportsnapshot_requires_pyarrow(tmp_path, monkeypatch):
+    from core.management.commands import exportsnapshot
+
+    monkeypatch.setattr(exportsnapshot, "pyarrow", None)
+    with pytest.raises(CommandError):
+        call_command("exportsnapshot", str(tmp_path))
@@ -7,8 +7,8 @@ from django.contrib.auth.models import User
 from hypothesis import HealthCheck, given, settings, strategies as st
 from rest_framework.test import APIClient
 
-from core.models import Meter, MonthlyCharge, Property, Reading, Tariff
-from core.services import process_reading
+from core.models import Meter, MonthlyCharge, OwnerMonthlyRollup, Property, PropertyBalance, Reading, Tariff
+from core.services import process_reading, rebuild_monthly_charges
 
 
 reading_points = st.lists(
@@ -70,6 +70,95 @@ def test_fuzz_reading_charges_match_chronological_positive_deltas(points):
         assert charges[key].amount == consumption
 
 
+def _charges_snapshot(property_obj):
+    return {
+        (charge.year, charge.month): (charge.consumption, charge.amount)
+        for charge in MonthlyCharge.objects.filter(property=property_obj, resource_type=Meter.ELECTRICITY)
+    }
+
+
+reading_edits = st.lists(
+    st.tuples(
+        st.integers(min_value=0, max_value=17),
+        st.integers(min_value=0, max_value=365),
+        st.decimals(min_value=Decimal("0.00"), max_value=Decimal("10000.00"), places=2),
+    ),
+    max_size=5,
+)
+
+
+@pytest.mark.django_db(transaction=True)
+@settings(max_examples=25, deadline=None, suppress_health_check=[HealthCheck.too_slow])
+@given(
+    points=reading_points,
+    edits=reading_edits,
+    deletions=st.lists(st.integers(min_value=0, max_value=17), max_size=3),
+)
+def test_fuzz_incremental_rebuild_matches_full_rebuild(points, edits, deletions):
+    User.objects.all().delete()
+    Tariff.objects.all().delete()
+    user = User.objects.create_user(username="incremental_fuzz", password="password123")
+    property_obj = Property.objects.create(owner=user, name="Fuzz home", address="Fuzz street")
+    meter = Meter.objects.create(
+        property=property_obj,
+        resource_type=Meter.ELECTRICITY,
+        unit="kWh",
+        serial_number="FUZZ-003",
+    )
+    Tariff.objects.create(
+        resource_type=Meter.ELECTRICITY,
+        value_per_unit=Decimal("1.00"),
+        valid_from=date(2023, 1, 1),
+        valid_to=date(2024, 6, 30),
+    )
+    Tariff.objects.create(
+        resource_type=Meter.ELECTRICITY,
+        value_per_unit=Decimal("2.35"),
+        valid_from=date(2024, 7, 1),
+    )
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    start = date(2024, 1, 1)
+    ids = []
+    for day_offset, value in points:
+        response = client.post(
+            "/api/readings/",
+            {"meter": meter.id, "value": str(value), "reading_date": (start + timedelta(days=day_offset)).isoformat()},
+            format="json",
+        )
+        assert response.status_code == 201
+        ids.append(response.data["id"])
+
+    for index, day_offset, value in edits:
+        response = client.patch(
+            f"/api/readings/{ids[index % len(ids)]}/",
+            {"value": str(value), "reading_date": (start + timedelta(days=day_offset)).isoformat()},
+            format="json",
+        )
+        assert response.status_code == 200
+
+    for index in deletions:
+        if not ids:
+            break
+        response = client.delete(f"/api/readings/{ids.pop(index % len(ids))}/")
+        assert response.status_code == 204
+
+    incremental = _charges_snapshot(property_obj)
+    rollups = {
+        (rollup.year, rollup.month): (rollup.consumption, rollup.amount)
+        for rollup in OwnerMonthlyRollup.objects.filter(owner=user, resource_type=Meter.ELECTRICITY)
+    }
+    balances = {
+        (row.year, row.month): row.charged for row in PropertyBalance.objects.filter(property=property_obj)
+    }
+    rebuild_monthly_charges(property_obj, Meter.ELECTRICITY)
+
+    assert incremental == _charges_snapshot(property_obj)
+    assert rollups == incremental
+    assert balances == {month: amount for month, (_, amount) in incremental.items() if amount}
+
+
 @pytest.mark.django_db
 def test_reading_update_and_delete_rebuild_monthly_charges(api_client, meter, tariff):
     tariff.valid_from = date(2023, 1, 1)
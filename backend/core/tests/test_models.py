@@ -4,8 +4,8 @@ from decimal import Decimal
 import pytest
 from django.contrib.auth.models import User
 
-from core.models import Meter, MonthlyCharge, Profile, Reading
-from core.services import find_tariff, process_reading
+from core.models import Meter, MonthlyCharge, Payment, Profile, Reading, Tariff, month_period
+from core.services import find_tariff, month_range_q, process_reading, rebuild_monthly_charges
 
 
 @pytest.mark.django_db
@@ -61,3 +61,21 @@ def test_profile_role_can_be_promoted(user):
     user.profile.role = Profile.ROLE_ADMIN
     user.profile.save()
     assert user.profile.role == Profile.ROLE_ADMIN
+
+
+@pytest.mark.django_db
+def test_period_is_stored_on_save_and_bulk_rebuild(property_obj, meter):
+    Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2"), valid_from=date(2023, 1, 1))
+    for value, reading_date in ((0, date(2023, 11, 20)), (10, date(2023, 12, 20)), (25, date(2024, 1, 20))):
+        Reading.objects.create(meter=meter, value=Decimal(value), reading_date=reading_date)
+    rebuild_monthly_charges(property_obj, Meter.ELECTRICITY)
+
+    charges = MonthlyCharge.objects.filter(property=property_obj)
+    assert all(charge.period == month_period(charge.year, charge.month) for charge in charges)
+    window = charges.filter(month_range_q(date(2023, 12, 1), date(2024, 1, 31))).order_by("period")
+    assert [(charge.year, charge.month) for charge in window] == [(2023, 12), (2024, 1)]
+
+    payment = Payment.objects.create(
+        property=property_obj, year=2024, month=2, amount=Decimal("1"), paid_at=date(2024, 2, 3)
+    )
+    assert payment.period == month_period(2024, 2) > month_period(2023, 12)
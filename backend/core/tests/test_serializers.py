@@ -62,4 +62,4 @@ def test_reading_serializer_returns_delta_and_amount(meter, tariff):
     serialized = ReadingSerializer(instance)
     assert serialized.data["consumption_delta"] == 10.0
     assert serialized.data["amount_value"] == pytest.approx(55.0)
-    assert get_previous_reading(meter, instance.reading_date) == first
+    assert get_previous_reading(instance) == first
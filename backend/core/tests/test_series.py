@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from core.models import Meter, Reading
+from core.series import downsample, reading_buckets
+
+
+@pytest.fixture
+def readings(meter, tariff):
+    year = tariff.valid_from.year
+    for reading_date, value in ((date(year, 1, 1), "100"), (date(year, 1, 31), "130"), (date(year, 3, 2), "160")):
+        Reading.objects.create(meter=meter, value=Decimal(value), reading_date=reading_date)
+    return year
+
+
+@pytest.mark.django_db
+def test_reading_buckets_spread_deltas_over_days(readings):
+    year = readings
+    meters = Meter.objects.all()
+    days = reading_buckets(meters, date(year, 1, 1), date(year, 3, 31), "day")
+
+    assert len(days) == (date(year, 3, 31) - date(year, 1, 1)).days + 1
+    assert days[0] == {"period": f"{year}-01-01", "consumption": 0.0, "amount": 0.0}
+    assert days[1]["consumption"] == pytest.approx(1.0)
+    assert days[1]["amount"] == pytest.approx(5.5)
+    assert sum(day["consumption"] for day in days) == pytest.approx(60)
+    assert days[-1]["consumption"] == 0.0
+
+    weeks = reading_buckets(meters, date(year, 1, 1), date(year, 3, 31), "week")
+    assert date.fromisoformat(weeks[0]["period"]).weekday() == 0
+    assert sum(week["amount"] for week in weeks) == pytest.approx(60 * 5.5)
+
+    # Readings outside the window still anchor the intervals crossing its edges.
+    inner = reading_buckets(meters, date(year, 1, 15), date(year, 1, 20), "day")
+    assert [day["consumption"] for day in inner] == pytest.approx([1.0] * 6)
+
+
+@pytest.mark.django_db
+def test_reading_buckets_skip_negative_deltas(meter, tariff):
+    start = tariff.valid_from
+    for offset, value in ((0, "50"), (10, "20"), (20, "40")):
+        Reading.objects.create(meter=meter, value=Decimal(value), reading_date=start + timedelta(days=offset))
+
+    days = reading_buckets(Meter.objects.all(), start, start + timedelta(days=20), "day")
+    assert sum(day["consumption"] for day in days) == pytest.approx(20)
+    assert all(day["consumption"] == 0 for day in days[:11])
+
+
+def test_downsample_keeps_ends_and_peaks():
+    points = [{"period": str(index), "amount": 1.0} for index in range(1000)]
+    points[437]["amount"] = 50.0
+
+    sampled = downsample(points, 20)
+    assert len(sampled) == 20
+    assert sampled[0] is points[0]
+    assert sampled[-1] is points[-1]
+    assert points[437] in sampled
+    assert downsample(points[:10], 20) == points[:10]
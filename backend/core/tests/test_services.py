@@ -1,11 +1,43 @@
+from copy import copy
 from datetime import date, timedelta
 from decimal import Decimal
+from io import StringIO
 
 import pytest
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test.utils import CaptureQueriesContext
 
-from core.models import Meter, MonthlyCharge, Property, Reading, Tariff
-from core.services import ensure_demo_data, forecast_property, process_reading
+from core import services
+from core.models import (
+    Meter,
+    MonthlyCharge,
+    OwnerMonthlyPayments,
+    OwnerMonthlyRollup,
+    Payment,
+    Property,
+    PropertyBalance,
+    Reading,
+    RebuildJob,
+    Tariff,
+    month_period,
+)
+from core.services import (
+    claim_rebuild_job,
+    coalesce_rebuilds,
+    enqueue_rebuild,
+    ensure_demo_data,
+    forecast_properties,
+    forecast_property,
+    process_reading,
+    rebuild_balances,
+    rebuild_monthly_charges,
+    release_stale_jobs,
+    request_rebuild,
+    rerate_for_tariffs,
+)
 
 
 @pytest.mark.django_db
@@ -54,6 +86,56 @@ def test_forecast_property_averages_previous_months(property_obj):
     assert result == Decimal("165.00")
 
 
+def _charge_months_ago(property_obj, lag, amount, resource_type=Meter.ELECTRICITY):
+    today = date.today()
+    period = month_period(today.year, today.month) - lag
+    MonthlyCharge.objects.create(
+        property=property_obj,
+        year=(period - 1) // 12,
+        month=(period - 1) % 12 + 1,
+        resource_type=resource_type,
+        consumption=Decimal("1"),
+        amount=Decimal(amount),
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_forecast_properties_batches_average_and_seasonal_models(monkeypatch, user, property_obj, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(services, "numpy", None)
+    seasonal = property_obj
+    flat = Property.objects.create(owner=user, name="Дача", address="СНТ")
+    empty = Property.objects.create(owner=user, name="Гараж", address="ГСК")
+    # Last year's month and the trailing quarter a year before it (300) against this
+    # year's trailing quarter (330): a 10% trend on 100.
+    for lag, amount in [(12, "100"), (13, "100"), (14, "100"), (15, "100"), (1, "110"), (2, "110"), (3, "100")]:
+        _charge_months_ago(seasonal, lag, amount)
+    _charge_months_ago(seasonal, 1, "10", Meter.COLD_WATER)
+    for lag, amount in [(1, "40"), (5, "20"), (30, "999")]:
+        _charge_months_ago(flat, lag, amount)
+    _charge_months_ago(flat, 0, "500")
+
+    with CaptureQueriesContext(connection) as queries:
+        average = forecast_properties([seasonal, flat, empty], months=3)
+    assert len(queries) == 1
+    assert average == {
+        seasonal.id: (Decimal("120") + Decimal("110") + Decimal("100")) / 3,
+        flat.id: Decimal("353"),
+        empty.id: Decimal("0"),
+    }
+    assert forecast_property(flat, months=2) == Decimal("30")
+
+    result = forecast_properties([seasonal.id, flat.id, empty.id], months=3, model="seasonal")
+    assert result[seasonal.id] == Decimal("110.00")
+    # Without last year's month the average is kept.
+    assert result[flat.id] == average[flat.id]
+    assert result[empty.id] == Decimal("0")
+
+    with pytest.raises(ValueError):
+        forecast_properties([seasonal], model="naive")
+
+
 @pytest.mark.django_db
 def test_ensure_demo_data_only_for_test_user_and_is_idempotent():
     regular = User.objects.create_user(username="regular", password="password123")
@@ -69,3 +151,277 @@ def test_ensure_demo_data_only_for_test_user_and_is_idempotent():
     assert Reading.objects.filter(meter__property=demo_property).count() == 7
     assert Tariff.objects.count() == 5
     assert MonthlyCharge.objects.filter(property=demo_property).exists()
+
+
+def _seed_monthly_readings(meter, months, start=date(2022, 1, 1)):
+    value = Decimal("100.000")
+    for idx in range(months):
+        year, month = start.year + (start.month - 1 + idx) // 12, (start.month - 1 + idx) % 12 + 1
+        value += Decimal("12.345")
+        Reading.objects.create(meter=meter, value=value, reading_date=date(year, month, 28))
+
+
+@pytest.mark.django_db
+def test_rebuild_query_count_does_not_depend_on_history_length(property_obj):
+    Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("3.33"), valid_from=date(2020, 1, 1))
+    short_meter = Meter.objects.create(property=property_obj, resource_type=Meter.ELECTRICITY, unit="kWh")
+    long_property = Property.objects.create(owner=property_obj.owner, name="Дача", address="Лес")
+    long_meter = Meter.objects.create(property=long_property, resource_type=Meter.ELECTRICITY, unit="kWh")
+    _seed_monthly_readings(short_meter, 3)
+    _seed_monthly_readings(long_meter, 36)
+
+    # Warm the tariff timeline and the owner's rollup months.
+    rebuild_monthly_charges(property_obj, Meter.ELECTRICITY)
+    rebuild_monthly_charges(long_property, Meter.ELECTRICITY)
+    counts = []
+    for meter in (short_meter, long_meter):
+        for since in (None, date(2022, 2, 15)):
+            with CaptureQueriesContext(connection) as queries:
+                rebuild_monthly_charges(meter.property, Meter.ELECTRICITY, since=since)
+            counts.append(len(queries))
+
+    assert counts[:2] == counts[2:]
+    assert MonthlyCharge.objects.filter(property=long_property).count() == 35
+    charge = MonthlyCharge.objects.get(property=long_property, year=2023, month=6)
+    assert charge.consumption == Decimal("12.345")
+    assert charge.amount == Decimal("41.11")
+
+
+@pytest.mark.django_db
+def test_deferred_mode_coalesces_jobs_until_worker_runs(settings, api_client, meter, tariff):
+    settings.CHARGES_REBUILD_MODE = "deferred"
+    start = tariff.valid_from
+    for idx, value in enumerate(["22.000", "15.000", "10.000"]):
+        response = api_client.post(
+            "/api/readings/",
+            {"meter": meter.id, "value": value, "reading_date": (start + timedelta(days=40 * (2 - idx))).isoformat()},
+            format="json",
+        )
+        assert response.status_code == 201
+
+    job = RebuildJob.objects.get()
+    assert job.since == start
+    assert not MonthlyCharge.objects.exists()
+    stale = api_client.get(f"/api/properties/{meter.property_id}/")
+    assert stale.data["charges_stale_since"] is not None
+
+    call_command("rundbworker", "--once", stdout=StringIO())
+
+    assert not RebuildJob.objects.exists()
+    expected = MonthlyCharge.objects.filter(property=meter.property).count()
+    rebuild_monthly_charges(meter.property, Meter.ELECTRICITY)
+    assert expected == MonthlyCharge.objects.filter(property=meter.property).count() > 0
+    assert api_client.get(f"/api/properties/{meter.property_id}/").data["charges_stale_since"] is None
+
+
+@pytest.mark.django_db
+def test_rebuild_job_claim_and_release(property_obj):
+    first = enqueue_rebuild(property_obj.id, Meter.GAS, date(2024, 5, 1))
+    claimed = claim_rebuild_job()
+    assert claimed.pk == first.pk
+    assert claim_rebuild_job() is None
+
+    # A write while the job is running queues a fresh pending job for the pair.
+    pending = enqueue_rebuild(property_obj.id, Meter.GAS, date(2024, 7, 1))
+    assert pending.pk != first.pk
+
+    assert release_stale_jobs(timedelta(seconds=-1)) == 1
+    merged = RebuildJob.objects.get()
+    assert merged.pk == pending.pk
+    assert merged.since == date(2024, 5, 1)
+    assert merged.attempts == 1
+
+    enqueue_rebuild(property_obj.id, Meter.GAS, None)
+    assert RebuildJob.objects.get().since is None
+
+
+@pytest.fixture
+def rebuild_calls(monkeypatch):
+    calls = []
+    original = services.rebuild_monthly_charges
+
+    def counting(property_obj, resource_type, since=None):
+        calls.append((property_obj.pk, resource_type, since))
+        return original(property_obj, resource_type, since=since)
+
+    monkeypatch.setattr(services, "rebuild_monthly_charges", counting)
+    return calls
+
+
+@pytest.mark.django_db
+def test_demo_data_rebuilds_once_per_pair(rebuild_calls):
+    test_user = User.objects.create_user(username="test", password="password123")
+
+    ensure_demo_data(test_user)
+
+    assert Reading.objects.filter(meter__property__owner=test_user).count() == 7
+    assert len(rebuild_calls) == 3
+    assert len({(property_id, resource) for property_id, resource, _ in rebuild_calls}) == 3
+
+
+@pytest.mark.django_db
+def test_coalesce_rebuilds_merges_windows_and_drops_on_error(rebuild_calls, property_obj):
+    with coalesce_rebuilds():
+        request_rebuild(property_obj, Meter.GAS, since=date(2024, 5, 1))
+        with coalesce_rebuilds():
+            request_rebuild(property_obj, Meter.GAS, since=date(2024, 2, 1))
+        request_rebuild(property_obj, Meter.HEATING, since=date(2024, 3, 1))
+        assert rebuild_calls == []
+
+    assert sorted(rebuild_calls) == [
+        (property_obj.pk, Meter.GAS, date(2024, 2, 1)),
+        (property_obj.pk, Meter.HEATING, date(2024, 3, 1)),
+    ]
+
+    rebuild_calls.clear()
+    with pytest.raises(RuntimeError):
+        with coalesce_rebuilds():
+            request_rebuild(property_obj, Meter.GAS)
+            raise RuntimeError("boom")
+    assert rebuild_calls == []
+
+
+@pytest.mark.django_db
+def test_reading_update_within_pair_rebuilds_once(rebuild_calls, api_client, meter, tariff):
+    reading = Reading.objects.create(meter=meter, value=Decimal("10"), reading_date=date(2024, 3, 10))
+
+    response = api_client.patch(f"/api/readings/{reading.id}/", {"reading_date": "2024-01-15"}, format="json")
+
+    assert response.status_code == 200
+    assert rebuild_calls == [(meter.property_id, Meter.ELECTRICITY, date(2024, 1, 1))]
+
+
+def _rollup_totals(owner):
+    return {
+        (rollup.period, rollup.resource_type): (rollup.consumption, rollup.amount, rollup.charges)
+        for rollup in OwnerMonthlyRollup.objects.filter(owner=owner)
+    }
+
+
+def _charge_totals(owner):
+    rows = (
+        MonthlyCharge.objects.filter(property__owner=owner)
+        .values("period", "resource_type")
+        .annotate(consumption=Sum("consumption"), amount=Sum("amount"), charges=Count("id"))
+    )
+    return {(row["period"], row["resource_type"]): (row["consumption"], row["amount"], row["charges"]) for row in rows}
+
+
+@pytest.mark.django_db
+def test_owner_rollup_follows_rebuilds_rerates_and_deletes(property_obj):
+    owner = property_obj.owner
+    tariff = Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2"), valid_from=date(2020, 1, 1))
+    second = Property.objects.create(owner=owner, name="Дача", address="Лес")
+    for target in (property_obj, second):
+        meter = Meter.objects.create(property=target, resource_type=Meter.ELECTRICITY, unit="kWh")
+        _seed_monthly_readings(meter, 6)
+        rebuild_monthly_charges(target, Meter.ELECTRICITY)
+    assert _rollup_totals(owner) == _charge_totals(owner)
+    assert OwnerMonthlyRollup.objects.get(owner=owner, year=2022, month=3).charges == 2
+
+    Reading.objects.filter(meter__property=second, reading_date__gte=date(2022, 4, 1)).delete()
+    rebuild_monthly_charges(second, Meter.ELECTRICITY, since=date(2022, 4, 1))
+    assert _rollup_totals(owner) == _charge_totals(owner)
+
+    old = copy(tariff)
+    tariff.value_per_unit = Decimal("3")
+    tariff.save()
+    rerate_for_tariffs(old, tariff)
+    assert _rollup_totals(owner) == _charge_totals(owner)
+
+    property_obj.delete()
+    assert _rollup_totals(owner) == _charge_totals(owner)
+    assert not OwnerMonthlyRollup.objects.filter(owner=owner, year=2022, month=6).exists()
+
+
+def _payment_rollup(owner):
+    return {row.period: (row.amount, row.payments) for row in OwnerMonthlyPayments.objects.filter(owner=owner)}
+
+
+def _payment_totals(owner):
+    rows = Payment.objects.filter(property__owner=owner).values("period").annotate(amount=Sum("amount"), payments=Count("id"))
+    return {row["period"]: (row["amount"], row["payments"]) for row in rows}
+
+
+@pytest.mark.django_db
+def test_owner_payment_rollup_follows_payment_writes(property_obj):
+    owner = property_obj.owner
+    second = Property.objects.create(owner=owner, name="Дача", address="Лес")
+    first = Payment.objects.create(property=property_obj, year=2024, month=1, amount=Decimal("10"), paid_at=date(2024, 1, 5))
+    Payment.objects.create(property=second, year=2024, month=1, amount=Decimal("5.50"), paid_at=date(2024, 1, 7))
+    moved = Payment.objects.create(property=second, year=2024, month=2, amount=Decimal("3"), paid_at=date(2024, 2, 7))
+    assert _payment_rollup(owner) == _payment_totals(owner)
+
+    moved.month = 3
+    moved.amount = Decimal("4")
+    moved.save()
+    first.delete()
+    assert _payment_rollup(owner) == _payment_totals(owner)
+    assert not OwnerMonthlyPayments.objects.filter(owner=owner, month=2).exists()
+
+    second.delete()
+    assert _payment_rollup(owner) == _payment_totals(owner) == {}
+
+
+def _ledger(property_obj):
+    return {
+        row.period: (row.charged, row.paid, row.balance)
+        for row in PropertyBalance.objects.filter(property=property_obj)
+    }
+
+
+def _rebuilt_ledger(property_obj):
+    incremental = _ledger(property_obj)
+    rebuild_balances(property_ids=[property_obj.id])
+    rebuilt = _ledger(property_obj)
+    PropertyBalance.objects.filter(property=property_obj).delete()
+    PropertyBalance.objects.bulk_create(
+        PropertyBalance(
+            property=property_obj,
+            year=(period - 1) // 12,
+            month=(period - 1) % 12 + 1,
+            period=period,
+            charged=charged,
+            paid=paid,
+            balance=balance,
+        )
+        for period, (charged, paid, balance) in incremental.items()
+    )
+    return rebuilt
+
+
+@pytest.mark.django_db
+def test_balance_ledger_follows_charges_and_payments(property_obj):
+    tariff = Tariff.objects.create(resource_type=Meter.ELECTRICITY, value_per_unit=Decimal("2"), valid_from=date(2020, 1, 1))
+    meter = Meter.objects.create(property=property_obj, resource_type=Meter.ELECTRICITY, unit="kWh")
+    _seed_monthly_readings(meter, 6)
+    rebuild_monthly_charges(property_obj, Meter.ELECTRICITY)
+    assert _ledger(property_obj) == _rebuilt_ledger(property_obj)
+    charged = sum(charged for charged, _, _ in _ledger(property_obj).values())
+    assert PropertyBalance.objects.filter(property=property_obj).last().balance == charged
+
+    march = Payment.objects.create(property=property_obj, year=2022, month=3, amount=Decimal("30"), paid_at=date(2022, 3, 20))
+    Payment.objects.create(property=property_obj, year=2023, month=1, amount=Decimal("5"), paid_at=date(2022, 12, 1))
+    assert _ledger(property_obj) == _rebuilt_ledger(property_obj)
+    assert _ledger(property_obj)[2023 * 12 + 1] == (Decimal("0"), Decimal("5"), charged - 35)
+
+    # Only the affected month and the later ones are rewritten.
+    before = PropertyBalance.objects.get(property=property_obj, year=2022, month=2)
+    march.month = 4
+    march.amount = Decimal("31")
+    march.save()
+    assert PropertyBalance.objects.get(pk=before.pk).balance == before.balance
+    assert _ledger(property_obj) == _rebuilt_ledger(property_obj)
+
+    old = copy(tariff)
+    tariff.value_per_unit = Decimal("3")
+    tariff.save()
+    rerate_for_tariffs(old, tariff)
+    Reading.objects.filter(meter=meter, reading_date__gte=date(2022, 5, 1)).delete()
+    rebuild_monthly_charges(property_obj, Meter.ELECTRICITY, since=date(2022, 5, 1))
+    march.delete()
+    assert _ledger(property_obj) == _rebuilt_ledger(property_obj)
+    assert _ledger(property_obj)[2022 * 12 + 4][1] == Decimal("0")
+    # Months whose charges were removed and that have no payments leave the ledger.
+    assert max(_ledger(property_obj)) == 2023 * 12 + 1
+    assert max(period for period in _ledger(property_obj) if period < 2023 * 12) == 2022 * 12 + 4
@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from core.models import DataVersion, Meter, MonthlyCharge, Reading, Tariff
+from core.services import rebuild_monthly_charges
+from core.tariffs import TariffTimeline, get_tariff_timeline
+from core.versions import TARIFFS_KEY, get_version
+
+
+def _query_tariff(resource_type, target_date):
+    candidates = [
+        tariff
+        for tariff in Tariff.objects.filter(resource_type=resource_type)
+        if tariff.valid_from <= target_date and (tariff.valid_to is None or tariff.valid_to >= target_date)
+    ]
+    return max(candidates, key=lambda item: (item.valid_from, item.pk), default=None)
+
+
+@pytest.mark.django_db
+def test_timeline_matches_lookup_for_overlapping_tariffs():
+    Tariff.objects.create(
+        resource_type=Meter.ELECTRICITY,
+        value_per_unit=Decimal("1.00"),
+        valid_from=date(2023, 1, 1),
+    )
+    Tariff.objects.create(
+        resource_type=Meter.ELECTRICITY,
+        value_per_unit=Decimal("2.00"),
+        valid_from=date(2023, 6, 1),
+        valid_to=date(2023, 8, 31),
+    )
+    Tariff.objects.create(
+        resource_type=Meter.ELECTRICITY,
+        value_per_unit=Decimal("3.00"),
+        valid_from=date(2023, 7, 15),
+        valid_to=date(2023, 7, 20),
+    )
+    Tariff.objects.create(
+        resource_type=Meter.GAS,
+        value_per_unit=Decimal("9.00"),
+        valid_from=date(2023, 3, 1),
+        valid_to=date(2023, 3, 31),
+    )
+
+    timeline = TariffTimeline(Tariff.objects.all())
+    day = date(2022, 12, 1)
+    while day < date(2024, 1, 31):
+        for resource_type in (Meter.ELECTRICITY, Meter.GAS, Meter.HEATING):
+            assert timeline.find(resource_type, day) == _query_tariff(resource_type, day)
+        day += timedelta(days=1)
+
+
+@pytest.mark.django_db
+def test_timeline_invalidated_on_tariff_save_and_delete(tariff):
+    timeline = get_tariff_timeline()
+    assert timeline.find(Meter.ELECTRICITY, tariff.valid_from).value_per_unit == Decimal("5.50")
+
+    tariff.value_per_unit = Decimal("7.00")
+    tariff.save()
+    assert get_tariff_timeline().find(Meter.ELECTRICITY, tariff.valid_from).value_per_unit == Decimal("7.00")
+
+    tariff.delete()
+    assert get_tariff_timeline().find(Meter.ELECTRICITY, tariff.valid_from) is None
+
+
+@pytest.mark.django_db
+def test_timeline_reloads_when_another_worker_bumps_version(tariff):
+    before = get_tariff_timeline()
+    assert get_tariff_timeline() is before
+
+    # Simulate a write from another process: no signal fires here.
+    Tariff.objects.filter(pk=tariff.pk).update(value_per_unit=Decimal("8.00"))
+    DataVersion.objects.filter(key=TARIFFS_KEY).update(value=F("value") + 1)
+
+    after = get_tariff_timeline()
+    assert after is not before
+    assert after.version == get_version(TARIFFS_KEY)
+    assert after.find(Meter.ELECTRICITY, tariff.valid_from).value_per_unit == Decimal("8.00")
+
+
+@pytest.mark.django_db
+def test_rebuild_runs_constant_tariff_queries(meter):
+    Tariff.objects.create(
+        resource_type=Meter.ELECTRICITY,
+        value_per_unit=Decimal("1.00"),
+        valid_from=date(2023, 1, 1),
+    )
+    for idx in range(12):
+        Reading.objects.create(
+            meter=meter,
+            value=Decimal(10 * (idx + 1)),
+            reading_date=date(2024, idx + 1, 28),
+        )
+
+    with CaptureQueriesContext(connection) as queries:
+        rebuild_monthly_charges(meter.property, Meter.ELECTRICITY)
+
+    tariff_queries = [query for query in queries.captured_queries if '"core_tariff"' in query["sql"]]
+    assert len(tariff_queries) <= 1
+    assert MonthlyCharge.objects.filter(property=meter.property).count() == 11
@@ -0,0 +1,76 @@
+from typing import Optional
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DataVersion, Meter, MonthlyCharge, Payment, Property, Reading
+
+TARIFFS_KEY = "tariffs"
+
+
+def owner_key(owner_id: int) -> str:
+    return f"owner:{owner_id}"
+
+
+def user_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def get_version(key: str) -> int:
+    value = DataVersion.objects.filter(key=key).values_list("value", flat=True).first()
+    return value or 0
+
+
+def get_versions(*keys: str) -> list[int]:
+    """Return the value of each key in one query; missing keys read as 0."""
+
+    rows = dict(DataVersion.objects.filter(key__in=keys).values_list("key", "value"))
+    return [rows.get(key, 0) for key in keys]
+
+
+def bump_version(key: str) -> None:
+    if DataVersion.objects.filter(key=key).update(value=F("value") + 1):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(key=key, value=1)
+    except IntegrityError:
+        DataVersion.objects.filter(key=key).update(value=F("value") + 1)
+
+
+def bump_owner_version(owner_id: Optional[int]) -> None:
+    if owner_id is not None:
+        bump_version(owner_key(owner_id))
+
+
+def _owner_id(instance) -> Optional[int]:
+    if isinstance(instance, Property):
+        return instance.owner_id
+    if isinstance(instance, Reading):
+        return Meter.objects.filter(pk=instance.meter_id).values_list("property__owner_id", flat=True).first()
+    return Property.objects.filter(pk=instance.property_id).values_list("owner_id", flat=True).first()
+
+
+# MonthlyCharge deletes are not tracked: the rebuild paths delete and bulk-insert
+# charges without per-row signals (a post_delete receiver would also turn their
+# queryset deletes into row-by-row collection) and bump the owner themselves.
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=Meter)
+@receiver(post_save, sender=Reading)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=MonthlyCharge)
+def owner_data_saved(sender, instance, **kwargs):
+    bump_owner_version(_owner_id(instance))
+
+
+@receiver(post_delete, sender=Property)
+@receiver(post_delete, sender=Meter)
+@receiver(post_delete, sender=Reading)
+@receiver(post_delete, sender=Payment)
+def owner_data_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, models.Model) and origin is not instance:
+        # Cascaded row: the object the delete started from bumps its owner once.
+        return
+    bump_owner_version(_owner_id(instance))
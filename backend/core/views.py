@@ -1,27 +1,61 @@
+import csv
+import hashlib
+import io
+from calendar import monthrange
+from math import ceil
+from copy import copy
 from datetime import date
+from functools import wraps
 
 from django.contrib.auth.models import User
-from django.db.models import Q, Sum
-from rest_framework import generics, permissions, status, viewsets
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Round
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework import generics, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .models import Meter, MonthlyCharge, Payment, Property, Reading, Tariff
+from .models import (
+    Meter,
+    MonthlyCharge,
+    OwnerMonthlyPayments,
+    OwnerMonthlyRollup,
+    Payment,
+    Property,
+    PropertyBalance,
+    Reading,
+    Tariff,
+    month_period,
+)
+from .pagination import MonthlyChargePagination, PaymentPagination, PortfolioRankingPagination, ReadingPagination
 from .permissions import IsAdminOrEmployee
+from .renderers import CSVRenderer, FastJSONRenderer
+from .resultcache import cache_stats, cached_result
+from .series import RESOLUTIONS, charge_buckets, downsample, reading_buckets
 from .serializers import (
     LoginSerializer,
     MeterSerializer,
     MonthlyChargeSerializer,
     PaymentSerializer,
+    PropertyBalanceSerializer,
     PropertySerializer,
+    ReadingBulkItemSerializer,
+    ReadingBulkSerializer,
     ReadingSerializer,
     TariffSerializer,
     UserSerializer,
 )
-from .services import ensure_demo_data, forecast_property
-from .services import rebuild_monthly_charges
+from .services import FORECAST_MODELS, affected_since, ensure_demo_data, forecast_owner, forecast_properties
+from .services import ingest_readings
+from .services import coalesce_rebuilds, earlier_in_billing_order, month_range_q, request_rebuild, rerate_for_tariffs
+from .versions import TARIFFS_KEY, get_versions, owner_key
 
 
 def _parse_int_param(params, name, default=None, *, min_value=None, max_value=None):
@@ -56,6 +90,264 @@ def _parse_id_list(raw):
     return values
 
 
+def _parse_date_param(params, name):
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def _parse_period_param(params, name):
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        year, month = (int(part) for part in raw.split("-"))
+        return date(year, month, 1)
+    except ValueError:
+        raise ValueError(f"{name} must be a period in YYYY-MM format")
+
+
+def _parse_month_window(params):
+    """``start_year, start_month, end_year, end_month``, defaulting to last year through this one."""
+
+    today = date.today()
+    return (
+        _parse_int_param(params, "start_year", today.year - 1, min_value=1, max_value=9999),
+        _parse_int_param(params, "start_month", 1, min_value=1, max_value=12),
+        _parse_int_param(params, "end_year", today.year, min_value=1, max_value=9999),
+        _parse_int_param(params, "end_month", 12, min_value=1, max_value=12),
+    )
+
+
+def _filter_periods(qs, params):
+    try:
+        start = _parse_period_param(params, "period_from")
+        end = _parse_period_param(params, "period_to")
+    except ValueError as exc:
+        raise ValidationError({"detail": str(exc)})
+    return qs.filter(month_range_q(start, end))
+
+
+def _filter_readings(qs, params):
+    property_id = params.get("meter__property")
+    meter_id = params.get("meter")
+    if property_id:
+        qs = qs.filter(meter__property_id=property_id)
+    if meter_id:
+        qs = qs.filter(meter_id=meter_id)
+    try:
+        date_from = _parse_date_param(params, "reading_date__gte")
+        date_to = _parse_date_param(params, "reading_date__lte")
+    except ValueError as exc:
+        raise ValidationError({"detail": str(exc)})
+    if date_from:
+        qs = qs.filter(reading_date__gte=date_from)
+    if date_to:
+        qs = qs.filter(reading_date__lte=date_to)
+    return qs
+
+
+def _filter_charges(qs, params):
+    property_id = params.get("property")
+    year = params.get("year")
+    month = params.get("month")
+    if property_id:
+        qs = qs.filter(property_id=property_id)
+    if year:
+        qs = qs.filter(year=year)
+    if month:
+        qs = qs.filter(month=month)
+    return _filter_periods(qs, params)
+
+
+def conditional_on_data_version(handler):
+    """Answer a read action with an ETag derived from data versions.
+
+    The tag combines the user's data version, the global tariff version, today's
+    date (defaults and forecasts are relative to it), the path, the query
+    parameters and the rendered format. A matching ``If-None-Match`` returns 304
+    before ``handler`` runs any query. No ``Last-Modified`` is sent: a
+    second-resolution timestamp cannot tell apart writes within one second or
+    different parameters, so ``If-Modified-Since`` alone could answer 304 wrongly.
+    The versions are left on ``request.data_versions`` for handlers that key
+    their own caches on them.
+    """
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        owner_version, tariff_version = get_versions(owner_key(request.user.pk), TARIFFS_KEY)
+        request.data_versions = (owner_version, tariff_version)
+        key = "|".join(
+            [
+                str(request.user.pk),
+                str(owner_version),
+                str(tariff_version),
+                date.today().isoformat(),
+                request.path,
+                repr(sorted(request.query_params.lists())),
+                request.accepted_renderer.format,
+            ]
+        )
+        etag = f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(self, request, *args, **kwargs)
+        if response.get("X-Cache") == "STALE":
+            # A stale result must not be remembered under the current version's tag.
+            patch_cache_control(response, private=True, no_cache=True)
+        elif 200 <= response.status_code < 300 or response.status_code == 304:
+            response["ETag"] = etag
+            # Always revalidate: without this, browsers may serve a heuristic-fresh copy.
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
+
+
+class DataVersionETagMixin:
+    @conditional_on_data_version
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+class StreamingListMixin:
+    """Stream an unpaginated JSON list with ``?stream=1``.
+
+    Rows are read with ``.iterator(chunk_size=...)`` and serialized one chunk at
+    a time, so memory stays flat however long the history is. Pagination
+    parameters are ignored in this mode; other formats use the regular list.
+    """
+
+    stream_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        streaming = request.query_params.get("stream", "").lower() in ("1", "true", "yes")
+        if not streaming or request.accepted_renderer.format != "json":
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        renderer = FastJSONRenderer()
+
+        def chunks():
+            yield b"["
+            rows = []
+            separator = b""
+            for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+                rows.append(renderer.render(serializer.to_representation(obj)))
+                if len(rows) >= self.stream_chunk_size:
+                    yield separator + b",".join(rows)
+                    separator = b","
+                    rows = []
+            if rows:
+                yield separator + b",".join(rows)
+            yield b"]"
+
+        return StreamingHttpResponse(chunks(), content_type="application/json")
+
+
+def _csv_chunks(header, rows, batch_size=1000):
+    # The header goes out on its own so the client gets bytes before the first batch is read.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class CSVExportView(APIView):
+    """Stream the user's rows as CSV, optionally gzip-compressed on the fly.
+
+    Rows come from ``.values_list(...).iterator(chunk_size=...)`` and are written
+    in batches, so memory stays flat and the first bytes go out before the
+    query finishes. Clients sending ``Accept-Encoding: gzip`` get a gzip body.
+
+    Subclasses set ``filename``, ``columns`` and ``fields`` and define
+    ``queryset_for(user)``; a subclass missing one fails when it is declared.
+    """
+
+    renderer_classes = [FastJSONRenderer, CSVRenderer]
+    filename: str
+    columns: tuple[str, ...]
+    fields: tuple[str, ...]
+    chunk_size = 5000
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        missing = [name for name in ("filename", "columns", "fields") if not getattr(cls, name, None)]
+        if not callable(getattr(cls, "queryset_for", None)):
+            missing.append("queryset_for")
+        if missing:
+            raise TypeError(f"{cls.__name__} must define {', '.join(missing)}")
+        if len(cls.columns) != len(cls.fields):
+            raise TypeError(f"{cls.__name__}.columns and .fields differ in length")
+
+    def get(self, request):
+        rows = self.queryset_for(request.user).values_list(*self.fields).iterator(chunk_size=self.chunk_size)
+        content = _csv_chunks(self.columns, rows)
+        compress = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        response = StreamingHttpResponse(
+            compress_sequence(content) if compress else content, content_type="text/csv; charset=utf-8"
+        )
+        if compress:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept-Encoding",))
+        response["Content-Disposition"] = f'attachment; filename="{self.filename}"'
+        return response
+
+
+class ChargesExportView(CSVExportView):
+    filename = "charges.csv"
+    columns = ("property_id", "property", "year", "month", "resource_type", "consumption", "amount", "generated_at")
+    fields = ("property_id", "property__name", "year", "month", "resource_type", "consumption", "amount", "generated_at")
+
+    def queryset_for(self, user):
+        qs = MonthlyCharge.objects.filter(property__owner=user)
+        return _filter_charges(qs, self.request.query_params).order_by("period", "property_id", "resource_type")
+
+
+class ReadingsExportView(CSVExportView):
+    filename = "readings.csv"
+    columns = (
+        "id",
+        "property_id",
+        "meter_id",
+        "serial_number",
+        "resource_type",
+        "reading_date",
+        "value",
+        "created_at",
+    )
+    fields = (
+        "id",
+        "meter__property_id",
+        "meter_id",
+        "meter__serial_number",
+        "meter__resource_type",
+        "reading_date",
+        "value",
+        "created_at",
+    )
+
+    def queryset_for(self, user):
+        qs = Reading.objects.filter(meter__property__owner=user)
+        return _filter_readings(qs, self.request.query_params).order_by("meter_id", "reading_date", "created_at", "id")
+
+
 class RegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -81,14 +373,16 @@ class LoginView(TokenObtainPairView):
     serializer_class = LoginSerializer
 
 
-class PropertyViewSet(viewsets.ModelViewSet):
+class PropertyViewSet(DataVersionETagMixin, viewsets.ModelViewSet):
     serializer_class = PropertySerializer
 
     def get_queryset(self):
-        return Property.objects.filter(owner=self.request.user)
+        return Property.objects.filter(owner=self.request.user).annotate(
+            charges_stale_since=Min("rebuild_jobs__created_at")
+        )
 
 
-class MeterViewSet(viewsets.ModelViewSet):
+class MeterViewSet(DataVersionETagMixin, viewsets.ModelViewSet):
     serializer_class = MeterSerializer
 
     def get_queryset(self):
@@ -99,7 +393,7 @@ class MeterViewSet(viewsets.ModelViewSet):
         return qs
 
 
-class TariffViewSet(viewsets.ModelViewSet):
+class TariffViewSet(DataVersionETagMixin, viewsets.ModelViewSet):
     queryset = Tariff.objects.all()
     serializer_class = TariffSerializer
 
@@ -108,157 +402,438 @@ class TariffViewSet(viewsets.ModelViewSet):
             return [IsAdminOrEmployee()]
         return [permissions.IsAuthenticated()]
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        tariff = serializer.save()
+        rerate_for_tariffs(tariff)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous = copy(serializer.instance)
+        tariff = serializer.save()
+        rerate_for_tariffs(previous, tariff)
 
-class ReadingViewSet(viewsets.ModelViewSet):
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        previous = copy(instance)
+        instance.delete()
+        rerate_for_tariffs(previous)
+
+
+class ReadingViewSet(DataVersionETagMixin, StreamingListMixin, viewsets.ModelViewSet):
     serializer_class = ReadingSerializer
+    pagination_class = ReadingPagination
 
     def get_queryset(self):
-        qs = Reading.objects.filter(meter__property__owner=self.request.user)
-        property_id = self.request.query_params.get("meter__property")
-        meter_id = self.request.query_params.get("meter")
-        if property_id:
-            qs = qs.filter(meter__property_id=property_id)
-        if meter_id:
-            qs = qs.filter(meter_id=meter_id)
+        qs = _filter_readings(Reading.objects.filter(meter__property__owner=self.request.user), self.request.query_params)
+        qs = qs.select_related("meter")
+        if self.action == "list" and self._needs_previous_value():
+            # Date ranges and cursors cut a meter's chain, so the predecessor is a
+            # correlated lookup (same order as the billing rebuild) evaluated only
+            # for the rows on the page rather than a window over the whole history.
+            earlier = earlier_in_billing_order(OuterRef("reading_date"), OuterRef("created_at"), OuterRef("id"))
+            previous = (
+                Reading.objects.filter(earlier, meter=OuterRef("meter_id"))
+                .order_by("-reading_date", "-created_at", "-id")
+                .values("value")[:1]
+            )
+            qs = qs.annotate(previous_value=Subquery(previous))
         return qs
 
+    def _needs_previous_value(self):
+        fields = self.get_serializer().fields
+        return "consumption_delta" in fields or "amount_value" in fields
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        payload = ReadingBulkSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        atomic = payload.validated_data["atomic"]
+
+        errors = []
+        rows = []
+        for index, item in enumerate(payload.validated_data["readings"]):
+            row = ReadingBulkItemSerializer(data=item)
+            if row.is_valid():
+                rows.append((index, row.validated_data))
+            else:
+                errors.append({"index": index, "errors": row.errors})
+
+        meters = Meter.objects.filter(
+            id__in={data["meter"] for _, data in rows},
+            property__owner=request.user,
+        ).select_related("property")
+        meters_by_id = {meter.id: meter for meter in meters}
+
+        readings = []
+        for index, data in rows:
+            meter = meters_by_id.get(data["meter"])
+            if meter is None:
+                errors.append({"index": index, "errors": {"meter": ["Нельзя добавлять показания к чужому счетчику"]}})
+                continue
+            readings.append(Reading(meter=meter, value=data["value"], reading_date=data["reading_date"]))
+
+        errors.sort(key=lambda item: item["index"])
+        if not readings or (errors and atomic):
+            return Response({"created": 0, "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        ingest_readings(readings)
+        return Response({"created": len(readings), "errors": errors}, status=status.HTTP_201_CREATED)
+
     def perform_update(self, serializer):
-        old_meter = self.get_object().meter
-        reading = serializer.save()
-        rebuild_monthly_charges(old_meter.property, old_meter.resource_type)
-        if reading.meter_id != old_meter.id:
-            rebuild_monthly_charges(reading.meter.property, reading.meter.resource_type)
+        old_meter = serializer.instance.meter
+        old_date = serializer.instance.reading_date
+        with coalesce_rebuilds():
+            reading = serializer.save()
+            request_rebuild(old_meter.property, old_meter.resource_type, since=affected_since(old_date))
+            request_rebuild(
+                reading.meter.property,
+                reading.meter.resource_type,
+                since=affected_since(reading.reading_date),
+            )
 
     def perform_destroy(self, instance):
         property_obj = instance.meter.property
         resource_type = instance.meter.resource_type
+        since = affected_since(instance.reading_date)
         instance.delete()
-        rebuild_monthly_charges(property_obj, resource_type)
+        request_rebuild(property_obj, resource_type, since=since)
 
 
-class MonthlyChargeViewSet(viewsets.ReadOnlyModelViewSet):
+class MonthlyChargeViewSet(DataVersionETagMixin, StreamingListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = MonthlyChargeSerializer
+    pagination_class = MonthlyChargePagination
 
     def get_queryset(self):
         qs = MonthlyCharge.objects.filter(property__owner=self.request.user)
-        property_id = self.request.query_params.get("property")
-        year = self.request.query_params.get("year")
-        month = self.request.query_params.get("month")
+        return _filter_charges(qs, self.request.query_params).order_by("period")
+
+
+class PaymentViewSet(DataVersionETagMixin, viewsets.ModelViewSet):
+    serializer_class = PaymentSerializer
+    pagination_class = PaymentPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        qs = Payment.objects.filter(property__owner=self.request.user)
+        property_id = params.get("property")
         if property_id:
             qs = qs.filter(property_id=property_id)
-        if year:
-            qs = qs.filter(year=year)
-        if month:
-            qs = qs.filter(month=month)
-        return qs.order_by("year", "month")
+        try:
+            paid_from = _parse_date_param(params, "paid_at__gte")
+            paid_to = _parse_date_param(params, "paid_at__lte")
+        except ValueError as exc:
+            raise ValidationError({"detail": str(exc)})
+        if paid_from:
+            qs = qs.filter(paid_at__gte=paid_from)
+        if paid_to:
+            qs = qs.filter(paid_at__lte=paid_to)
+        return _filter_periods(qs, params)
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
-    serializer_class = PaymentSerializer
+class PropertyBalanceViewSet(DataVersionETagMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Current balance of every property: the latest ``PropertyBalance`` row of each.
+
+    The latest period per property is a correlated lookup on the
+    ``(property, period)`` unique index. ``?history=1`` lists every month instead
+    and accepts ``period_from``/``period_to``.
+    """
+
+    serializer_class = PropertyBalanceSerializer
 
     def get_queryset(self):
-        return Payment.objects.filter(property__owner=self.request.user)
+        params = self.request.query_params
+        qs = PropertyBalance.objects.filter(property__owner=self.request.user)
+        property_id = params.get("property")
+        if property_id:
+            qs = qs.filter(property_id=property_id)
+        if params.get("history") in ("1", "true"):
+            return _filter_periods(qs, params).order_by("property_id", "period")
+        latest = PropertyBalance.objects.filter(property=OuterRef("property")).order_by("-period").values("period")[:1]
+        return qs.filter(period=Subquery(latest)).order_by("property_id")
+
+
+MAX_READING_SERIES_YEARS = 20
+ANALYTICS_DETAILS = ("", "properties")
+
+
+class PortfolioAnalyticsViewSet(viewsets.ViewSet):
+    """Analytics across all owners for management-company staff.
+
+    Totals per resource come from ``OwnerMonthlyRollup``; rankings and
+    percentiles group ``MonthlyCharge`` per property in the database, so no
+    owner's rows are loaded into Python. ``metric=consumption`` mixes units
+    across resources and therefore needs ``resource_type``.
+    """
+
+    permission_classes = [IsAdminOrEmployee]
+    percentiles = (50, 75, 90, 95, 99)
+
+    def _scope(self, request):
+        params = request.query_params
+        try:
+            start_year, start_month, end_year, end_month = _parse_month_window(params)
+        except ValueError as exc:
+            raise ValidationError({"detail": str(exc)})
+        resource_type = params.get("resource_type")
+        metric = params.get("metric", "amount")
+        if metric not in ("amount", "consumption"):
+            raise ValidationError({"detail": "metric must be one of: amount, consumption"})
+        if metric == "consumption" and not resource_type:
+            raise ValidationError({"detail": "metric=consumption requires resource_type"})
+
+        window = Q(period__gte=month_period(start_year, start_month), period__lte=month_period(end_year, end_month))
+        charges = MonthlyCharge.objects.filter(window)
+        rollups = OwnerMonthlyRollup.objects.filter(window)
+        if resource_type:
+            charges = charges.filter(resource_type=resource_type)
+            rollups = rollups.filter(resource_type=resource_type)
+        period = {"start_year": start_year, "start_month": start_month, "end_year": end_year, "end_month": end_month}
+        return period, metric, charges, rollups
+
+    def list(self, request):
+        period, metric, charges, rollups = self._scope(request)
+        resources = (
+            rollups.values("resource_type")
+            .annotate(
+                total_consumption=Sum("consumption"),
+                total_amount=Sum("amount"),
+                owners=Count("owner", distinct=True),
+            )
+            .order_by("resource_type")
+        )
+        totals = rollups.aggregate(total_amount=Sum("amount"), owners=Count("owner", distinct=True))
+
+        # Nearest-rank percentiles of the per-property totals: one OFFSET lookup each,
+        # which works on every backend (SQLite has no percentile aggregate).
+        per_property = (
+            charges.values("property_id")
+            .annotate(total=Sum(metric))
+            .order_by("total", "property_id")
+            .values_list("total", flat=True)
+        )
+        properties = charges.aggregate(properties=Count("property", distinct=True))["properties"]
+        percentiles = {
+            f"p{rank}": float(per_property[ceil(rank * properties / 100) - 1]) if properties else None
+            for rank in self.percentiles
+        }
+
+        return Response(
+            {
+                "period": period,
+                "metric": metric,
+                "owners": totals["owners"],
+                "properties": properties,
+                "total_amount": float(totals["total_amount"] or 0),
+                "resources": [
+                    {
+                        "resource_type": row["resource_type"],
+                        "total_consumption": float(row["total_consumption"]),
+                        "total_amount": float(row["total_amount"]),
+                        "owners": row["owners"],
+                    }
+                    for row in resources
+                ],
+                "percentiles": percentiles,
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def top(self, request):
+        _, metric, charges, _ = self._scope(request)
+        # Rounded to the stored precision so that a cursor's total compares equal on
+        # backends that sum decimals as floats (SQLite).
+        ranking = charges.values("property_id", "property__name", "property__owner__username").annotate(
+            total=Round(Sum(metric), 3)
+        )
+        paginator = PortfolioRankingPagination()
+        page = paginator.paginate_queryset(ranking, request, view=self)
+        return paginator.get_paginated_response(
+            [
+                {
+                    "property": row["property_id"],
+                    "name": row["property__name"],
+                    "owner": row["property__owner__username"],
+                    "total": float(row["total"]),
+                }
+                for row in page
+            ]
+        )
 
 
 class AnalyticsViewSet(viewsets.ViewSet):
+    @conditional_on_data_version
     def list(self, request):
         try:
             property_id = _parse_int_param(request.query_params, "property", min_value=1)
             properties_param = request.query_params.get("properties")
             resource_type = request.query_params.get("resource_type")
-            start_year = _parse_int_param(request.query_params, "start_year", date.today().year - 1)
-            start_month = _parse_int_param(request.query_params, "start_month", 1, min_value=1, max_value=12)
-            end_year = _parse_int_param(request.query_params, "end_year", date.today().year)
-            end_month = _parse_int_param(request.query_params, "end_month", 12, min_value=1, max_value=12)
+            start_year, start_month, end_year, end_month = _parse_month_window(request.query_params)
             selected_ids = _parse_id_list(properties_param)
+            resolution = request.query_params.get("resolution") or "month"
+            if resolution not in RESOLUTIONS:
+                raise ValueError(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+            max_points = _parse_int_param(request.query_params, "max_points", 500, min_value=3, max_value=5000)
+            detail = request.query_params.get("detail") or ""
+            if detail not in ANALYTICS_DETAILS:
+                raise ValueError("detail must be 'properties' or empty")
+            if resolution in ("day", "week") and not 0 <= end_year - start_year < MAX_READING_SERIES_YEARS:
+                raise ValueError(f"day and week resolution cover at most {MAX_READING_SERIES_YEARS} years")
         except ValueError as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        props_qs = Property.objects.filter(owner=request.user)
         if not selected_ids and property_id:
-            selected_ids = [int(property_id)]
+            selected_ids = [property_id]
+        selected_ids = sorted(set(selected_ids))
+        query = (
+            selected_ids,
+            resource_type or "",
+            start_year,
+            start_month,
+            end_year,
+            end_month,
+            resolution,
+            max_points,
+            detail,
+        )
 
-        if selected_ids:
-            props_qs = props_qs.filter(id__in=selected_ids)
-        props = list(props_qs)
-        if not props:
+        owner_version, tariff_version = request.data_versions
+        key = "analytics:{}:{}".format(request.user.pk, hashlib.sha256(repr(query).encode()).hexdigest()[:32])
+        data, cache_status = cached_result(
+            key,
+            (owner_version, tariff_version, date.today().isoformat()),
+            lambda: self._summary(request.user, *query),
+        )
+        response = Response(data)
+        response["X-Cache"] = cache_status.upper()
+        return response
+
+    def _summary(
+        self,
+        user,
+        selected_ids,
+        resource_type,
+        start_year,
+        start_month,
+        end_year,
+        end_month,
+        resolution,
+        max_points,
+        detail,
+    ):
+        # The whole portfolio is answered from the owner rollups, so its cost
+        # follows the number of months; per-property items and the comparison
+        # are opt-in there with ``detail=properties``. A property subset reads
+        # its charges and always carries them.
+        portfolio = not selected_ids
+        per_property = not portfolio or detail == "properties"
+        props_qs = Property.objects.filter(owner=user)
+        if portfolio:
+            property_count = props_qs.count()
+        else:
+            props = list(props_qs.filter(id__in=selected_ids))
+            property_count = len(props)
+        if not property_count:
             period = {
                 "start_year": start_year,
                 "start_month": start_month,
                 "end_year": end_year,
                 "end_month": end_month,
             }
-            return Response(
-                {
-                    "period": period,
-                    "monthly": [],
-                    "monthly_by_resource": [],
-                    "summary": {
-                        "total_amount": 0.0,
-                        "total_consumption": 0.0,
-                        "average_daily_amount": 0.0,
-                        "peak_month": None,
-                        "resources": [],
-                    },
-                    "comparison": [],
-                    "payments": [],
-                    "forecast_amount": 0.0,
-                }
-            )
+            return {
+                "period": period,
+                "monthly": [],
+                "resolution": resolution,
+                "series": [],
+                "monthly_by_resource": [],
+                "summary": {
+                    "total_amount": 0.0,
+                    "total_consumption": 0.0,
+                    "average_daily_amount": 0.0,
+                    "peak_month": None,
+                    "resources": [],
+                },
+                "comparison": [],
+                "payments": [],
+                "forecast_amount": 0.0,
+            }
 
-        charges = (
-            MonthlyCharge.objects.filter(property__in=props)
-            .filter((Q(year__gt=start_year) | Q(year=start_year, month__gte=start_month)))
-            .filter(Q(year__lt=end_year) | Q(year=end_year, month__lte=end_month))
+        charges = MonthlyCharge.objects.filter(property__owner=user)
+        if not portfolio:
+            charges = MonthlyCharge.objects.filter(property__in=props)
+        charges = charges.filter(period__gte=month_period(start_year, start_month)).filter(
+            period__lte=month_period(end_year, end_month)
         )
-
         if resource_type:
             charges = charges.filter(resource_type=resource_type)
 
+        # One grouped row per (month, resource) carries every total.
+        if portfolio:
+            rollups = (
+                OwnerMonthlyRollup.objects.filter(owner=user)
+                .filter(period__gte=month_period(start_year, start_month))
+                .filter(period__lte=month_period(end_year, end_month))
+            )
+            if resource_type:
+                rollups = rollups.filter(resource_type=resource_type)
+            grouped = rollups.values("year", "month", "resource_type", "consumption", "amount").order_by(
+                "year", "month", "resource_type"
+            )
+        else:
+            grouped = (
+                charges.values("year", "month", "resource_type")
+                .annotate(consumption=Sum("consumption"), amount=Sum("amount"))
+                .order_by("year", "month", "resource_type")
+            )
         monthly_map = {}
         resource_totals = {}
         monthly_by_resource = {}
 
-        for charge in charges.order_by("year", "month"):
-            key = f"{charge.year}-{charge.month:02d}"
-            monthly_map.setdefault(
+        def month_entry_for(key):
+            return monthly_map.setdefault(
                 key,
                 {
                     "month": key,
                     "items": [],
-                    "total_amount": 0,
-                    "total_consumption": 0,
+                    "total_amount": 0.0,
+                    "total_consumption": 0.0,
                     "cumulative_amount": 0,
                 },
             )
-            monthly_map[key]["items"].append(
-                {
-                    "property": charge.property_id,
-                    "resource_type": charge.resource_type,
-                    "consumption": float(charge.consumption),
-                    "amount": float(charge.amount),
-                }
-            )
-            monthly_map[key]["total_amount"] += float(charge.amount)
-            monthly_map[key]["total_consumption"] += float(charge.consumption)
 
-            resource_totals.setdefault(
-                charge.resource_type,
-                {"total_consumption": 0.0, "total_amount": 0.0},
-            )
-            resource_totals[charge.resource_type]["total_consumption"] += float(charge.consumption)
-            resource_totals[charge.resource_type]["total_amount"] += float(charge.amount)
+        for row in grouped:
+            key = f"{row['year']}-{row['month']:02d}"
+            consumption = float(row["consumption"])
+            amount = float(row["amount"])
+            month_entry = month_entry_for(key)
+            month_entry["total_amount"] += amount
+            month_entry["total_consumption"] += consumption
 
-            monthly_by_resource.setdefault(key, {})
-            monthly_by_resource[key].setdefault(
-                charge.resource_type, {"consumption": 0.0, "amount": 0.0}
+            totals = resource_totals.setdefault(
+                row["resource_type"], {"total_consumption": 0.0, "total_amount": 0.0}
             )
-            monthly_by_resource[key][charge.resource_type]["consumption"] += float(
-                charge.consumption
-            )
-            monthly_by_resource[key][charge.resource_type]["amount"] += float(
-                charge.amount
+            totals["total_consumption"] += consumption
+            totals["total_amount"] += amount
+            monthly_by_resource.setdefault(key, {})[row["resource_type"]] = {
+                "consumption": consumption,
+                "amount": amount,
+            }
+
+        if per_property:
+            items = charges.order_by("period", "property_id", "resource_type").values_list(
+                "year", "month", "property_id", "resource_type", "consumption", "amount"
             )
+            for year, month, charge_property_id, charge_resource, consumption, amount in items.iterator(
+                chunk_size=5000
+            ):
+                month_entry_for(f"{year}-{month:02d}")["items"].append(
+                    {
+                        "property": charge_property_id,
+                        "resource_type": charge_resource,
+                        "consumption": float(consumption),
+                        "amount": float(amount),
+                    }
+                )
 
         monthly = list(sorted(monthly_map.values(), key=lambda item: item["month"]))
         running = 0
@@ -266,84 +841,123 @@ class AnalyticsViewSet(viewsets.ViewSet):
             running += m["total_amount"]
             m["cumulative_amount"] = running
 
-        by_property = (
-            charges.values("property__id", "property__name")
-            .annotate(total_amount=Sum("amount"), total_consumption=Sum("consumption"))
-            .order_by("property__id")
-        )
+        by_property = []
+        if per_property:
+            by_property = (
+                charges.values("property__id", "property__name")
+                .annotate(total_amount=Sum("amount"), total_consumption=Sum("consumption"))
+                .order_by("property__id")
+            )
 
-        totals_amount = sum(item["total_amount"] for item in by_property)
-        totals_consumption = sum(item["total_consumption"] for item in by_property)
+        totals_amount = sum(values["total_amount"] for values in resource_totals.values())
+        totals_consumption = sum(values["total_consumption"] for values in resource_totals.values())
         peak_month_by_amount = max(monthly, key=lambda m: m["total_amount"], default=None)
 
-        days_count = len(monthly) * 30 or 1
+        days_count = sum(monthrange(*map(int, m["month"].split("-")))[1] for m in monthly) or 1
         average_daily_amount = totals_amount / days_count
 
-        forecast_value = (
-            float(sum(forecast_property(p) for p in props) / len(props)) if props else 0.0
-        )
+        meters = Meter.objects.filter(property__owner=user) if portfolio else Meter.objects.filter(property__in=props)
+        if resolution in ("day", "week"):
+            series_meters = meters.filter(resource_type=resource_type) if resource_type else meters
+            end_date = date(end_year, end_month, monthrange(end_year, end_month)[1])
+            series = reading_buckets(series_meters, date(start_year, start_month, 1), end_date, resolution)
+        elif resolution == "month":
+            series = [
+                {"period": m["month"], "consumption": m["total_consumption"], "amount": m["total_amount"]}
+                for m in monthly
+            ]
+        else:
+            series = charge_buckets(rollups if portfolio else charges, resolution)
+
+        if portfolio:
+            forecast_value = float(forecast_owner(user.pk) / property_count)
+            payments = OwnerMonthlyPayments.objects.filter(owner=user).values("year", "month", total=F("amount"))
+        else:
+            forecasts = forecast_properties(props)
+            forecast_value = float(sum(forecasts.values()) / property_count)
+            payments = (
+                Payment.objects.filter(property__in=props)
+                .values("year", "month")
+                .annotate(total=Sum("amount"))
+            )
 
-        payments = (
-            Payment.objects.filter(property__in=props)
-            .values("year", "month")
-            .annotate(total=Sum("amount"))
-        )
+        units_map = {item["resource_type"]: item["unit"] for item in meters.values("resource_type", "unit").distinct()}
 
-        units_map = {
-            item["resource_type"]: item["unit"]
-            for item in Meter.objects.filter(property__in=props)
-            .values("resource_type", "unit")
-            .distinct()
-        }
-
-        return Response(
-            {
-                "period": {
-                    "start_year": start_year,
-                    "start_month": start_month,
-                    "end_year": end_year,
-                    "end_month": end_month,
-                },
-                "monthly": monthly,
-                "monthly_by_resource": [
+        return {
+            "period": {
+                "start_year": start_year,
+                "start_month": start_month,
+                "end_year": end_year,
+                "end_month": end_month,
+            },
+            "monthly": monthly,
+            "resolution": resolution,
+            "series": downsample(series, max_points),
+            "monthly_by_resource": [
+                {
+                    "month": month,
+                    "resource_type": resource,
+                    "consumption": values["consumption"],
+                    "amount": values["amount"],
+                }
+                for month, data in sorted(monthly_by_resource.items())
+                for resource, values in data.items()
+            ],
+            "summary": {
+                "total_amount": float(totals_amount),
+                "total_consumption": float(totals_consumption),
+                "average_daily_amount": float(average_daily_amount),
+                "peak_month": peak_month_by_amount["month"] if peak_month_by_amount else None,
+                "resources": [
                     {
-                        "month": month,
                         "resource_type": resource,
-                        "consumption": values["consumption"],
-                        "amount": values["amount"],
+                        "total_consumption": values["total_consumption"],
+                        "total_amount": values["total_amount"],
+                        "unit": units_map.get(resource, ""),
                     }
-                    for month, data in sorted(monthly_by_resource.items())
-                    for resource, values in data.items()
+                    for resource, values in resource_totals.items()
                 ],
-                "summary": {
-                    "total_amount": float(totals_amount),
-                    "total_consumption": float(totals_consumption),
-                    "average_daily_amount": float(average_daily_amount),
-                    "peak_month": peak_month_by_amount["month"] if peak_month_by_amount else None,
-                    "resources": [
-                        {
-                            "resource_type": resource,
-                            "total_consumption": values["total_consumption"],
-                            "total_amount": values["total_amount"],
-                            "unit": units_map.get(resource, ""),
-                        }
-                        for resource, values in resource_totals.items()
-                    ],
-                },
-                "comparison": list(by_property),
-                "payments": list(payments),
-                "forecast_amount": forecast_value,
-            }
-        )
+            },
+            "comparison": list(by_property),
+            "payments": list(payments),
+            "forecast_amount": forecast_value,
+        }
+
+    @action(detail=False, methods=["get"], url_path="cache-stats", permission_classes=[IsAdminOrEmployee])
+    def cache_stats(self, request):
+        return Response(cache_stats())
 
     @action(detail=False, methods=["get"])
+    @conditional_on_data_version
     def forecast(self, request):
-        property_id = request.query_params.get("property")
+        params = request.query_params
+        model = params.get("model", "average")
+        try:
+            property_id = _parse_int_param(params, "property", min_value=1)
+            selected_ids = _parse_id_list(params.get("properties"))
+            months = _parse_int_param(params, "months", 3, min_value=1, max_value=24)
+            if model not in FORECAST_MODELS:
+                raise ValueError(f"model must be one of: {', '.join(FORECAST_MODELS)}")
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if selected_ids:
+            props = list(
+                Property.objects.filter(owner=request.user, id__in=selected_ids).values_list("id", flat=True)
+            )
+            forecasts = forecast_properties(props, months, model)
+            return Response(
+                {
+                    "forecasts": [
+                        {"property": prop, "forecast_amount": float(forecasts[prop])} for prop in sorted(props)
+                    ],
+                    "forecast_amount": float(sum(forecasts.values()) / len(props)) if props else 0.0,
+                }
+            )
+
         if not property_id:
             return Response({"detail": "property param required"}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            prop = Property.objects.get(id=property_id, owner=request.user)
-        except Property.DoesNotExist:
+        if not Property.objects.filter(id=property_id, owner=request.user).exists():
             return Response(status=status.HTTP_404_NOT_FOUND)
-        forecast_value = float(forecast_property(prop))
+        forecast_value = float(forecast_properties([property_id], months, model)[property_id])
         return Response({"forecast_amount": forecast_value})
@@ -75,4 +75,45 @@ describe("ReadingsPage", () => {
     await userEvent.click(screen.getByRole("button", { name: /Сохранить/i }));
     expect(await screen.findByText(/Не удалось сохранить показание/)).toBeInTheDocument();
   });
+
+  it("requests pages and loads more on demand", async () => {
+    const meterDetail = { resource_type: "electricity", serial_number: "E-1", unit: "kWh" };
+    getMock.mockImplementation((url, config) => {
+      if (url.startsWith("meters/")) {
+        return Promise.resolve({ data: [{ id: 10, resource_type: "electricity", serial_number: "E-1" }] });
+      }
+      if (url.startsWith("readings/") && config?.params?.cursor === "abc") {
+        return Promise.resolve({
+          data: { results: [{ id: 1, meter_detail: meterDetail, value: "5", reading_date: "2024-01-01" }], next: null },
+        });
+      }
+      if (url.startsWith("readings/")) {
+        return Promise.resolve({
+          data: {
+            results: [{ id: 2, meter_detail: meterDetail, value: "7", reading_date: "2024-02-01" }],
+            // Host without the published port, as nginx forwards it.
+            next: "http://localhost/api/readings/?page_size=50&cursor=abc",
+          },
+        });
+      }
+      return Promise.resolve({ data: [] });
+    });
+
+    render(
+      <ReadingsPage
+        selectedProperty={1}
+        properties={[{ id: 1, name: "Дом", address: "Адрес" }]}
+        onSelectProperty={vi.fn()}
+      />,
+    );
+
+    expect(await screen.findByText(/7 kWh/)).toBeInTheDocument();
+    expect(getMock).toHaveBeenCalledWith("readings/", { params: expect.objectContaining({ page_size: 50 }) });
+    await userEvent.click(screen.getByRole("button", { name: /Показать ещё/ }));
+    expect(await screen.findByText(/5 kWh/)).toBeInTheDocument();
+    expect(getMock).toHaveBeenCalledWith("readings/", {
+      params: expect.objectContaining({ cursor: "abc", meter__property: 1, page_size: 50 }),
+    });
+    expect(screen.queryByRole("button", { name: /Показать ещё/ })).not.toBeInTheDocument();
+  });
 });
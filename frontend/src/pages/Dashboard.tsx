@@ -2,7 +2,7 @@ import { useEffect, useState } from "react";
 import { CartesianGrid, Line, LineChart, ResponsiveContainer, Tooltip, XAxis, YAxis } from "recharts";
 import api from "../api";
 import { Property } from "../App";
-import { FavoriteChartConfig, arrayOrEmpty, numberOrZero, parseFavoriteCharts } from "../safety";
+import { FavoriteChartConfig, arrayOrEmpty, numberOrZero, pageOrEmpty, parseFavoriteCharts } from "../safety";
 
 const RESOURCE_LABELS: Record<string, string> = {
   electricity: "Электричество",
@@ -76,8 +76,8 @@ export function Dashboard({ selectedProperty, properties, onSelectProperty }: Pr
         .get<ForecastResponse>("analytics/forecast/", { params: { property: selectedProperty } })
         .then(({ data }) => setForecast(Number(data.forecast_amount) || 0));
       api
-        .get("readings/", { params: { meter__property: selectedProperty } })
-        .then(({ data }) => setReadings(arrayOrEmpty(data).slice(0, 5)));
+        .get("readings/", { params: { meter__property: selectedProperty, page_size: 5, expand: "meter" } })
+        .then(({ data }) => setReadings(pageOrEmpty(data).results.slice(0, 5)));
       const startDate = new Date(new Date().getFullYear(), new Date().getMonth() - 1, 1);
       api
         .get<AnalyticsResponse>("analytics/", {
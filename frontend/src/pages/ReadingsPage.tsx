@@ -1,7 +1,9 @@
 import { FormEvent, useEffect, useState } from "react";
 import api from "../api";
 import { Meter, Property } from "../App";
-import { errorMessage } from "../safety";
+import { cursorFromLink, errorMessage, pageOrEmpty } from "../safety";
+
+const PAGE_SIZE = 50;
 
 const RESOURCE_LABELS: Record<string, string> = {
   electricity: "Электричество",
@@ -23,6 +25,9 @@ export function ReadingsPage({ selectedProperty, properties, onSelectProperty }:
   const [value, setValue] = useState("");
   const [readingDate, setReadingDate] = useState("");
   const [items, setItems] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [dateFrom, setDateFrom] = useState("");
+  const [dateTo, setDateTo] = useState("");
   const [status, setStatus] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
 
@@ -40,15 +45,37 @@ export function ReadingsPage({ selectedProperty, properties, onSelectProperty }:
     }
   }, [selectedProperty]);
 
+  const listParams = () => {
+    const params: any = { meter__property: selectedProperty, page_size: PAGE_SIZE, expand: "meter" };
+    if (selectedMeter) params.meter = selectedMeter;
+    if (dateFrom) params.reading_date__gte = dateFrom;
+    if (dateTo) params.reading_date__lte = dateTo;
+    return params;
+  };
+
   useEffect(() => {
     if (!selectedProperty) return;
-    const params: any = { meter__property: selectedProperty };
-    if (selectedMeter) params.meter = selectedMeter;
     api
-      .get("readings/", { params })
-      .then(({ data }) => setItems(data))
+      .get("readings/", { params: listParams() })
+      .then(({ data }) => {
+        const page = pageOrEmpty(data);
+        setItems(page.results);
+        setNextCursor(cursorFromLink(page.next));
+      })
       .catch(() => setError("Не удалось загрузить показания"));
-  }, [selectedProperty, selectedMeter]);
+  }, [selectedProperty, selectedMeter, dateFrom, dateTo]);
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const { data } = await api.get("readings/", { params: { ...listParams(), cursor: nextCursor } });
+      const page = pageOrEmpty(data);
+      setItems((current) => [...current, ...page.results]);
+      setNextCursor(cursorFromLink(page.next));
+    } catch {
+      setError("Не удалось загрузить показания");
+    }
+  };
 
   useEffect(() => {
     if (!readingDate) {
@@ -182,6 +209,18 @@ export function ReadingsPage({ selectedProperty, properties, onSelectProperty }:
             История ввода по выбранному объекту{selectedMeter ? " и счётчику" : ""}.
           </p>
         </div>
+        {selectedProperty && (
+          <div className="section-grid">
+            <label>
+              С даты
+              <input type="date" value={dateFrom} max={dateTo || undefined} onChange={(e) => setDateFrom(e.target.value)} />
+            </label>
+            <label>
+              По дату
+              <input type="date" value={dateTo} min={dateFrom || undefined} onChange={(e) => setDateTo(e.target.value)} />
+            </label>
+          </div>
+        )}
         {selectedProperty ? (
           items.length ? (
             <div className="table-wrapper">
@@ -211,6 +250,11 @@ export function ReadingsPage({ selectedProperty, properties, onSelectProperty }:
                   })}
                 </tbody>
               </table>
+              {nextCursor && (
+                <button type="button" className="link" onClick={loadMore}>
+                  Показать ещё
+                </button>
+              )}
             </div>
           ) : (
             <p className="subtitle">
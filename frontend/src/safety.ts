@@ -37,6 +37,29 @@ export const numberOrZero = (value: unknown): number => {
 
 export const arrayOrEmpty = <T = unknown>(value: unknown): T[] => (Array.isArray(value) ? value : []);
 
+export type Page<T> = { results: T[]; next: string | null };
+
+// Only the cursor of a next link is reused: the link's host is the one the API saw,
+// which behind a proxy need not be the origin the browser talks to.
+export const cursorFromLink = (link: string | null): string | null => {
+  if (!link) return null;
+  try {
+    return new URL(link, "http://localhost").searchParams.get("cursor");
+  } catch {
+    return null;
+  }
+};
+
+export const pageOrEmpty = <T = unknown>(value: unknown): Page<T> => {
+  if (Array.isArray(value)) return { results: value, next: null };
+  if (!value || typeof value !== "object") return { results: [], next: null };
+  const candidate = value as Record<string, unknown>;
+  return {
+    results: arrayOrEmpty<T>(candidate.results),
+    next: typeof candidate.next === "string" ? candidate.next : null,
+  };
+};
+
 export const errorMessage = (detail: unknown, fallback: string): string => {
   return typeof detail === "string" && detail.trim() ? detail : fallback;
 };